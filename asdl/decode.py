@@ -0,0 +1,338 @@
+"""
+decode.py
+
+Read the OHeap format written by encode.py back into Python objects.  This is
+the inverse of encode.EncodeRoot().
+
+Both versions of the format are supported.  Decoder creates the whole tree up
+front.  LazyDecoder returns views that decode fields when they're accessed, so
+with an mmap'd file, the cost depends only on the parts of the tree that are
+used.
+"""
+
+import mmap
+import struct
+
+from asdl import asdl_ as asdl
+from asdl import const
+from asdl import encode
+from asdl import py_meta
+
+
+class DecodeError(Exception):
+  pass
+
+
+_MAGIC = b'OHP'
+
+# Kinds of fields and array items, computed once per descriptor.
+_INT, _BOOL, _ENUM, _STR, _ARRAY, _USER, _OBJ, _INLINE = range(8)
+
+# Ints are 3 bytes, little endian.
+assert const.DEFAULT_INT_WIDTH == 3
+_INT_WIDTH = 3
+_unpack_int = struct.Struct('<HB').unpack_from
+_unpack_short = struct.Struct('<H').unpack_from
+
+
+def MakeClassLookup(root):
+  """Map ASDL type descriptors to classes, e.g. for the generated osh_asdl.
+
+  Args:
+    root: a module or object with the ASDL classes as attributes, e.g. osh.ast_
+
+  Returns:
+    A dict of Product or Constructor -> class, and simple Sum -> list of
+    SimpleObj instances, indexed by enum_id - 1.
+  """
+  lookup = {}
+  for name in dir(root):
+    cls = getattr(root, name)
+    if not isinstance(cls, type) or not issubclass(cls, py_meta.Obj):
+      continue
+    desc = cls.ASDL_TYPE
+    if desc is None:
+      continue
+    if issubclass(cls, py_meta.SimpleObj):
+      lookup[desc] = [getattr(cls, t.name) for t in desc.types]
+    elif isinstance(desc, (asdl.Product, asdl.Constructor)):
+      lookup[desc] = cls
+  return lookup
+
+
+class Decoder(object):
+  """Decodes objects from a buffer holding an OHeap file.
+
+  The buffer can be a str or anything that supports slicing, find(), and
+  struct.unpack_from(), like an mmap.  Both versions of the format are
+  supported; RootRef() reads the version from the header.
+  """
+
+  def __init__(self, buf, class_lookup, user_lookup, alignment=4, version=1):
+    """
+    Args:
+      buf: the contents of the file
+      class_lookup: from MakeClassLookup()
+      user_lookup: function from int to an instance of a UserType.  Like
+        encode.py, we assume the only user type is Id.
+    """
+    self.buf = buf
+    self.class_lookup = class_lookup
+    self.user_lookup = user_lookup
+    self.alignment = alignment
+    self._SetVersion(version)
+
+  def _SetVersion(self, version):
+    self.version = version
+    self.params = encode.Params(self.alignment, version=version)
+    self.kinds = {}  # field descriptor -> (kind, arg, is_maybe)
+    self.layouts = {}  # Product or Sum -> see _Layout()
+    self.strs = {}  # ref -> str, for version 2
+
+  def RootRef(self):
+    buf = self.buf
+    if buf[0:3] != _MAGIC:
+      raise DecodeError('Expected OHeap header, got %r' % buf[0:4])
+    version = ord(buf[3])
+    if version not in (1, 2):
+      raise DecodeError('Unknown OHeap version %d' % version)
+    alignment = ord(buf[4])
+    if alignment != self.alignment:
+      raise DecodeError('Expected alignment %d, got %d' %
+                        (self.alignment, alignment))
+    if version != self.version:
+      self._SetVersion(version)
+    return self.Int(5)
+
+  def Int(self, pos):
+    lo, hi = _unpack_int(self.buf, pos)
+    return lo | (hi << 16)
+
+  def Str(self, ref):
+    buf = self.buf
+    pos = ref * self.alignment
+    end = buf.find(b'\0', pos)
+    if end == -1:
+      raise DecodeError('Unterminated string at block %d' % ref)
+    return buf[pos:end]
+
+  def _Kind(self, desc):
+    try:
+      return self.kinds[desc]
+    except KeyError:
+      pass
+
+    is_maybe = False
+    d = desc
+    if isinstance(d, asdl.MaybeType):
+      is_maybe = True
+      d = d.desc
+
+    arg = None
+    if isinstance(d, asdl.IntType):
+      kind = _INT
+    elif isinstance(d, asdl.BoolType):
+      kind = _BOOL
+    elif isinstance(d, asdl.Sum) and asdl.is_simple(d):
+      kind = _ENUM
+      arg = self.class_lookup[d]
+    elif isinstance(d, asdl.StrType):
+      kind = _STR
+    elif isinstance(d, asdl.ArrayType):
+      kind = _ARRAY
+      arg = (self.params.FieldWidth(d.desc),) + self._Kind(d.desc)
+    elif isinstance(d, asdl.UserType):
+      kind = _USER
+    elif self.params.IsInline(desc):
+      kind = _INLINE
+      arg = d
+    else:
+      kind = _OBJ
+      arg = d
+
+    result = kind, arg, is_maybe
+    self.kinds[desc] = result
+    return result
+
+  def _Layout(self, desc):
+    """Return (class, fields) for a Product, or a list of them for a Sum.
+
+    Each field is (name, offset, width, kind, arg, is_maybe).  Offsets of
+    constructor fields start after the tag.
+    """
+    if isinstance(desc, asdl.Sum):
+      result = [self._Layout(cons) for cons in desc.types]
+    else:
+      params = self.params
+      fields = []
+      offset = 0
+      for name, field_desc in desc.GetFields():
+        width = params.FieldWidth(field_desc)
+        fields.append((name, offset, width) + self._Kind(field_desc))
+        offset += width
+      result = self.class_lookup[desc], fields
+    self.layouts[desc] = result
+    return result
+
+  def _Read(self, pos, width, kind, arg, is_maybe):
+    """Decode a field or array item at the given byte position."""
+    if kind == _INLINE:
+      return self._Record(pos, self.layouts.get(arg) or self._Layout(arg))
+
+    buf = self.buf
+    if width == _INT_WIDTH:
+      lo, hi = _unpack_int(buf, pos)
+      n = lo | (hi << 16)
+    elif width == 1:
+      n = ord(buf[pos])
+    else:
+      n, = _unpack_short(buf, pos)
+
+    if kind == _INT:
+      return n
+    if kind == _STR and self.version >= 2:
+      if n & encode._INLINE_STR:
+        return buf[pos:pos + ((n >> 16) & 0x7F)]
+      # Strings are interned, so share the decoded ones too.
+      s = self.strs.get(n)
+      if s is None:
+        s = self.strs[n] = self.Str(n)
+      return s
+    return self._Value(n, kind, arg, is_maybe)
+
+  def _Value(self, n, kind, arg, is_maybe):
+    """Decode a field or array item, given its integer value n."""
+    if kind == _INT:
+      return n
+    if kind == _OBJ:
+      # Block 0 is the header, so it's never an object.
+      if is_maybe and n == 0:
+        return None
+      return self.Obj(n, arg)
+    if kind == _STR:
+      return self.Str(n)
+    if kind == _ARRAY:
+      return self.Array(n, arg)
+    if kind == _ENUM:
+      return arg[n - 1]
+    if kind == _USER:
+      if is_maybe and n == 0:
+        return None
+      return self.user_lookup(n)
+    if kind == _BOOL:
+      return bool(n)
+    raise AssertionError(kind)
+
+  def Array(self, ref, item):
+    """
+    Args:
+      ref: block index
+      item: (width,) + the result of _Kind()
+    """
+    pos = ref * self.alignment
+    length = self.Int(pos)
+    width, kind, arg, is_maybe = item
+    read = self._Read
+
+    result = []
+    pos += _INT_WIDTH  # skip the length
+    for _ in xrange(length):
+      result.append(read(pos, width, kind, arg, is_maybe))
+      pos += width
+    return result
+
+  def _Tag(self, pos, desc):
+    """Return the tag and the position after it."""
+    if self.params.TagWidth(desc) == 1:
+      return ord(self.buf[pos]), pos + 1
+    return _unpack_short(self.buf, pos)[0], pos + 2
+
+  def _Record(self, pos, layout):
+    cls, fields = layout
+    obj = cls.__new__(cls)  # all fields are set below
+    read = self._Read
+    for name, offset, width, kind, arg, is_maybe in fields:
+      setattr(obj, name, read(pos + offset, width, kind, arg, is_maybe))
+    return obj
+
+  def Obj(self, ref, desc):
+    """Decode a compound object.
+
+    Args:
+      ref: block index
+      desc: asdl.Product or asdl.Sum
+    """
+    pos = ref * self.alignment
+    layout = self.layouts.get(desc) or self._Layout(desc)
+    if isinstance(layout, list):  # Sum: the record starts with the tag
+      tag, pos = self._Tag(pos, desc)
+      layout = layout[tag - 1]
+    return self._Record(pos, layout)
+
+
+def DecodeRoot(buf, root_desc, class_lookup, user_lookup):
+  """Decode the root object of an OHeap file.
+
+  Args:
+    buf: the contents of the file
+    root_desc: the ASDL type of the root, e.g. TYPE_LOOKUP.ByTypeName('arena')
+  """
+  dec = Decoder(buf, class_lookup, user_lookup)
+  return dec.Obj(dec.RootRef(), root_desc)
+
+
+def _MakeGetter(offset, width, kind, arg, is_maybe):
+  def Get(self):
+    return self._dec._Read(self._pos + offset, width, kind, arg, is_maybe)
+  return Get
+
+
+class LazyDecoder(Decoder):
+  """Like Decoder, but Obj() returns a view of the object.
+
+  A view is an instance of a subclass of the generated class, with a property
+  for each field.  So isinstance() and asdl/format.py work, but views are
+  read-only.  Arrays are decoded into lists of views.
+  """
+
+  def _SetVersion(self, version):
+    Decoder._SetVersion(self, version)
+    self.view_classes = {}  # generated class -> view class
+
+  def _ViewClass(self, cls, fields):
+    try:
+      return self.view_classes[cls]
+    except KeyError:
+      pass
+    namespace = {'__slots__': ('_dec', '_pos')}
+    for name, offset, width, kind, arg, is_maybe in fields:
+      namespace[name] = property(
+          _MakeGetter(offset, width, kind, arg, is_maybe))
+    # Same name, so it prints like the real class.
+    view_cls = type(cls.__name__, (cls,), namespace)
+    self.view_classes[cls] = view_cls
+    return view_cls
+
+  def _Record(self, pos, layout):
+    cls, fields = layout
+    view_cls = self._ViewClass(cls, fields)
+    view = view_cls.__new__(view_cls)
+    view._dec = self
+    view._pos = pos
+    return view
+
+
+def MapFile(path):
+  """Return a read-only mmap of a file, to pass to LazyRoot()."""
+  with open(path, 'rb') as f:
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def LazyRoot(buf, root_desc, class_lookup, user_lookup):
+  """Return a view of the root object of an OHeap file.
+
+  Like DecodeRoot(), but nothing below the root is decoded until it's
+  accessed.
+  """
+  dec = LazyDecoder(buf, class_lookup, user_lookup)
+  return dec.Obj(dec.RootRef(), root_desc)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+decode_test.py: Tests for decode.py
+"""
+
+import cStringIO
+import os
+import tempfile
+import unittest
+
+from asdl import encode
+from asdl import decode  # module under test
+from core import id_kind
+from core.id_kind import Id
+from osh import ast_ as ast
+
+
+def _Encode(node, version=1):
+  f = cStringIO.StringIO()
+  encode.EncodeRoot(node, encode.Params(version=version), encode.BinOutput(f))
+  return f.getvalue()
+
+
+def _RoundTrip(node, root_desc, version=1):
+  lookup = decode.MakeClassLookup(ast)
+  return decode.DecodeRoot(_Encode(node, version=version), root_desc, lookup,
+                           id_kind.IdInstance)
+
+
+def _MakeCommand():
+  t1 = ast.token(Id.Lit_Chars, 'echo', 0)
+  t2 = ast.token(Id.Lit_Chars, 'hi', 2)
+  words = [ast.CompoundWord([ast.LiteralPart(t)]) for t in (t1, t2)]
+  node = ast.SimpleCommand(words)
+  node.spids.append(0)
+  return node
+
+
+class DecodeTest(unittest.TestCase):
+
+  def testRoundTrip(self):
+    for version in (1, 2):
+      node = _MakeCommand()
+      n2 = _RoundTrip(node, ast.command.ASDL_TYPE, version=version)
+      self.assertEqual(repr(node), repr(n2))
+      self.assertEqual(ast.SimpleCommand, n2.__class__)
+      self.assertEqual([0], n2.spids)
+
+      tok = n2.words[1].parts[0].token
+      self.assertEqual(Id.Lit_Chars, tok.id)  # same instance
+      self.assertEqual('hi', tok.val)
+      self.assertEqual(2, tok.span_id)
+
+  def testEnumsAndMaybe(self):
+    for version in (1, 2):
+      node = ast.assign_pair(ast.LhsName('x'), ast.assign_op_e.Equal, None)
+      n2 = _RoundTrip(node, ast.assign_pair.ASDL_TYPE, version=version)
+      self.assertEqual('x', n2.lhs.name)
+      self.assertEqual(ast.assign_op_e.Equal, n2.op)  # same instance
+      self.assertEqual(None, n2.rhs)
+
+      a = ast.arena(['echo hi\n'], [ast.line_span(0, 0, 4)], ast.NoOp())
+      a2 = _RoundTrip(a, ast.arena.ASDL_TYPE, version=version)
+      self.assertEqual(['echo hi\n'], a2.lines)
+      self.assertEqual(4, a2.spans[0].length)
+      self.assertEqual(ast.NoOp, a2.root.__class__)
+
+  def testVersion2(self):
+    t1 = ast.token(Id.Lit_Chars, 'echo', 0)
+    t2 = ast.token(Id.Op_Semi, ';', 1)
+    t3 = ast.token(Id.Lit_Chars, '', 2)
+    words = [ast.CompoundWord([ast.LiteralPart(t)])
+             for t in (t1, t2, t3, t1, t2)]
+    node = ast.SimpleCommand(words)
+
+    buf = _Encode(node, version=2)
+    self.assertEqual(b'OHP\x02', buf[0:4])
+    self.assertEqual(1, buf.count(b'echo'))  # interned
+    self.assertTrue(len(buf) < len(_Encode(node, version=1)))
+
+    n2 = _RoundTrip(node, ast.command.ASDL_TYPE, version=2)
+    self.assertEqual(repr(node), repr(n2))
+    self.assertEqual(';', n2.words[1].parts[0].token.val)  # inline
+    self.assertEqual('', n2.words[2].parts[0].token.val)
+
+  def testErrors(self):
+    lookup = decode.MakeClassLookup(ast)
+    self.assertRaises(decode.DecodeError, decode.DecodeRoot, 'XXX\x01\x04\0\0\0',
+                      ast.command.ASDL_TYPE, lookup, id_kind.IdInstance)
+
+
+class LazyDecoderTest(unittest.TestCase):
+
+  def testLazyRoot(self):
+    node = _MakeCommand()
+    fd, path = tempfile.mkstemp()
+    try:
+      os.write(fd, _Encode(node, version=2))
+      os.close(fd)
+
+      buf = decode.MapFile(path)
+      lookup = decode.MakeClassLookup(ast)
+      view = decode.LazyRoot(buf, ast.command.ASDL_TYPE, lookup,
+                             id_kind.IdInstance)
+      self.assertTrue(isinstance(view, ast.SimpleCommand))
+      self.assertEqual(ast.command_e.SimpleCommand, view.tag)
+
+      tok = view.words[1].parts[0].token
+      self.assertEqual('hi', tok.val)
+      self.assertEqual(Id.Lit_Chars, tok.id)
+      self.assertEqual([0], view.spids)
+
+      # Views print like the real objects.
+      self.assertEqual(repr(node), repr(view))
+
+      # Read-only
+      self.assertRaises(AttributeError, setattr, tok, 'val', 'x')
+      buf.close()
+    finally:
+      os.unlink(path)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,5 +1,19 @@
 """
 encode.py
+
+Version 1 of the OHeap format stores every field as a 3 byte int or ref.
+
+Version 2 is more compact:
+
+- Enums, Ids, bools, and tags use as many bytes as the schema needs, usually 1.
+- Non-optional product types like token and line_span are stored inline in
+  their parent record or array, rather than as a ref.
+- Strings are interned, so a repeated value like 'echo' or '$' is written
+  once.  Strings of 0 or 1 bytes are stored inline in the field.
+- Identical arrays, like the many empty spids arrays, are written once.
+
+Params.FieldWidth() and Params.TagWidth() define the layout of records, and
+are shared with decode.py and gen_cpp.py.
 """
 
 import sys
@@ -27,9 +41,12 @@ class BinOutput:
     # index of last block, to return as a ref.
     self.last_block = 0
     self.alignment = alignment
+    # For version 2
+    self.strings = {}  # str -> ref
+    self.arrays = {}  # padded array block -> ref
 
   def WriteRootRef(self, chunk):
-    self.f.seek(5)  # seek past 'OHP\x01\x04'
+    self.f.seek(5)  # seek past 'OHP\x0N\x04'
 
     assert len(chunk) == 3
     self.f.write(chunk)
@@ -62,7 +79,10 @@ class Params:
   """
 
   def __init__(self, alignment=_DEFAULT_ALIGNMENT,
-               int_width=const.DEFAULT_INT_WIDTH):
+               int_width=const.DEFAULT_INT_WIDTH, version=1):
+    if version not in (1, 2):
+      raise ValueError('Invalid OHeap version %r' % version)
+    self.version = version
     self.alignment = alignment
     self.pointer_type = 'uint32_t'
 
@@ -78,6 +98,63 @@ class Params:
     self.max_index = 1 << (self.index_width * 8)
     self.max_tag = 1 << (self.tag_width * 8)
 
+    self.widths = {}  # type descriptor -> width, for version 2
+
+  def TagWidth(self, sum):
+    """Number of bytes for the tag of a compound sum type."""
+    if self.version == 1:
+      return self.tag_width
+    return _NumBytes(len(sum.types))
+
+  def FieldWidth(self, desc):
+    """Number of bytes a field or array item of the given type takes."""
+    if self.version == 1:
+      return self.ref_width
+    try:
+      return self.widths[desc]
+    except KeyError:
+      pass
+
+    d = desc
+    if isinstance(d, asdl.MaybeType):
+      d = d.desc
+
+    if isinstance(d, asdl.IntType):
+      width = self.int_width
+    elif isinstance(d, asdl.BoolType):
+      width = 1
+    elif isinstance(d, asdl.Sum) and asdl.is_simple(d):
+      width = _NumBytes(len(d.types))  # enum_id starts at 1
+    elif isinstance(d, asdl.UserType):
+      # Assume Id for now.  The instances are class attributes, e.g.
+      # Id.Lit_Chars.  0 is None.
+      width = _NumBytes(max(v.enum_value for v in vars(d.typ).itervalues()
+                            if isinstance(v, d.typ)))
+    elif self.IsInline(desc):
+      width = self.RecordSize(d)
+    else:
+      # Str, Array, Sum, or optional Product
+      width = self.ref_width
+
+    self.widths[desc] = width
+    return width
+
+  def IsInline(self, desc):
+    """Whether a field or array item of the given type is stored inline."""
+    return self.version >= 2 and isinstance(desc, asdl.Product)
+
+  def RecordSize(self, desc):
+    """Number of bytes for the fields of a Product or Constructor."""
+    return sum(self.FieldWidth(d) for _, d in desc.GetFields())
+
+  def UInt(self, n, width, chunk):
+    """Encode an unsigned int that the schema says fits in width bytes."""
+    if n >> (width * 8):
+      raise EncodeError('%d is too big to fit in %d bytes' % (n, width))
+    for i in range(width):
+      chunk.append(n & 0xFF)
+      n >>= 8
+
   def Tag(self, i, chunk):
     if i > self.max_tag:
       raise AssertionError('Invalid id %r' % i)
@@ -144,6 +221,21 @@ class Params:
     return self._Pad(chunk)
 
 
+def _NumBytes(max_value):
+  """Number of bytes for unsigned ints up to max_value."""
+  n = 1
+  while max_value >> (n * 8):
+    n += 1
+  return n
+
+
+# In version 2, the high bit of a 3 byte string field means the string is
+# inline, followed by its length.  The first 2 bytes are the string and a NUL,
+# so C++ can return a pointer to the field.
+_INLINE_STR = 0x800000
+_MAX_INLINE_STR = 1
+
+
 def EncodeArray(obj_list, item_desc, enc, out):
   """
   Args:
@@ -282,14 +374,127 @@ def EncodeObj(obj, enc, out):
   return this_ref
 
 
+def _EncodeStr2(s, enc, out, chunk):
+  if len(s) <= _MAX_INLINE_STR:
+    chunk.extend(s)
+    chunk.extend(b'\0' * (2 - len(s)))
+    chunk.append((_INLINE_STR >> 16) | len(s))
+    return
+
+  ref = out.strings.get(s)
+  if ref is None:
+    ref = out.Write(enc.PaddedStr(s))
+    out.strings[s] = ref
+  if ref & _INLINE_STR:
+    raise EncodeError('Too many blocks for a string ref (%d)' % ref)
+  enc.Ref(ref, chunk)
+
+
+def _EncodeValue2(val, desc, enc, out, chunk):
+  """Append a field or array item to the chunk, in version 2."""
+  d = desc
+  is_maybe = False
+  if isinstance(d, asdl.MaybeType):
+    is_maybe = True
+    d = d.desc
+
+  if isinstance(d, asdl.IntType):
+    enc.Int(val, chunk)
+
+  elif isinstance(d, asdl.BoolType):
+    enc.UInt(int(val), 1, chunk)
+
+  elif isinstance(d, asdl.Sum) and asdl.is_simple(d):
+    enc.UInt(val.enum_id, enc.FieldWidth(desc), chunk)
+
+  elif isinstance(d, asdl.StrType):
+    _EncodeStr2(val, enc, out, chunk)
+
+  elif isinstance(d, asdl.ArrayType):
+    item_desc = d.desc
+    array_chunk = bytearray()
+    enc.Int(len(val), array_chunk)  # Length prefix
+    for item in val:
+      _EncodeValue2(item, item_desc, enc, out, array_chunk)
+    # Arrays are immutable, so identical ones can share a block.  Most spids
+    # arrays are empty.
+    block = bytes(enc.PaddedBlock(array_chunk))
+    ref = out.arrays.get(block)
+    if ref is None:
+      ref = out.Write(block)
+      out.arrays[block] = ref
+    enc.Ref(ref, chunk)
+
+  elif isinstance(d, asdl.UserType):
+    # Assume Id for now.  0 is None.
+    n = 0 if val is None else val.enum_value
+    enc.UInt(n, enc.FieldWidth(desc), chunk)
+
+  elif is_maybe and val is None:
+    enc.Ref(0, chunk)
+
+  elif enc.IsInline(desc):
+    _EncodeFields2(val, enc, out, chunk)
+
+  else:
+    enc.Ref(_EncodeObj2(val, d, enc, out), chunk)
+
+
+def _EncodeFields2(obj, enc, out, chunk):
+  assert isinstance(obj, py_meta.CompoundObj), \
+    '%r is not a compound obj (%r)' % (obj, obj.__class__)
+
+  for name, desc in obj.ASDL_TYPE.GetFields():  # encode in order
+    field_val = getattr(obj, name)
+    try:
+      _EncodeValue2(field_val, desc, enc, out, chunk)
+    except EncodeError as e:
+      if not e.details_printed:
+        util.log("Error encoding %s : %s (val %s)", name, e, field_val)
+        e.details_printed = True
+      raise
+
+
+def _EncodeObj2(obj, desc, enc, out):
+  """Write a record in version 2.
+
+  Args:
+    desc: the declared type of obj, a Sum or Product.  A Sum determines the
+      width of the tag.
+
+  Returns:
+    ref
+  """
+  this_chunk = bytearray()
+  if isinstance(desc, asdl.Sum):
+    enc.UInt(obj.tag, enc.TagWidth(desc), this_chunk)
+  _EncodeFields2(obj, enc, out, this_chunk)
+  return out.Write(enc.PaddedBlock(this_chunk))
+
+
+def _DeclaredType(obj):
+  """Return the Product or Sum of an object, e.g. command for SimpleCommand."""
+  desc = obj.ASDL_TYPE
+  if isinstance(desc, asdl.Product):
+    return desc
+  for cls in obj.__class__.__mro__[1:]:
+    desc = cls.__dict__.get('ASDL_TYPE')
+    if isinstance(desc, asdl.Sum):
+      return desc
+  raise AssertionError("Couldn't find the sum type of %r" % obj)
+
+
 def EncodeRoot(obj, enc, out):
-  ref = out.Write(b'OHP\x01')  # header, version 1
+  ref = out.Write(b'OHP' + chr(enc.version))  # header
   assert ref == 0
   # 4-byte alignment, then 3 byte placeholder for the root ref.
   ref = out.Write(b'\4\0\0\0')
   assert ref == 1
 
-  root_ref = EncodeObj(obj, enc, out)
+  if enc.version == 1:
+    root_ref = EncodeObj(obj, enc, out)
+  else:
+    root_ref = _EncodeObj2(obj, _DeclaredType(obj), enc, out)
   chunk = bytearray()
   enc.Ref(root_ref, chunk)
   out.WriteRootRef(chunk)  # back up and write it
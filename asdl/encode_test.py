@@ -7,6 +7,7 @@ import unittest
 
 from asdl import encode  # module under test
 from asdl import const
+from osh import ast_ as ast
 
 
 class EncoderTest(unittest.TestCase):
@@ -32,6 +33,25 @@ class EncoderTest(unittest.TestCase):
 
     #p.Block([b'a', b'bc'])
 
+  def testWidths(self):
+    p = encode.Params(version=2)
+    self.assertEqual(1, p.FieldWidth(ast.assign_op_e.ASDL_TYPE))
+    self.assertEqual(1, p.TagWidth(ast.command.ASDL_TYPE))
+
+    # Inline: 1 byte Id, then 3 bytes each for val, span_id, and spids.
+    self.assertEqual(10, p.RecordSize(ast.token.ASDL_TYPE))
+    self.assertEqual(10, p.FieldWidth(ast.token.ASDL_TYPE))
+
+    chunk = bytearray()
+    p.UInt(255, 1, chunk)
+    self.assertEqual(b'\xff', chunk)
+    self.assertRaises(encode.EncodeError, p.UInt, 256, 1, chunk)
+
+    # Version 1 uses 3 bytes for everything.
+    p = encode.Params()
+    self.assertEqual(3, p.FieldWidth(ast.token.ASDL_TYPE))
+    self.assertEqual(3, p.FieldWidth(ast.assign_op_e.ASDL_TYPE))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -167,7 +167,7 @@ class ClassDefVisitor(AsdlVisitor):
 
   def __init__(self, f, enc_params, type_lookup, enum_types=None):
     AsdlVisitor.__init__(self, f)
-    self.ref_width = enc_params.ref_width
+    self.enc = enc_params
     self.type_lookup = type_lookup
     self.enum_types = enum_types or {}
     self.pointer_type = enc_params.pointer_type
@@ -204,7 +204,8 @@ class ClassDefVisitor(AsdlVisitor):
       type = sum.types[i]
       enum.append("%s = %d" % (type.name, i + 1))  # zero is reserved
 
-    self.Emit("enum class %s_e : uint8_t {" % name, depth)
+    int_type = 'uint8_t' if len(sum.types) < 256 else 'uint16_t'
+    self.Emit("enum class %s_e : %s {" % (name, int_type), depth)
     self.Emit(", ".join(enum), depth + 1)
     self.Emit("};", depth)
     self.Emit("", depth)
@@ -219,18 +220,21 @@ class ClassDefVisitor(AsdlVisitor):
 
     self._EmitEnum(sum, name, depth)
 
+    tag_width = self.enc.TagWidth(sum)
+    tag_expr = 'bytes_[0]' if tag_width == 1 else _IntExpr(tag_width, 0)
+
     Emit("class %(name)s_t : public Obj {")
     Emit(" public:")
     # All sum types have a tag
     Emit("%(name)s_e tag() const {", depth + 1)
-    Emit("return static_cast<%(name)s_e>(bytes_[0]);", depth + 2)
+    Emit("return static_cast<%(name)s_e>(%(tag_expr)s);", depth + 2)
     Emit("}", depth + 1)
     Emit("};")
     Emit("")
 
     super_name = "%s_t" % name
     for t in sum.types:
-      self.VisitConstructor(t, super_name, depth)
+      self.VisitConstructor(t, super_name, tag_width, depth)
 
     # rudimentary attribute handling
     for field in sum.attributes:
@@ -238,15 +242,16 @@ class ClassDefVisitor(AsdlVisitor):
       assert type in asdl.builtin_types, type
       Emit("%s %s;" % (type, field.name), depth + 1)
 
-  def VisitConstructor(self, cons, def_name, depth):
+  def VisitConstructor(self, cons, def_name, tag_width, depth):
     #print(dir(cons))
     if cons.fields:
       self.Emit("class %s : public %s {" % (cons.name, def_name), depth)
       self.Emit(" public:", depth)
-      offset = 1  #  for the ID
+      offset = tag_width  # fields start after the tag
       for f in cons.fields:
-        self.VisitField(f, cons.name, offset, depth + 1)
-        offset += self.ref_width
+        desc = cons.LookupFieldType(f.name)
+        self.VisitField(f, desc, cons.name, offset, depth + 1)
+        offset += self.enc.FieldWidth(desc)
       self.Emit("};", depth)
       self.Emit("", depth)
 
@@ -256,8 +261,9 @@ class ClassDefVisitor(AsdlVisitor):
     offset = 0
     for f in product.fields:
       type_name = '%s_t' % name
-      self.VisitField(f, type_name, offset, depth + 1)
-      offset += self.ref_width
+      desc = product.LookupFieldType(f.name)
+      self.VisitField(f, desc, type_name, offset, depth + 1)
+      offset += self.enc.FieldWidth(desc)
 
     for field in product.attributes:
       # rudimentary attribute handling
@@ -267,8 +273,12 @@ class ClassDefVisitor(AsdlVisitor):
     self.Emit("};", depth)
     self.Emit("", depth)
 
-  def VisitField(self, field, type_name, offset, depth):
+  def VisitField(self, field, desc, type_name, offset, depth):
     """
+    Args:
+      desc: the resolved type of the field, which determines its width and
+        whether it's inline.
+
     Even though they are inline, some of them can't be in the class {}, because
     static_cast<> requires inheritance relationships to be already declared.  We
     have to print all the classes first, then all the bodies that might use
@@ -298,7 +308,11 @@ class ClassDefVisitor(AsdlVisitor):
       self.Emit(size_body % locals(), depth + 1)
       self.Emit("}", depth)
 
-      ARRAY_OFFSET = 'int a = (index+1) * 3;'
+      # Items follow the 3 byte length.
+      item_desc = desc.desc
+      item_width = self.enc.FieldWidth(item_desc)
+      item_int = _IntExpr(item_width, 'a')
+      ARRAY_OFFSET = 'int a = 3 + index * %(item_width)d;'
       A_POINTER = (
           'inline const %(ctype)s %(maybe_qual_name)s('
           'const %(pointer_type)s* base, int index) const')
@@ -306,13 +320,14 @@ class ClassDefVisitor(AsdlVisitor):
       if ctype in ('bool', 'int'):
         func_header = A_POINTER + ' {'
         body_line1 = ARRAY_OFFSET
-        inline_body = 'return Ref(base, %(offset)d).Int(a);'
+        inline_body = 'return Ref(base, %(offset)d).%(item_int)s;'
 
       elif ctype.endswith('_e') or ctype in self.enum_types:
         func_header = A_POINTER + ' {'
         body_line1 = ARRAY_OFFSET
         inline_body = (
-            'return static_cast<const %(ctype)s>(Ref(base, %(offset)d).Int(a));')
+            'return static_cast<const %(ctype)s>('
+            'Ref(base, %(offset)d).%(item_int)s);')
 
       elif ctype == 'char*':
         func_header = A_POINTER + ' {'
@@ -327,12 +342,17 @@ class ClassDefVisitor(AsdlVisitor):
         func_def = A_POINTER + ' {'
         # This static_cast<> (downcast) causes problems if put within "class
         # {}".
-        func_body = (
-            'return static_cast<const %(ctype)s>('
-            'Ref(base, %(offset)d).Ref(base, a));')
+        if self.enc.IsInline(item_desc):
+          func_body = (
+              'return static_cast<const %(ctype)s>('
+              'Ref(base, %(offset)d).Inline(a));')
+        else:
+          func_body = (
+              'return static_cast<const %(ctype)s>('
+              'Ref(base, %(offset)d).Ref(base, a));')
 
         self.footer.extend(FormatLines(func_def % locals(), 0))
-        self.footer.extend(FormatLines(ARRAY_OFFSET, 1))
+        self.footer.extend(FormatLines(ARRAY_OFFSET % locals(), 1))
         self.footer.extend(FormatLines(func_body % locals(), 1))
         self.footer.append('}\n\n')
         maybe_qual_name = name  # RESET for later
@@ -343,13 +363,14 @@ class ClassDefVisitor(AsdlVisitor):
           'inline const %(ctype)s %(maybe_qual_name)s('
           'const %(pointer_type)s* base) const')
 
+      field_int = _IntExpr(self.enc.FieldWidth(desc), offset)
       if ctype in ('bool', 'int'):
         func_header = SIMPLE
-        inline_body = 'return Int(%(offset)d);'
+        inline_body = 'return %(field_int)s;'
 
       elif ctype.endswith('_e') or ctype in self.enum_types:
         func_header = SIMPLE
-        inline_body = 'return static_cast<const %(ctype)s>(Int(%(offset)d));'
+        inline_body = 'return static_cast<const %(ctype)s>(%(field_int)s);'
 
       elif ctype == 'char*':
         func_header = POINTER + " {"
@@ -364,6 +385,9 @@ class ClassDefVisitor(AsdlVisitor):
         if field.opt:
           func_body = (
               'return static_cast<const %(ctype)s>(Optional(base, %(offset)d));')
+        elif self.enc.IsInline(desc):
+          func_body = (
+              'return static_cast<const %(ctype)s>(Inline(%(offset)d));')
         else:
           func_body = (
               'return static_cast<const %(ctype)s>(Ref(base, %(offset)d));')
@@ -379,11 +403,18 @@ class ClassDefVisitor(AsdlVisitor):
     else:
       self.Emit(func_header % locals(), depth)
       if body_line1:
-        self.Emit(body_line1, depth + 1)
+        self.Emit(body_line1 % locals(), depth + 1)
       self.Emit(inline_body % locals(), depth + 1)
       self.Emit("}", depth)
 
 
+def _IntExpr(width, offset):
+  """Return C++ code to decode an unsigned int of the given width."""
+  if width == 3:
+    return 'Int(%s)' % offset
+  return 'Int%d(%s)' % (width, offset)
+
+
 # Used by osh/ast_gen.py
 class CEnumVisitor(AsdlVisitor):
 
@@ -402,8 +433,12 @@ def main(argv):
 
   # TODO: Also generate a switch/static_cast<> pretty printer in C++!  For
   # debugging.  Might need to detect cycles though.
-  if action == 'cpp':
+  if action == 'cpp':  # cpp SCHEMA [VERSION]
     schema_path = argv[2]
+    try:
+      version = int(argv[3])
+    except IndexError:
+      version = 1
     with open(schema_path) as input_f:
       module = asdl.parse(input_f)
 
@@ -428,17 +463,27 @@ def main(argv):
     # nodes?  Rewrite pointers.
 
     alignment = 4
-    enc = encode.Params(alignment)
-    d = {'pointer_type': enc.pointer_type}
+    enc = encode.Params(alignment, version=version)
+    d = {'pointer_type': enc.pointer_type, 'version': version}
 
     f.write("""\
 #include <cstdint>
 
+// The OHeap version these accessors read.
+const int kOHeapVersion = %(version)d;
+
 class Obj {
  public:
   // Decode a 3 byte integer from little endian
   inline int Int(int n) const;
 
+  // Decode 1 and 2 byte integers, for enums and tags in version 2
+  inline int Int1(int n) const;
+  inline int Int2(int n) const;
+
+  // A record stored inline, e.g. a product type in version 2
+  inline const Obj& Inline(int n) const;
+
   inline const Obj& Ref(const %(pointer_type)s* base, int n) const;
 
   inline const Obj* Optional(const %(pointer_type)s* base, int n) const;
@@ -463,6 +508,18 @@ inline int Obj::Int(int n) const {
   return bytes_[n] + (bytes_[n+1] << 8) + (bytes_[n+2] << 16);
 }
 
+inline int Obj::Int1(int n) const {
+  return bytes_[n];
+}
+
+inline int Obj::Int2(int n) const {
+  return bytes_[n] + (bytes_[n+1] << 8);
+}
+
+inline const Obj& Obj::Inline(int n) const {
+  return reinterpret_cast<const Obj&>(bytes_[n]);
+}
+
 inline const Obj& Obj::Ref(const %(pointer_type)s* base, int n) const {
   int offset = Int(n);
   return reinterpret_cast<const Obj&>(base[offset]);
@@ -477,10 +534,26 @@ inline const Obj* Obj::Optional(const %(pointer_type)s* base, int n) const {
   }
 }
 
+""" % d)
+
+    if version == 1:
+      f.write("""
 inline const char* Obj::Str(const %(pointer_type)s* base, int n) const {
   int offset = Int(n);
   return reinterpret_cast<const char*>(base + offset);
 }
+""" % d)
+    else:
+      # The high bit means the string is stored in the field, followed by a
+      # NUL.
+      f.write("""
+inline const char* Obj::Str(const %(pointer_type)s* base, int n) const {
+  if (bytes_[n+2] & 0x80) {
+    return reinterpret_cast<const char*>(bytes_ + n);
+  }
+  int offset = Int(n);
+  return reinterpret_cast<const char*>(base + offset);
+}
 """ % d)
   # uint32_t* and char*/Obj* aren't related, so we need to use
   # reinterpret_cast<>.
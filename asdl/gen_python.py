@@ -37,10 +37,9 @@ class GenClassesVisitor(gen_cpp.AsdlVisitor):
     field_names = [f.name for f in desc.fields]
 
     quoted_fields = repr(tuple(field_names))
-    # NOTE: FIELDS is a duplicate of __slots__, used for pretty printing and
-    # oheap serialization.  TODO: measure the effect of __slots__, and then get
-    # rid of FIELDS?  Or you can just make it an alias.
-    # FIELDS = self.__slots__.
+    # NOTE: __slots__ is the only record of the fields on the class.  Pretty
+    # printing and oheap serialization iterate over ASDL_TYPE.GetFields(),
+    # which has the same names in the same order, plus their descriptors.
     self.Emit('  ASDL_TYPE = TYPE_LOOKUP.ByTypeName(%r)' % name, depth)
     self.Emit('  __slots__ = %s' % quoted_fields, depth)
 
@@ -85,6 +84,7 @@ class GenClassesVisitor(gen_cpp.AsdlVisitor):
       self.Emit("class %s(%s):" % (cons.name, def_name), depth)
       self.Emit('  ASDL_TYPE = TYPE_LOOKUP.ByTypeName(%r)' % cons.name, depth)
       self.Emit('  tag = %d'  % tag_num, depth)
+      self.Emit('  __slots__ = ()', depth)
       self.Emit('', depth)
 
   def VisitCompoundSum(self, sum, name, depth):
@@ -94,8 +94,11 @@ class GenClassesVisitor(gen_cpp.AsdlVisitor):
       self.Emit('  %s = %d' % (variant.name, i + 1), depth)
     self.Emit('', depth)
 
+    # The base class also needs empty __slots__, or every subclass instance
+    # gets a __dict__.
     self.Emit('class %s(py_meta.CompoundObj):' % name, depth)
     self.Emit('  ASDL_TYPE = TYPE_LOOKUP.ByTypeName(%r)' % name, depth)
+    self.Emit('  __slots__ = ()', depth)
     self.Emit('', depth)
 
     # define command_t, and then make subclasses
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+"""
+oheap_decode.py -- Compare decoding an OHeap file with parsing the script.
+
+Usage:
+  asdl/oheap_decode.py SCRIPT OHEAP_FILE...
+
+Appends CSV rows of (elapsed_secs, method, format, path) to stdout, where
+method is:
+
+  parse   lex and parse SCRIPT
+  decode  read OHEAP_FILE and decode the whole tree
+  lazy    mmap OHEAP_FILE and look at the last top-level command
+
+format is 'text' for parse, and 'oheap1' or 'oheap2' for the others, from the
+header of each OHEAP_FILE.
+"""
+
+import csv
+import sys
+import time
+
+from asdl import decode
+from core import alloc
+from core import id_kind
+from core import reader
+from osh import ast_ as ast
+from osh import parse_lib
+
+
+def Parse(script_path):
+  arena = alloc.Pool().NewArena()
+  arena.PushSource(script_path)
+  with open(script_path) as f:
+    line_reader = reader.FileLineReader(f, arena)
+    _, c_parser = parse_lib.MakeParser(line_reader, arena)
+    return c_parser.ParseWholeFile()
+
+
+def Decode(oheap_path, class_lookup):
+  with open(oheap_path) as f:
+    buf = f.read()
+  return decode.DecodeRoot(buf, ast.command.ASDL_TYPE, class_lookup,
+                           id_kind.IdInstance)
+
+
+def Lazy(oheap_path, class_lookup):
+  buf = decode.MapFile(oheap_path)
+  root = decode.LazyRoot(buf, ast.command.ASDL_TYPE, class_lookup,
+                         id_kind.IdInstance)
+  if root.tag == ast.command_e.CommandList:
+    return root.children[-1].tag
+  return root.tag
+
+
+def _Format(oheap_path):
+  with open(oheap_path) as f:
+    return 'oheap%d' % ord(f.read(4)[3])
+
+
+def main(argv):
+  script_path = argv[1]
+  oheap_paths = argv[2:]
+  class_lookup = decode.MakeClassLookup(ast)
+
+  funcs = [('parse', 'text', lambda: Parse(script_path))]
+  for p in oheap_paths:
+    fmt = _Format(p)
+    # Bind p now, not when the lambda is called.
+    funcs.append(('decode', fmt, lambda p=p: Decode(p, class_lookup)))
+    funcs.append(('lazy', fmt, lambda p=p: Lazy(p, class_lookup)))
+
+  out = csv.writer(sys.stdout)
+  for method, fmt, func in funcs:
+    start_time = time.time()
+    func()
+    elapsed = time.time() - start_time
+    out.writerow(('%.4f' % elapsed, method, fmt, script_path))
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
@@ -10,7 +10,7 @@ int GetRootRef(uint8_t* image) {
   if (image[0] != 'O') return -1;
   if (image[1] != 'H') return -1;
   if (image[2] != 'P') return -1;
-  if (image[3] != 1) return -1;  // version 1
+  if (image[3] != kOHeapVersion) return -1;  // from osh.asdl.h
   if (image[4] != 4) return -1;  // alignment 4
 
   return image[5] + (image[6] << 8) + (image[7] << 16);
@@ -105,12 +105,18 @@ class Obj(object):
   # runtime after metaprogramming.
   ASDL_TYPE = None  # Used for type checking
 
+  # Every class in the hierarchy needs __slots__, or instances get a __dict__
+  # anyway.  DebugCompoundObj leaves it out because it needs a __dict__.
+  __slots__ = ()
+
 
 class SimpleObj(Obj):
   """An enum value.
 
   Other simple objects: int, str, maybe later a float.
   """
+  __slots__ = ('enum_id', 'name')
+
   def __init__(self, enum_id, name):
     self.enum_id = enum_id
     self.name = name
@@ -125,6 +131,8 @@ class CompoundObj(Obj):
   # types.  Never set for product types.
   tag = None
 
+  __slots__ = ()
+
   # NOTE: SimpleObj could share this.
   def __repr__(self):
     ast_f = fmt.TextOutput(util.Buffer())  # No color by default.
@@ -261,7 +269,9 @@ def MakeTypes(module, root, type_lookup):
 
         # e.g. for arith_expr
         # Should this be arith_expr_t?  It is in C++.
-        base_class = type(defn.name, (DebugCompoundObj, ), {})
+        # Like the generated code, the base class has the Sum type.
+        base_class = type(defn.name, (DebugCompoundObj, ),
+                          {'ASDL_TYPE': sum_type})
         setattr(root, defn.name, base_class)
 
         # Make a type and a enum tag for each alternative.
@@ -7,9 +7,27 @@ import re
 import unittest
 
 from asdl import py_meta  # module under test
+from core import runtime
+from core.id_kind import Id
+from osh import ast_ as ast
 
 class AsdlTest(unittest.TestCase):
-  pass
+
+  def testNoInstanceDict(self):
+    # Every class in the hierarchy has __slots__, so nodes don't get a
+    # __dict__.
+    tok = ast.token(Id.Lit_Chars, 'echo', 0)
+    part = ast.LiteralPart(tok)
+    nodes = [
+        tok,
+        ast.line_span(0, 0, 4),
+        part,
+        ast.CompoundWord([part]),
+        runtime.Str('x'),
+    ]
+    for node in nodes:
+      self.assertFalse(hasattr(node, '__dict__'), node.__class__.__name__)
+      self.assertRaises(AttributeError, setattr, node, 'bogus', 1)
 
 
 if __name__ == '__main__':
@@ -48,7 +48,8 @@ smoke-test() {
 asdl-cpp() {
   local schema=${1:-asdl/arith.asdl}
   local src=${2:-_tmp/arith.asdl.h}
-  asdl/gen_cpp.py cpp $schema > $src
+  local version=${3:-1}  # OHeap version
+  asdl/gen_cpp.py cpp $schema $version > $src
   ls -l $src
   wc -l $src
 }
@@ -115,11 +116,12 @@ gdb-trace() {
 
 build-demo() {
   local schema=$1
+  local version=${2:-1}
 
   local name=$(basename $schema .asdl)
 
   # Generate C++ code
-  asdl-cpp $schema _tmp/${name}.asdl.h
+  asdl-cpp $schema _tmp/${name}.asdl.h $version
 
   local bin=_tmp/${name}_demo 
   cxx -I _tmp -o $bin asdl/${name}_demo.cc
@@ -146,21 +148,27 @@ asdl-arith-oheap() {
 
 # TODO: How big is oheap vs. the virtual memory size?
 
+# Usage: osh-demo [VERSION]
 osh-demo() {
+  local version=${1:-1}
   local name=osh
   local data=_tmp/${name}.bin
+  local format=oheap
+  if test $version = 2; then
+    format=oheap2
+  fi
 
   local code='echo hi; echo bye  # comment' 
   local code='declare -r -x foo'  # for testing repeated array
   local code='echo x && echo y && echo z || die'  # for && || chains
   #local code='echo $(( 2 + 3 ))'
   #local code='echo $(( -2 * -3 ))'  # test negative integers
-  bin/osh -n --ast-format oheap -c "$code" > $data
+  bin/osh -n --ast-format $format -c "$code" > $data
 
   ls -l $data
 
   core/id_kind_gen.py cpp > _tmp/id_kind.h
-  build-demo osh/osh.asdl
+  build-demo osh/osh.asdl $version
 
   local bin=_tmp/${name}_demo 
   $bin $data
@@ -14,15 +14,21 @@ source benchmarks/common.sh
 
 readonly BASE_DIR=_tmp/oheap
 
+# Version 1 files are named *__oheap, and version 2 files are named *__oheap2.
+readonly FORMATS='oheap oheap2'
+
 encode-one() {
   local script=$1
-  local oheap_out=$2
-  bin/osh -n --ast-format oheap "$script" > $oheap_out
+  local format=$2
+  local oheap_out=$3
+  bin/osh -n --ast-format $format "$script" > $oheap_out
 }
 
 task-spec() {
   while read path; do
-    echo "$path _tmp/oheap/$(basename $path)__oheap"
+    for format in $FORMATS; do
+      echo "$path $format _tmp/oheap/$(basename $path)__$format"
+    done
   done < benchmarks/osh-parser-files.txt 
 }
 
@@ -32,7 +38,7 @@ encode-all() {
   local times_csv=_tmp/oheap/times.csv
   echo 'status,elapsed_secs' > $times_csv
 
-  task-spec | xargs -n 2 --verbose -- \
+  task-spec | xargs -n 3 --verbose -- \
     benchmarks/time.py --output $times_csv -- \
     $0 encode-one
 }
@@ -42,7 +48,7 @@ encode-all() {
 compress-oheap() {
   local c_dir=$BASE_DIR/oheap-compressed
   mkdir -p $c_dir
-  for bin in _tmp/oheap/*__oheap; do
+  for bin in _tmp/oheap/*__oheap _tmp/oheap/*__oheap2; do
     local name=$(basename $bin)
     log "Compressing $name"
     gzip --stdout $bin > $c_dir/$name.gz
@@ -79,8 +85,12 @@ print-csv() {
   print-size text xz $BASE_DIR/src-compressed/*.xz
 
   print-size oheap none $BASE_DIR/*__oheap
-  print-size oheap gz $BASE_DIR/oheap-compressed/*.gz
-  print-size oheap xz $BASE_DIR/oheap-compressed/*.xz 
+  print-size oheap gz $BASE_DIR/oheap-compressed/*__oheap.gz
+  print-size oheap xz $BASE_DIR/oheap-compressed/*__oheap.xz 
+
+  print-size oheap2 none $BASE_DIR/*__oheap2
+  print-size oheap2 gz $BASE_DIR/oheap-compressed/*__oheap2.gz
+  print-size oheap2 xz $BASE_DIR/oheap-compressed/*__oheap2.xz 
 }
 
 # This can be done on any host.
@@ -180,4 +190,38 @@ decode() {
   done
 }
 
+# Compare parsing each script with decoding its OHeap files in Python, both
+# eagerly and lazily with mmap.  Run encode-all first.
+decode-all() {
+  local out=$BASE_DIR/decode-times.csv
+  echo 'elapsed_secs,method,format,path' > $out
+
+  while read path; do
+    local prefix=$BASE_DIR/$(basename $path)
+    log "Decoding ${prefix}__*"
+    PYTHONPATH=. asdl/oheap_decode.py $path ${prefix}__oheap ${prefix}__oheap2 \
+      >> $out
+  done < benchmarks/osh-parser-files.txt
+  cat $out
+}
+
+# Encoded size of each file in both versions, in bytes.
+compare-sizes() {
+  local out=$BASE_DIR/version-sizes.csv
+  echo 'path,text,oheap,oheap2' > $out
+
+  while read path; do
+    local prefix=$BASE_DIR/$(basename $path)
+    echo "$path,$(stat -c %s $path),$(stat -c %s ${prefix}__oheap),$(stat -c %s ${prefix}__oheap2)"
+  done < benchmarks/osh-parser-files.txt >> $out
+  cat $out
+}
+
+# Encode every file in both versions, then report sizes and decode times.
+compare-versions() {
+  encode-all
+  compare-sizes
+  decode-all
+}
+
 "$@"
@@ -342,6 +342,27 @@ abuild-h() {
   done
 }
 
+# Throughput of $(cat big-file), which reads a multi-megabyte pipe.
+comsub-throughput() {
+  local out_dir=_tmp/osh-runtime
+  mkdir -p $out_dir
+
+  local out=$out_dir/comsub-throughput-times.csv
+  echo 'status,elapsed_secs,sh_path,num_mb' > $out
+
+  for num_mb in 1 4 16 64; do
+    local input=$out_dir/comsub-$num_mb.txt
+    head -c $((num_mb * 1000000)) /dev/zero | tr '\0' x > $input
+
+    for sh_path in bash dash mksh zsh $OSH; do
+      benchmarks/time.py --output $out --field "$sh_path" --field $num_mb -- \
+        $sh_path -c 'x=$(cat "$1"); echo ${#x}' dummy $input
+    done
+  done
+
+  cat $out
+}
+
 #
 # Misc
 #
@@ -73,6 +73,7 @@ from core import cmd_exec
 from core.id_kind import Id
 from core import legacy
 from core import lexer  # for tracing
+from core import parse_cache
 from core import process
 from core import reader
 from core import state
@@ -102,7 +103,9 @@ def InteractiveLoop(opts, ex, c_parser, w_parser, line_reader):
   else:
     ast_f = None
 
+  arena = ex.arena
   while True:
+    mark = arena.SaveMark()
     try:
       w = c_parser.Peek()
     except KeyboardInterrupt:
@@ -130,11 +133,22 @@ def InteractiveLoop(opts, ex, c_parser, w_parser, line_reader):
       if ast_f:
         ast.PrettyPrint(node)
 
+      keep_arena = c_parser.saw_func_def
+      parsed_mark = arena.SaveMark()
+
       status = ex.Execute(node)
 
       if opts.print_status:
         print('STATUS', repr(status))
 
+      # Free lines and spans unless they're needed later.  See
+      # Executor.MainLoop().
+      if not keep_arena and arena.SaveMark() == parsed_mark:
+        arena.ReleaseToMark(mark)
+
+    # Show all output before the next prompt.
+    sys.stdout.flush()
+
     # Reset prompt to PS1.
     line_reader.Reset()
 
@@ -146,6 +160,18 @@ def InteractiveLoop(opts, ex, c_parser, w_parser, line_reader):
     c_parser.Reset()
 
 
+def _DumpRuntimeMem(out_path):
+  # This might be superstition, but we want to let the value stabilize
+  # after parsing.  bash -c 'cat /proc/$$/status' gives different results
+  # with a sleep.
+  time.sleep(0.001)
+  input_path = '/proc/%d/status' % os.getpid()
+  with open(input_path) as f, open(out_path, 'w') as f2:
+    contents = f.read()
+    f2.write(contents)
+    log('Wrote %s to %s (--runtime-mem-dump)', input_path, out_path)
+
+
 # bash --noprofile --norc uses 'bash-4.3$ '
 OSH_PS1 = 'osh$ '
 
@@ -185,7 +211,8 @@ def OshMain(argv, login_shell):
   spec.LongFlag('--help')
   spec.LongFlag('--version')
   spec.LongFlag('--ast-format',
-                ['text', 'abbrev-text', 'html', 'abbrev-html', 'oheap', 'none'],
+                ['text', 'abbrev-text', 'html', 'abbrev-html', 'oheap', 'oheap2',
+                 'none'],
                 default='abbrev-text')
   spec.LongFlag('--show-ast')  # execute and show
   spec.LongFlag('--fix')
@@ -193,6 +220,12 @@ def OshMain(argv, login_shell):
   spec.LongFlag('--print-status')
   spec.LongFlag('--trace', ['cmd-parse', 'word-parse', 'lexer'])  # NOTE: can only trace one now
   spec.LongFlag('--hijack-shebang')
+  spec.LongFlag('--no-parse-cache')  # don't cache the LST of sourced files
+  spec.LongFlag('--parse-cache-stats')  # print hits and misses on exit
+  spec.LongFlag('--builtin-stats')  # print calls and time per builtin on exit
+  spec.LongFlag('--runtime-stats')  # print reuse of the exported env on exit
+  # A command sub with more output is a fatal error.
+  spec.LongFlag('--max-comsub-bytes', args.Int)
 
   # For benchmarks/*.sh
   spec.LongFlag('--parser-mem-dump', args.Str)
@@ -252,9 +285,14 @@ def OshMain(argv, login_shell):
   exec_opts = state.ExecOpts(mem)
   builtin.SetExecOpts(exec_opts, opts.opt_changes)
 
+  process.BufferStdout()
   fd_state = process.FdState()
+  cache_dir = None if opts.no_parse_cache else parse_cache.DefaultDir(os.environ)
+  p_cache = parse_cache.ParseCache(cache_dir) if cache_dir else None
+
   ex = cmd_exec.Executor(mem, fd_state, status_lines, funcs, completion,
-                         comp_lookup, exec_opts, arena)
+                         comp_lookup, exec_opts, arena, parse_cache=p_cache,
+                         max_comsub_bytes=opts.max_comsub_bytes or 0)
 
   # NOTE: The rc file can contain both commands and functions... ideally we
   # would only want to save nodes/lines for the functions.
@@ -284,6 +322,7 @@ def OshMain(argv, login_shell):
     arena.PushSource('<command string>')
     line_reader = reader.StringLineReader(opts.c, arena)
     interactive = False
+    one_at_a_time = True
   elif opts.i:  # force interactive
     arena.PushSource('<stdin -i>')
     line_reader = reader.InteractiveLineReader(OSH_PS1, arena)
@@ -300,6 +339,8 @@ def OshMain(argv, login_shell):
         arena.PushSource('<stdin>')
         line_reader = reader.FileLineReader(sys.stdin, arena)
         interactive = False
+        # Parse all of stdin first, since commands may read from it too.
+        one_at_a_time = False
     else:
       arena.PushSource(script_name)
       try:
@@ -309,6 +350,7 @@ def OshMain(argv, login_shell):
         return 1
       line_reader = reader.FileLineReader(f, arena)
       interactive = False
+      one_at_a_time = True
 
   # TODO: assert arena.NumSourcePaths() == 1
   # TODO: .rc file needs its own arena.
@@ -321,13 +363,20 @@ def OshMain(argv, login_shell):
       splitter = legacy.SplitContext(mem)
       ev = word_eval.CompletionWordEvaluator(mem, exec_opts, splitter)
       status_out = completion.StatusOutput(status_lines, exec_opts)
-      completion.Init(pool, builtin.BUILTIN_DEF, mem, funcs, comp_lookup,
-                      status_out, ev)
+      completion.Init(pool, builtin.BUILTIN_DEF, mem, ex.search_path, funcs,
+                      comp_lookup, status_out, ev)
 
     InteractiveLoop(opts, ex, c_parser, w_parser, line_reader)
     # TODO: status should be last command.  Start bash, type "f() { return 33;
     # }; f"
     status = 0
+  elif (one_at_a_time and not opts.fix and not exec_opts.noexec and
+        not opts.show_ast and not opts.parser_mem_dump):
+    # Parse and execute one command at a time, freeing memory as we go.
+    _tlog('MainLoop')
+    status = ex.MainLoop(c_parser, w_parser)
+    if opts.runtime_mem_dump:
+      _DumpRuntimeMem(opts.runtime_mem_dump)
   else:
     # Parse the whole thing up front
     #print('Parsing file')
@@ -375,13 +424,14 @@ def OshMain(argv, login_shell):
     if exec_opts.noexec or opts.show_ast:
       if opts.ast_format == 'none':
         print('AST not printed.', file=sys.stderr)
-      elif opts.ast_format == 'oheap':
+      elif opts.ast_format in ('oheap', 'oheap2'):
         # TODO: Make this a separate flag?
         if sys.stdout.isatty():
           raise RuntimeError('ERROR: Not dumping binary data to a TTY.')
         f = sys.stdout
 
-        enc = encode.Params()
+        version = 2 if opts.ast_format == 'oheap2' else 1
+        enc = encode.Params(version=version)
         out = encode.BinOutput(f)
         encode.EncodeRoot(node, enc, out)
 
@@ -411,20 +461,19 @@ def OshMain(argv, login_shell):
       # NOTE: 'exit 1' is ControlFlow and gets here, but subshell/commandsub
       # don't because they call sys.exit().
       if opts.runtime_mem_dump:
-        # This might be superstition, but we want to let the value stabilize
-        # after parsing.  bash -c 'cat /proc/$$/status' gives different results
-        # with a sleep.
-        time.sleep(0.001)
-        input_path = '/proc/%d/status' % os.getpid()
-        with open(input_path) as f, open(opts.runtime_mem_dump, 'w') as f2:
-          contents = f.read()
-          f2.write(contents)
-          log('Wrote %s to %s (--runtime-mem-dump)', input_path,
-              opts.runtime_mem_dump)
+        _DumpRuntimeMem(opts.runtime_mem_dump)
 
     else:
       status = 0
 
+  if opts.parse_cache_stats and p_cache:
+    log('parse cache: %s', p_cache.Stats())
+  if opts.builtin_stats:
+    for line in ex.BuiltinStats():
+      log('builtin %s', line)
+  if opts.runtime_stats:
+    log('runtime: %s', mem.ExportStats())
+
   return status
 
 
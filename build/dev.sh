@@ -70,6 +70,16 @@ pylibc() {
   PYTHONPATH=. native/libc_test.py
 }
 
+pyspawn() {
+  py-ext spawn build/setup_spawn.py
+  PYTHONPATH=. native/spawn_test.py
+}
+
+pyfastsplit() {
+  py-ext fastsplit build/setup_fastsplit.py
+  PYTHONPATH=. native/fastsplit_test.py
+}
+
 fastlex() {
   build/codegen.sh ast-id-lex
 
@@ -81,7 +91,7 @@ fastlex() {
 }
 
 clean() {
-  rm -f --verbose libc.so fastlex.so
+  rm -f --verbose libc.so fastlex.so spawn.so fastsplit.so
   rm -r -f --verbose _devbuild/py-ext
 }
 
@@ -95,6 +105,8 @@ minimal() {
   gen-osh-asdl
   gen-runtime-asdl
   pylibc
+  pyspawn
+  pyfastsplit
 }
 
 # Prerequisites: build/codegen.sh {download,install}-re2c
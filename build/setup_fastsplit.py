@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+from distutils.core import setup, Extension
+
+module = Extension('fastsplit',
+                    sources = ['native/fastsplit.c'],
+                    undef_macros = ['NDEBUG'])
+
+setup(name = 'fastsplit',
+      version = '1.0',
+      description = 'Module for IFS splitting',
+      ext_modules = [module])
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+from distutils.core import setup, Extension
+
+module = Extension('spawn',
+                    sources = ['native/spawn.c'],
+                    undef_macros = ['NDEBUG'])
+
+setup(name = 'spawn',
+      version = '1.0',
+      description = 'Module for starting processes with posix_spawn()',
+      ext_modules = [module])
@@ -11,9 +11,12 @@ Arena, and the entire Arena can be discarded at once.
 Also, we don't want to save comment lines.
 """
 
+import array
+
 from asdl import const
 
 from core import util
+from osh import ast_ as ast
 
 
 class Arena(object):
@@ -37,14 +40,17 @@ class Arena(object):
     self.lines = []
     self.next_line_id = 0
 
-    # first real span is 1.  0 means undefined.
-    self.spans = []
-    self.next_span_id = 0
-
-    # List of (src_path index, physical line number).  This is two integers for
-    # every line read.  We could use a clever encoding of this.  (Although the
-    # it's probably more important to compact the ASDL representation.)
-    self.debug_info = []
+    # Spans are stored in parallel columns of C ints, indexed by span_id,
+    # rather than as a list of line_span objects.  There's one span for every
+    # token, so this is a big part of the parser's memory usage.  line_span
+    # objects are only created on demand by GetLineSpan().
+    self.span_line_ids = array.array('i')
+    self.span_cols = array.array('i')
+    self.span_lengths = array.array('i')
+
+    # Columns of (src_path index, physical line number), indexed by line_id.
+    self.line_src_ids = array.array('i')
+    self.line_nums = array.array('i')
     self.src_paths = []  # list of source paths
     self.src_id_stack = []  # stack of src_id integers
 
@@ -74,9 +80,31 @@ class Arena(object):
     line_id = self.next_line_id
     self.lines.append(line)
     self.next_line_id += 1
-    self.debug_info.append((self.src_id_stack[-1], line_num))
+    self.line_src_ids.append(self.src_id_stack[-1])
+    self.line_nums.append(line_num)
     return line_id
 
+  def SaveMark(self):
+    """Return the current end of the arena, to pass to ReleaseToMark()."""
+    return len(self.lines), len(self.span_line_ids)
+
+  def ReleaseToMark(self, mark):
+    """Free all lines and spans added since SaveMark() returned 'mark'.
+
+    This is like setstackmark() and popstackmark() in dash.  Span and line IDs
+    are indices, so only the most recent ones can be freed, and they will be
+    reused.
+    """
+    num_lines, num_spans = mark
+    del self.lines[num_lines:]
+    del self.line_src_ids[num_lines:]
+    del self.line_nums[num_lines:]
+    self.next_line_id = num_lines
+
+    del self.span_line_ids[num_spans:]
+    del self.span_cols[num_spans:]
+    del self.span_lengths[num_spans:]
+
   def ClearLastLine(self):
     """Call if it was a comment."""
     pass
@@ -89,20 +117,34 @@ class Arena(object):
     assert line_id >= 0, line_id
     return self.lines[line_id]
 
+  def AddSpan(self, line_id, col, length):
+    """Like AddLineSpan, but without allocating a line_span.
+
+    The lexer calls this for every token.
+    """
+    span_id = len(self.span_line_ids)
+    self.span_line_ids.append(line_id)
+    self.span_cols.append(col)
+    self.span_lengths.append(length)
+    return span_id
+
   def AddLineSpan(self, line_span):
     """
     TODO: Add an option of whether to save the line?  You can retrieve it on
     disk in many cases.
     """
-    span_id = self.next_span_id
-    self.spans.append(line_span)
-    self.next_span_id += 1
-    return span_id
+    return self.AddSpan(line_span.line_id, line_span.col, line_span.length)
+
+  def NumSpans(self):
+    return len(self.span_line_ids)
 
   def GetLineSpan(self, span_id):
+    """Return a new line_span, e.g. for error messages."""
     assert span_id != const.NO_INTEGER, span_id
     try:
-      return self.spans[span_id]
+      return ast.line_span(self.span_line_ids[span_id],
+                           self.span_cols[span_id],
+                           self.span_lengths[span_id])
     except IndexError:
       util.log('Span ID out of range: %d', span_id)
       raise
@@ -110,7 +152,8 @@ class Arena(object):
   def GetDebugInfo(self, line_id):
     """Get the path and physical line number, for parse errors."""
     assert line_id != const.NO_INTEGER, line_id
-    src_id , line_num = self.debug_info[line_id]
+    src_id = self.line_src_ids[line_id]
+    line_num = self.line_nums[line_id]
     try:
       path = self.src_paths[src_id]
     except IndexError:
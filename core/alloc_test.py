@@ -6,6 +6,7 @@ alloc_test.py: Tests for alloc.py
 import unittest
 
 from core import alloc  # module under test
+from osh import ast_ as ast
 
 
 class AllocTest(unittest.TestCase):
@@ -23,8 +24,16 @@ class AllocTest(unittest.TestCase):
     line_id = arena.AddLine('line 2', 2)
     self.assertEqual(1, line_id)
 
-    span_id = arena.AddLineSpan(None)
+    span_id = arena.AddLineSpan(ast.line_span(0, 2, 4))
     self.assertEqual(0, span_id)
+    span_id = arena.AddSpan(1, 0, 6)
+    self.assertEqual(1, span_id)
+    self.assertEqual(2, arena.NumSpans())
+
+    span = arena.GetLineSpan(0)
+    self.assertEqual((0, 2, 4), (span.line_id, span.col, span.length))
+    span = arena.GetLineSpan(1)
+    self.assertEqual((1, 0, 6), (span.line_id, span.col, span.length))
 
     arena.PopSource()
 
@@ -50,6 +59,30 @@ class AllocTest(unittest.TestCase):
     self.assertEqual(('two.oil', 2), arena.GetDebugInfo(id2))
     self.assertEqual(('one.oil', 3), arena.GetDebugInfo(id3))
 
+  def testReleaseToMark(self):
+    arena = self.arena
+    arena.PushSource('one.oil')
+
+    line_id = arena.AddLine('f() { echo hi; }', 1)
+    arena.AddSpan(line_id, 0, 1)
+    mark = arena.SaveMark()
+
+    line_id = arena.AddLine('echo 2', 2)
+    self.assertEqual(1, line_id)
+    arena.AddSpan(line_id, 0, 4)
+    arena.AddSpan(line_id, 5, 1)
+    self.assertEqual(3, arena.NumSpans())
+
+    arena.ReleaseToMark(mark)
+    self.assertEqual(1, arena.NumSpans())
+    self.assertEqual(mark, arena.SaveMark())
+
+    # IDs are reused
+    line_id = arena.AddLine('echo 3', 3)
+    self.assertEqual(1, line_id)
+    self.assertEqual(1, arena.AddSpan(line_id, 0, 4))
+    self.assertEqual(('one.oil', 3), arena.GetDebugInfo(line_id))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -27,6 +27,8 @@ http://pubs.opengroup.org/onlinepubs/9699919799/utilities/V3_chap02.html#tag_18_
 """
 
 import os
+import re
+import stat
 import sys
 
 from core import args
@@ -42,6 +44,11 @@ from osh import lex
 
 from _devbuild.gen import osh_help  # generated file
 
+try:
+  import fastlex
+except ImportError:
+  fastlex = None
+
 value_e = runtime.value_e
 scope_e = runtime.scope_e
 span_e = runtime.span_e
@@ -53,7 +60,7 @@ e_die = util.e_die
 # NOTE: NONE is a special value.
 
 EBuiltin = util.Enum('EBuiltin', """
-NONE READ ECHO SHIFT
+NONE READ MAPFILE ECHO PRINTF SHIFT
 CD PUSHD POPD DIRS
 EXPORT UNSET SET SHOPT
 TRAP UMASK
@@ -62,7 +69,7 @@ COMPLETE COMPGEN DEBUG_LINE
 TRUE FALSE
 COLON
 TEST BRACKET GETOPTS
-COMMAND TYPE HELP
+COMMAND TYPE HASH HELP
 DECLARE TYPESET
 """.split())
 
@@ -97,7 +104,10 @@ _SPECIAL_BUILTINS = {
 
 _NORMAL_BUILTINS = {
     "read": EBuiltin.READ,
+    "mapfile": EBuiltin.MAPFILE,
+    "readarray": EBuiltin.MAPFILE,
     "echo": EBuiltin.ECHO,
+    "printf": EBuiltin.PRINTF,
     "cd": EBuiltin.CD,
     "pushd": EBuiltin.PUSHD,
     "popd": EBuiltin.POPD,
@@ -123,6 +133,7 @@ _NORMAL_BUILTINS = {
 
     "command": EBuiltin.COMMAND,
     "type": EBuiltin.TYPE,
+    "hash": EBuiltin.HASH,
 
     "declare": EBuiltin.DECLARE,
     "typeset": EBuiltin.TYPESET,
@@ -147,6 +158,14 @@ class BuiltinDef(object):
     self.arg_specs = {}
     self.to_complete = sorted(names)
 
+    # name -> (EBuiltin, is_special).  declare and typeset are in both
+    # tables; the special entry wins, as in ResolveSpecial().
+    self.builtin_ids = {}
+    for name, builtin_id in _NORMAL_BUILTINS.iteritems():
+      self.builtin_ids[name] = (builtin_id, False)
+    for name, builtin_id in _SPECIAL_BUILTINS.iteritems():
+      self.builtin_ids[name] = (builtin_id, True)
+
   def GetNamesToComplete(self):
     """For completion of builtin names."""
     return self.to_complete
@@ -178,7 +197,8 @@ def Resolve(argv0):
 # Implementation of builtins.
 #
 
-ECHO_LEXER = lexer.SimpleLexer(lex.ECHO_E_DEF)
+ECHO_LEXER = lexer.SimpleLexer(
+    lex.ECHO_E_DEF, fastlex.MatchEchoToken if fastlex else None)
 
 ECHO_SPEC = _Register('echo')
 ECHO_SPEC.ShortFlag('-e')  # no backslash escapes
@@ -205,6 +225,9 @@ def Echo(argv):
   if arg.e:
     new_argv = []
     for a in argv:
+      if '\\' not in a:  # no escapes, so don't lex it
+        new_argv.append(a)
+        continue
       parts = []
       for id_, value in ECHO_LEXER.Tokens(a):
         p = word_compile.EvalCStringToken(id_, value)
@@ -232,18 +255,305 @@ def Echo(argv):
   if not arg.n:
     sys.stdout.write('\n')
 
-  # Do I need the flush?  Had a problem here under load, but it might not have
-  # been because of that.
-  # File "/home/andy/git/oil/bin/../core/cmd_exec.py", line 251, in _RunBuiltin
-  #   status = builtin.Echo(argv)
-  # File "/home/andy/git/oil/bin/../core/builtin.py", line 431, in Echo
-  #   sys.stdout.flush()
-  # IOError: [Errno 32] Broken pipe
-
-  sys.stdout.flush()
+  # NOTE: No flush here.  FdState flushes before fd 1 changes or the shell
+  # forks, and the Executor flushes after each builtin when stdout is a
+  # terminal.
   return 0
 
 
+PRINTF_LEXER = lexer.SimpleLexer(lex.PRINTF_DEF)
+
+PRINTF_SPEC = _Register('printf')
+PRINTF_SPEC.ShortFlag('-v', args.Str)  # assign to a variable
+
+# flags, width, precision, length modifiers (ignored), and the conversion.
+_PRINTF_DIRECTIVE_RE = re.compile(
+    r'%([-+ #0]*)(\*|[0-9]+)?(?:\.(\*|[0-9]*))?[hlLjzt]*(.?)')
+
+_PRINTF_INT_CHARS = 'diouxX'
+_PRINTF_FLOAT_CHARS = 'fFeEgG'
+_PRINTF_STR_CHARS = 'sbqc'
+
+# Like strtoimax() with base 0: leading space, a sign, and a hex, octal, or
+# decimal number.  Anything after it is an error.
+_PRINTF_INT_RE = re.compile(
+    r'[ \t\n\r\v\f]*([-+]?)(0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)?')
+_PRINTF_FLOAT_RE = re.compile(
+    r'[ \t\n\r\v\f]*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?')
+
+_INT64_MAX = (1 << 63) - 1
+_INT64_MIN = -(1 << 63)
+_UINT64_MAX = (1 << 64) - 1
+
+# printf -v a[1]
+_PRINTF_INDEXED_NAME_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\[([0-9]+)\]$')
+
+_MAX_PRINTF_FORMATS = 100
+_printf_cache = {}  # format string -> list of parts
+
+
+class _PrintfError(Exception):
+  pass
+
+
+def _EvalCString(lex, s):
+  """Evaluate the backslash escapes in s.
+
+  Returns:
+    (string, whether \c was seen)
+  """
+  parts = []
+  for id_, value in lex.Tokens(s):
+    p = word_compile.EvalCStringToken(id_, value)
+    if p is None:  # \c in %b
+      return ''.join(parts), True
+    parts.append(p)
+  return ''.join(parts), False
+
+
+def _ParsePrintfFormat(fmt):
+  """
+  Returns:
+    A list of parts.  A part is either a literal string, or a directive tuple
+    of (flags, width, precision, conversion char).
+
+  Raises:
+    _PrintfError
+  """
+  try:
+    return _printf_cache[fmt]
+  except KeyError:
+    pass
+
+  parts = []
+  pos = 0
+  n = len(fmt)
+  while pos < n:
+    i = fmt.find('%', pos)
+    if i == -1:
+      i = n
+    if i != pos:
+      s, _ = _EvalCString(PRINTF_LEXER, fmt[pos:i])
+      parts.append(s)
+    if i == n:
+      break
+
+    m = _PRINTF_DIRECTIVE_RE.match(fmt, i)
+    flags, width, precision, conv = m.groups()
+    if conv == '%':
+      parts.append('%')
+    elif conv and conv in (
+        _PRINTF_INT_CHARS + _PRINTF_FLOAT_CHARS + _PRINTF_STR_CHARS):
+      parts.append((flags, width, precision, conv))
+    elif conv:
+      raise _PrintfError('%s: invalid format character' % m.group(0))
+    else:
+      raise _PrintfError('%s: missing format character' % m.group(0))
+    pos = m.end(0)
+
+  if len(_printf_cache) >= _MAX_PRINTF_FORMATS:
+    _printf_cache.clear()
+  _printf_cache[fmt] = parts
+  return parts
+
+
+def _PrintfInt(s, unsigned=False):
+  """Convert a printf argument to a 64-bit integer, like bash.
+
+  Out of range values are clamped with a warning.  For unsigned conversions,
+  negative values wrap around.
+
+  Returns:
+    (integer, ok).  If the arg has trailing chars, like '5x', ok is False and
+    the integer is the value of the prefix.
+  """
+  if s[:1] in ('"', "'"):  # printf %d "'A" prints 65
+    return (ord(s[1]) if len(s) > 1 else 0), True
+  if not s:
+    return 0, True
+
+  m = _PRINTF_INT_RE.match(s)
+  sign, digits = m.groups()
+  if not digits:
+    return 0, False
+  v = int(digits, 0)  # 0x1f and 017 too
+  if sign == '-':
+    v = -v
+
+  if unsigned:
+    if abs(v) > _UINT64_MAX:
+      util.warn('printf: %s: Numerical result out of range', s)
+      v = _UINT64_MAX
+    elif v < 0:
+      v += 1 << 64
+  elif not _INT64_MIN <= v <= _INT64_MAX:
+    util.warn('printf: %s: Numerical result out of range', s)
+    v = _INT64_MAX if v > 0 else _INT64_MIN
+
+  return v, m.end() == len(s)
+
+
+def _PrintfFloat(s):
+  """Like _PrintfInt, but for floats."""
+  if s[:1] in ('"', "'"):
+    return (float(ord(s[1])) if len(s) > 1 else 0.0), True
+  if not s:
+    return 0.0, True
+
+  m = _PRINTF_FLOAT_RE.match(s)
+  if m and m.end() == len(s):
+    return float(s), True
+  if not s[-1].isspace():  # Python allows trailing space, but bash doesn't
+    try:
+      return float(s), True  # inf, nan
+    except ValueError:
+      pass
+  if m:
+    return float(m.group(0)), False
+  return 0.0, False
+
+
+# Like bash, only quote these at the start of a word.
+_QUOTE_SAFE_CHARS = frozenset(
+    'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    '%+-./:=@_')
+_QUOTE_SAFE_AFTER_START = frozenset('#~')
+
+_DOLLAR_SQ_ESCAPES = {
+    '\a': r'\a', '\b': r'\b', '\x1b': r'\E', '\f': r'\f', '\n': r'\n',
+    '\r': r'\r', '\t': r'\t', '\v': r'\v', "'": r"\'", '\\': r'\\',
+}
+
+
+def _ShellQuote(s):
+  """For printf %q.  The result can be read back by the shell."""
+  if not s:
+    return "''"
+
+  if any(c < ' ' or c >= '\x7f' for c in s):
+    out = []
+    for c in s:
+      e = _DOLLAR_SQ_ESCAPES.get(c)
+      if e is None:
+        e = c if ' ' <= c < '\x7f' else '\\%03o' % ord(c)
+      out.append(e)
+    return "$'%s'" % ''.join(out)
+
+  out = []
+  for i, c in enumerate(s):
+    if not (c in _QUOTE_SAFE_CHARS or
+            (i != 0 and c in _QUOTE_SAFE_AFTER_START)):
+      out.append('\\')
+    out.append(c)
+  return ''.join(out)
+
+
+def _Printf(parts, argv, out):
+  """Format argv with parts, reusing the format while there are args left.
+
+  Returns:
+    status
+  """
+  status = 0
+  n = len(argv)
+  i = 0
+  while True:
+    start = i
+    for part in parts:
+      if isinstance(part, str):
+        out.append(part)
+        continue
+
+      flags, width, precision, conv = part
+      if width == '*':
+        w, _ = _PrintfInt(argv[i]) if i < n else (0, True)
+        i += 1
+        if w < 0:
+          flags += '-'
+          w = -w
+        width = str(w)
+      if precision == '*':
+        p, _ = _PrintfInt(argv[i]) if i < n else (0, True)
+        i += 1
+        precision = str(p) if p >= 0 else None
+
+      spec = '%' + flags + (width or '')
+      if precision is not None:
+        spec += '.' + precision
+
+      arg = argv[i] if i < n else ''
+      i += 1
+
+      if conv in _PRINTF_FLOAT_CHARS:
+        f, ok = _PrintfFloat(arg)
+        if not ok:
+          util.error('printf: %s: invalid number', arg)
+          status = 1
+        out.append((spec + conv) % f)
+
+      elif conv in _PRINTF_STR_CHARS:
+        if conv == 'b':
+          arg, stop = _EvalCString(ECHO_LEXER, arg)
+          if stop:  # \c stops all output
+            out.append((spec + 's') % arg)
+            return status
+        elif conv == 'q':
+          arg = _ShellQuote(arg)
+        elif conv == 'c':
+          arg = arg[:1] or '\0'
+        out.append((spec + 's') % arg)
+
+      else:  # integer
+        unsigned = conv in 'ouxX'
+        v, ok = _PrintfInt(arg, unsigned=unsigned)
+        if not ok:
+          util.error('printf: %s: invalid number', arg)
+          status = 1
+        if conv in 'ui':
+          conv = 'd'
+        out.append((spec + conv) % v)
+
+    # Stop after all args are used, or if the format doesn't use any.
+    if i >= n or i == start:
+      break
+  return status
+
+
+def Printf(argv, mem):
+  """printf builtin."""
+  arg, i = PRINTF_SPEC.Parse(argv)
+  try:
+    fmt = argv[i]
+  except IndexError:
+    raise args.UsageError('printf: expected a format string')
+
+  if arg.v is not None:
+    m = _PRINTF_INDEXED_NAME_RE.match(arg.v)
+    if m:
+      lval = runtime.LhsIndexedName(m.group(1), int(m.group(2)))
+    elif lex.VAR_NAME_RE.match(arg.v):
+      lval = runtime.LhsName(arg.v)
+    else:
+      raise args.UsageError('printf: %r: not a valid identifier' % arg.v)
+
+  try:
+    parts = _ParsePrintfFormat(fmt)
+  except _PrintfError as e:
+    util.error('printf: %s', e)
+    return 1
+
+  out = []
+  status = _Printf(parts, argv[i+1:], out)
+  s = ''.join(out)
+
+  if arg.v is not None:
+    # Like an assignment, not 'read', so it's not local to the function.
+    mem.SetVar(lval, runtime.Str(s), (), scope_e.Dynamic)
+  else:
+    sys.stdout.write(s)
+  return status
+
+
 WAIT_SPEC = _Register('wait')
 WAIT_SPEC.ShortFlag('-n')
 
@@ -413,26 +723,77 @@ READ_SPEC.ShortFlag('-r')
 READ_SPEC.ShortFlag('-n', args.Int)
 
 
+READ_BLOCK_SIZE = 4096
+
+
+def _IsRegularFile(fd):
+  try:
+    return stat.S_ISREG(os.fstat(fd).st_mode)
+  except OSError:
+    return False
+
+
+def _ReadLineBuffered(fd, delim):
+  """Read a block at a time, then seek back to just after the delimiter.
+
+  This is what bash does for regular files.  The next process reading the
+  descriptor starts at the right place.
+  """
+  chunks = []
+  while True:
+    block = os.read(fd, READ_BLOCK_SIZE)
+    if not block:
+      break
+    i = block.find(delim)
+    if i != -1:
+      unread = len(block) - i - 1
+      if unread:
+        os.lseek(fd, -unread, os.SEEK_CUR)
+      chunks.append(block[:i+1])
+      break
+    chunks.append(block)
+  return ''.join(chunks)
+
+
 # sys.stdin.readline() in Python has buffering!  TODO: Rewrite this tight loop
 # in C?  Less garbage probably.
 # NOTE that dash, mksh, and zsh all read a single byte at a time.  It appears
 # to be required by POSIX?  Could try libc getline and make this an option.
-def ReadLineFromStdin():
+def _ReadLineUnbuffered(fd, delim):
   chars = []
   while True:
-    c = os.read(0, 1)
+    c = os.read(fd, 1)
     if not c:
       break
     chars.append(c)
 
-    if c == '\n':
+    if c == delim:
       break
   return ''.join(chars)
 
 
+def ReadLine(fd, delim='\n'):
+  """Read a line without consuming any input after it.
+
+  Pipes and terminals can't be rewound, so they're read a byte at a time.
+  """
+  if _IsRegularFile(fd):
+    return _ReadLineBuffered(fd, delim)
+  else:
+    return _ReadLineUnbuffered(fd, delim)
+
+
+def ReadLineFromStdin():
+  return ReadLine(0)
+
+
 def Read(argv, splitter, mem):
   arg, i = READ_SPEC.Parse(argv)
 
+  # e.g. 'echo -n "Name? "; read name' with a terminal, or a coprocess that
+  # waits for our output.
+  sys.stdout.flush()
+
   names = argv[i:]
   if arg.n is not None:  # read a certain number of bytes
     try:
@@ -489,6 +850,83 @@ def Read(argv, splitter, mem):
   return status
 
 
+MAPFILE_SPEC = _Register('mapfile')
+MAPFILE_SPEC.ShortFlag('-t')
+MAPFILE_SPEC.ShortFlag('-n', args.Int)
+MAPFILE_SPEC.ShortFlag('-s', args.Int)
+MAPFILE_SPEC.ShortFlag('-d', args.Str)
+MAPFILE_SPEC.ShortFlag('-u', args.Int)
+
+
+def _ReadAll(fd):
+  chunks = []
+  while True:
+    block = os.read(fd, 65536)
+    if not block:
+      break
+    chunks.append(block)
+  return ''.join(chunks)
+
+
+def _SplitLines(s, delim):
+  """Split on delim, keeping it at the end of each line like readline()."""
+  lines = []
+  start = 0
+  n = len(s)
+  while start < n:
+    i = s.find(delim, start)
+    if i == -1:
+      lines.append(s[start:])
+      break
+    lines.append(s[start:i+1])
+    start = i + 1
+  return lines
+
+
+def MapFile(argv, mem):
+  """mapfile / readarray: read lines into an array.
+
+  Without -n, the whole stream is read in large blocks and split once.  With
+  -n, we read line by line so that input after the last line isn't consumed.
+  """
+  arg, i = MAPFILE_SPEC.Parse(argv)
+
+  names = argv[i:]
+  if len(names) > 1:
+    util.error('mapfile: too many arguments')
+    return 1
+  name = names[0] if names else 'MAPFILE'
+
+  delim = '\n'
+  if arg.d is not None:
+    # Like bash, an empty delimiter means NUL.
+    delim = arg.d[0] if arg.d else '\0'
+  fd = arg.u if arg.u is not None else 0
+  skip = arg.s or 0
+  count = arg.n or 0  # 0 means all lines
+
+  try:
+    if count:
+      lines = []
+      while len(lines) < skip + count:
+        line = ReadLine(fd, delim)
+        if not line:
+          break
+        lines.append(line)
+    else:
+      lines = _SplitLines(_ReadAll(fd), delim)
+  except OSError as e:
+    util.error('mapfile: %d: %s', fd, os.strerror(e.errno))
+    return 1
+
+  lines = lines[skip:]
+  if arg.t:
+    lines = [line[:-1] if line.endswith(delim) else line for line in lines]
+
+  state.SetDynamicArray(mem, name, lines)
+  return 0
+
+
 def Shift(argv, mem):
   if len(argv) > 1:
     util.error('shift: too many arguments')
@@ -498,7 +936,7 @@ def Shift(argv, mem):
   except IndexError:
     n = 1
   except ValueError as e:
-    print("Invalid shift argument %r" % argv[1], file=sys.stderr)
+    util.error('Invalid shift argument %r', argv[0])
     return 1  # runtime error
 
   return mem.Shift(n)
@@ -817,12 +1255,7 @@ def Unset(argv, mem, funcs):
   return 0
 
 
-def _ResolveNames(names, funcs, path_val):
-  if path_val.tag == value_e.Str:
-    path_list = path_val.s.split(':')
-  else:
-    path_list = []  # treat as empty path
-
+def _ResolveNames(names, funcs, search_path):
   results = []
   for name in names:
     if name in funcs:
@@ -837,14 +1270,10 @@ def _ResolveNames(names, funcs, path_val):
       kind = ('keyword', name)
     else:
       # Now look for files.
-      found = False
-      for path_dir in path_list:
-        full_path = os.path.join(path_dir, name)
-        if os.path.exists(full_path):
-          kind = ('file', full_path)
-          found = True
-          break
-      if not found:  # Nothing printed, but status is 1.
+      full_path = search_path.Lookup(name)
+      if full_path is not None:
+        kind = ('file', full_path)
+      else:  # Nothing printed, but status is 1.
         kind = (None, None)
     results.append(kind)
 
@@ -856,11 +1285,11 @@ COMMAND_SPEC.ShortFlag('-v')
 COMMAND_SPEC.ShortFlag('-V')
 
 
-def Command(argv, funcs, path_val):
+def Command(argv, funcs, search_path):
   arg, i = COMMAND_SPEC.Parse(argv)
   status = 0
   if arg.v:
-    for kind, arg in _ResolveNames(argv[i:], funcs, path_val):
+    for kind, arg in _ResolveNames(argv[i:], funcs, search_path):
       if kind is None:
         status = 1  # nothing printed, but we fail
       else:
@@ -877,11 +1306,11 @@ TYPE_SPEC = _Register('type')
 TYPE_SPEC.ShortFlag('-t')
 
 
-def Type(argv, funcs, path_val):
+def Type(argv, funcs, search_path):
   arg, i = TYPE_SPEC.Parse(argv)
 
   status = 0
-  for kind, name in _ResolveNames(argv[i:], funcs, path_val):
+  for kind, name in _ResolveNames(argv[i:], funcs, search_path):
     if kind is None:
       status = 1  # nothing printed, but we fail
     else:
@@ -903,6 +1332,60 @@ def Type(argv, funcs, path_val):
   return status
 
 
+HASH_SPEC = _Register('hash')
+HASH_SPEC.ShortFlag('-r')
+HASH_SPEC.ShortFlag('-p', args.Str)
+HASH_SPEC.ShortFlag('-t')
+
+
+def Hash(argv, search_path):
+  arg, i = HASH_SPEC.Parse(argv)
+  names = argv[i:]
+
+  status = 0
+  if arg.r:  # forget everything, then remember the names
+    search_path.Clear()
+
+  if arg.p is not None:  # hash -p /bin/ls ls
+    if not names:
+      raise args.UsageError('hash -p PATH NAME...')
+    for name in names:
+      search_path.Set(name, arg.p)
+
+  elif arg.t:  # show remembered paths
+    if not names:
+      raise args.UsageError('hash -t NAME...')
+    for name in names:
+      full_path = search_path.Get(name)
+      if full_path is None:
+        util.error('hash: %r not found', name)
+        status = 1
+      elif len(names) == 1:
+        print(full_path)
+      else:
+        print('%s\t%s' % (name, full_path))
+
+  elif names:  # remember these
+    for name in names:
+      if '/' in name:
+        continue  # like bash, nothing to remember
+      if search_path.Remember(name) is None:
+        util.error('hash: %r not found', name)
+        status = 1
+
+  elif not arg.r:  # list the table
+    items = search_path.Items()
+    if items:
+      print('hits\tcommand')
+      for _, full_path, hits in items:
+        print('%4d\t%s' % (hits, full_path))
+    else:
+      print('hash: hash table empty')
+
+  sys.stdout.flush()
+  return status
+
+
 DECLARE_SPEC = _Register('declare')
 DECLARE_SPEC.ShortFlag('-f')
 DECLARE_SPEC.ShortFlag('-F')
@@ -3,6 +3,8 @@
 builtin_test.py: Tests for builtin.py
 """
 
+import os
+import tempfile
 import unittest
 
 from core import legacy
@@ -38,6 +40,69 @@ class BuiltinTest(unittest.TestCase):
 
       print('---')
 
+  def testReadLine(self):
+    fd, path = tempfile.mkstemp(prefix='builtin_test_')
+    os.write(fd, 'one\ntwo\n' + 'x' * 10000 + '\nlast')
+    os.lseek(fd, 0, os.SEEK_SET)
+    try:
+      self.assertEqual('one\n', builtin.ReadLine(fd))
+      # We seeked back to just after the newline.
+      self.assertEqual(4, os.lseek(fd, 0, os.SEEK_CUR))
+      self.assertEqual('two\n', builtin.ReadLine(fd))
+      self.assertEqual(10001, len(builtin.ReadLine(fd)))
+      self.assertEqual('last', builtin.ReadLine(fd))
+      self.assertEqual('', builtin.ReadLine(fd))
+    finally:
+      os.close(fd)
+      os.unlink(path)
+
+    r, w = os.pipe()
+    os.write(w, 'a:b:c')
+    os.close(w)
+    self.assertEqual('a:', builtin.ReadLine(r, ':'))
+    self.assertEqual('b:', builtin.ReadLine(r, ':'))
+    self.assertEqual('c', builtin.ReadLine(r, ':'))
+    os.close(r)
+
+  def testSplitLines(self):
+    self.assertEqual([], builtin._SplitLines('', '\n'))
+    self.assertEqual(['a\n', 'b'], builtin._SplitLines('a\nb', '\n'))
+    self.assertEqual(['a\n', '\n'], builtin._SplitLines('a\n\n', '\n'))
+
+  def testPrintf(self):
+    def Printf(fmt, *argv):
+      out = []
+      status = builtin._Printf(builtin._ParsePrintfFormat(fmt), argv, out)
+      return ''.join(out), status
+
+    self.assertEqual(('a-b\nc-\n', 0), Printf(r'%s-%s\n', 'a', 'b', 'c'))
+    self.assertEqual(('[  3][ab ]', 0), Printf('[%*d][%-3s]', '3', '3', 'ab'))
+    self.assertEqual(('ffffffffffffffff 65', 0), Printf('%x %d', '-1', "'A"))
+    self.assertEqual(('0', 1), Printf('%d', 'z'))
+    self.assertEqual(('x', 0), Printf(r'%b%s', r'x\cy', 'z'))
+    self.assertEqual(('[][0]', 0), Printf('[%s][%d]'))
+    self.assertRaises(builtin._PrintfError, builtin._ParsePrintfFormat, '%')
+
+  def testPrintfInt(self):
+    self.assertEqual((5, True), builtin._PrintfInt(' 5'))
+    self.assertEqual((5, False), builtin._PrintfInt('5 '))
+    self.assertEqual((1, False), builtin._PrintfInt('0x1g'))
+    self.assertEqual((0, False), builtin._PrintfInt('08'))
+    self.assertEqual((15, True), builtin._PrintfInt('017'))
+    self.assertEqual(((1 << 63) - 1, True),
+                     builtin._PrintfInt('99999999999999999999'))
+    self.assertEqual((-(1 << 63), True),
+                     builtin._PrintfInt('-99999999999999999999'))
+    self.assertEqual(((1 << 64) - 1, True),
+                     builtin._PrintfInt('-1', unsigned=True))
+    self.assertEqual((1.5, False), builtin._PrintfFloat('1.5 '))
+
+  def testShellQuote(self):
+    self.assertEqual("''", builtin._ShellQuote(''))
+    self.assertEqual(r'a\ b', builtin._ShellQuote('a b'))
+    self.assertEqual(r'\~x~', builtin._ShellQuote('~x~'))
+    self.assertEqual(r"$'it\'s\t\001'", builtin._ShellQuote("it's\t\x01"))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -17,6 +17,7 @@ This just does head?  Last one wins.
 
 import os
 import resource
+import signal
 import stat
 import sys
 import time
@@ -25,8 +26,9 @@ from asdl import const
 
 from core import alloc
 from core import args
-from core import braces
+from core import comsub
 from core import expr_eval
+from core import glob_
 from core import legacy
 from core import reader
 from core import test_builtin
@@ -44,11 +46,6 @@ from core import word_compile
 from osh import ast_ as ast
 from osh import parse_lib
 
-try:
-  import libc  # for fnmatch
-except ImportError:
-  from benchmarks import fake_libc as libc
-
 EBuiltin = builtin.EBuiltin
 
 command_e = ast.command_e
@@ -64,6 +61,10 @@ var_flags_e = runtime.var_flags_e
 log = util.log
 e_die = util.e_die
 
+# Bound the compiled words cache, e.g. for an interactive shell that parses a
+# new tree for every line.
+_MAX_COMPILED = 1000
+
 
 class _ControlFlow(RuntimeError):
   """Internal execption for control flow.
@@ -99,6 +100,17 @@ class _ControlFlow(RuntimeError):
     return '<_ControlFlow %s>' % self.token
 
 
+class _BuiltinEntry(object):
+  """A builtin in the Executor's table, with stats for --builtin-stats."""
+
+  def __init__(self, builtin_id, special, handler):
+    self.builtin_id = builtin_id
+    self.special = special  # can't be redefined by a function
+    self.handler = handler  # argv -> status
+    self.count = 0
+    self.secs = 0.0  # cumulative, including nested commands, e.g. for eval
+
+
 class Executor(object):
   """Executes the program by tree-walking.
 
@@ -106,7 +118,8 @@ class Executor(object):
   CompoundWord/WordPart.
   """
   def __init__(self, mem, fd_state, status_lines, funcs, completion,
-               comp_lookup, exec_opts, arena):
+               comp_lookup, exec_opts, arena, parse_cache=None,
+               max_comsub_bytes=0):
     """
     Args:
       mem: Mem instance for storing variables
@@ -117,6 +130,9 @@ class Executor(object):
       comp_lookup: completion pattern/action
       exec_opts: ExecOpts
       arena: for printing error locations
+      parse_cache: ParseCache for 'source', or None
+      max_comsub_bytes: a command sub with more output is a fatal error, or 0
+        for no limit
     """
     self.mem = mem
     self.fd_state = fd_state
@@ -129,6 +145,7 @@ class Executor(object):
     # This is for shopt and set -o.  They are initialized by flags.
     self.exec_opts = exec_opts
     self.arena = arena
+    self.parse_cache = parse_cache
 
     self.splitter = legacy.SplitContext(self.mem)
     self.word_ev = word_eval.NormalWordEvaluator(
@@ -139,6 +156,7 @@ class Executor(object):
     self.traps = {}  # signal/hook name -> callable
     self.nodes_to_run = []  # list of nodes, appended to by signal handlers
     self.dir_stack = state.DirStack()
+    self.search_path = state.SearchPath(mem)  # command hash table
 
     # TODO: Pass these in from main()
     self.aliases = {}  # alias name -> string
@@ -154,6 +172,10 @@ class Executor(object):
 
     self.tracer = Tracer(exec_opts, mem, self.word_ev)
     self.check_command_sub_status = False  # a hack
+    self.comsub_analyzer = comsub.InProcessAnalyzer()
+    self.compiled_words = {}  # node -> output of word_compile.CompileWords
+    self.comsub_reader = process.OutputReader(limit=max_comsub_bytes)
+    self.builtins = self._MakeBuiltinTable()  # name -> _BuiltinEntry
 
   def _Complete(self, argv):
     """complete builtin - register a completion function.
@@ -230,6 +252,28 @@ class Executor(object):
 
     return node
 
+  def _SourceCached(self, contents, path):
+    """Like _EvalHelper, but skip parsing if the file is in the cache."""
+    self.arena.PushSource(path)
+    try:
+      node = self.parse_cache.Load(contents, self.arena)
+      if node is None:
+        mark = self.arena.SaveMark()
+        line_reader = reader.StringLineReader(contents, self.arena)
+        _, c_parser = parse_lib.MakeParser(line_reader, self.arena)
+        node = c_parser.ParseWholeFile()
+        if not node:
+          util.error('Parse error in %r:', path)
+          err = c_parser.Error()
+          ui.PrintErrorStack(err, self.arena, sys.stderr)
+          return 1
+        self.parse_cache.Save(contents, self.arena, mark, node)
+
+      return self._Execute(node)
+
+    finally:
+      self.arena.PopSource()
+
   def _Source(self, argv):
     try:
       path = argv[0]
@@ -246,6 +290,9 @@ class Executor(object):
       return 1
 
     try:
+      if self.parse_cache:
+        return self._SourceCached(f.read(), path)
+
       line_reader = reader.FileLineReader(f, self.arena)
       _, c_parser = parse_lib.MakeParser(line_reader, self.arena)
       return self._EvalHelper(c_parser, path)
@@ -258,129 +305,129 @@ class Executor(object):
     finally:
       f.close()
 
+  def _ResolveExternal(self, arg0):
+    """Look up an external command, respecting set +h.
+
+    Returns:
+      A path to pass to execve(), or None if it's not found.
+    """
+    if self.exec_opts.hashall:
+      return self.search_path.Resolve(arg0)
+    if '/' in arg0:
+      return arg0
+    return self.search_path.Lookup(arg0)
+
   def _Exec(self, argv):
     # Either execute command with redirects, or apply redirects in this shell.
     # NOTE: Redirects were processed earlier.
     if argv:
+      arg0_path = self._ResolveExternal(argv[0])
+      if arg0_path is None:
+        util.error('exec: %r not found', argv[0])
+        return 127
       environ = self.mem.GetExported()
-      process.ExecExternalProgram(argv, environ)  # never returns
+      process.ExecExternalProgram(arg0_path, argv, environ)  # never returns
     else:
       return 0
 
-  def _RunBuiltin(self, builtin_id, argv):
-    restore_fd_state = True
-
-    # NOTE: Builtins don't need to know their own name.
-    argv = argv[1:]
-
-    # TODO: figure out a quicker dispatch mechanism.  Just make a table of
-    # builtins I guess.
-    if builtin_id == EBuiltin.EXEC:
-      status = self._Exec(argv)  # may never return
-      # But if it returns, then we want to permanently apply the redirects
-      # associated with it.
-      self.fd_state.MakePermanent()
-
-    elif builtin_id == EBuiltin.READ:
-      status = builtin.Read(argv, self.splitter, self.mem)
-
-    elif builtin_id == EBuiltin.ECHO:
-      status = builtin.Echo(argv)
-
-    elif builtin_id == EBuiltin.SHIFT:
-      status = builtin.Shift(argv, self.mem)
-
-    elif builtin_id == EBuiltin.CD:
-      status = builtin.Cd(argv, self.mem, self.dir_stack)
-
-    elif builtin_id == EBuiltin.SET:
-      status = builtin.Set(argv, self.exec_opts, self.mem)
-
-    elif builtin_id == EBuiltin.SHOPT:
-      status = builtin.Shopt(argv, self.exec_opts)
-
-    elif builtin_id == EBuiltin.UNSET:
-      status = builtin.Unset(argv, self.mem, self.funcs)
-
-    elif builtin_id == EBuiltin.EXPORT:
-      status = builtin.Export(argv, self.mem)
-
-    elif builtin_id == EBuiltin.WAIT:
-      status = builtin.Wait(argv, self.waiter, self.job_state, self.mem)
-
-    elif builtin_id == EBuiltin.JOBS:
-      status = builtin.Jobs(argv, self.job_state)
-
-    elif builtin_id == EBuiltin.PUSHD:
-      status = builtin.Pushd(argv, self.mem.GetVar('HOME'), self.dir_stack)
-
-    elif builtin_id == EBuiltin.POPD:
-      status = builtin.Popd(argv, self.mem.GetVar('HOME'), self.dir_stack)
+  def _MakeBuiltinTable(self):
+    """Returns a dict of name -> _BuiltinEntry.
 
-    elif builtin_id == EBuiltin.DIRS:
-      status = builtin.Dirs(argv, self.mem.GetVar('HOME'), self.dir_stack)
-
-    elif builtin_id in (EBuiltin.SOURCE, EBuiltin.DOT):
-      status = self._Source(argv)
-
-    elif builtin_id == EBuiltin.TRAP:
-      status = builtin.Trap(argv, self.traps, self.nodes_to_run, self)
-
-    elif builtin_id == EBuiltin.UMASK:
-      status = builtin.Umask(argv)
-
-    elif builtin_id == EBuiltin.EVAL:
-      status = self._Eval(argv)
-
-    elif builtin_id == EBuiltin.COMPLETE:
-      status = self._Complete(argv)
-
-    elif builtin_id == EBuiltin.COMPGEN:
-      status = self._CompGen(argv)
-
-    elif builtin_id == EBuiltin.COLON:  # special builtin like 'true'
-      status = 0
-
-    elif builtin_id == EBuiltin.TRUE:
-      status = 0
-
-    elif builtin_id == EBuiltin.FALSE:
-      status = 1
-
-    elif builtin_id == EBuiltin.TEST:
-      status = test_builtin.Test(argv, False)
-
-    elif builtin_id == EBuiltin.BRACKET:
-      status = test_builtin.Test(argv, True)  # need_right_bracket
-
-    elif builtin_id == EBuiltin.GETOPTS:
-      status = builtin.GetOpts(argv, self.mem)
-
-    elif builtin_id == EBuiltin.COMMAND:
-      path = self.mem.GetVar('PATH')
-      status = builtin.Command(argv, self.funcs, path)
-
-    elif builtin_id == EBuiltin.TYPE:
-      path = self.mem.GetVar('PATH')
-      status = builtin.Type(argv, self.funcs, path)
-
-    elif builtin_id in (EBuiltin.DECLARE, EBuiltin.TYPESET):
-      # These are synonyms
-      status = builtin.DeclareTypeset(argv, self.mem, self.funcs)
-
-    elif builtin_id == EBuiltin.HELP:
-      loader = util.GetResourceLoader()
-      status = builtin.Help(argv, loader)
+    Each handler takes argv without the builtin name, and returns a status.
+    """
+    home = lambda: self.mem.GetVar('HOME')
+    handlers = {
+        EBuiltin.EXEC: self._BuiltinExec,
+        EBuiltin.READ: lambda argv: builtin.Read(argv, self.splitter, self.mem),
+        EBuiltin.MAPFILE: lambda argv: builtin.MapFile(argv, self.mem),
+        EBuiltin.ECHO: builtin.Echo,
+        EBuiltin.PRINTF: lambda argv: builtin.Printf(argv, self.mem),
+        EBuiltin.SHIFT: lambda argv: builtin.Shift(argv, self.mem),
+        EBuiltin.CD: lambda argv: builtin.Cd(argv, self.mem, self.dir_stack),
+        EBuiltin.SET:
+            lambda argv: builtin.Set(argv, self.exec_opts, self.mem),
+        EBuiltin.SHOPT: lambda argv: builtin.Shopt(argv, self.exec_opts),
+        EBuiltin.UNSET:
+            lambda argv: builtin.Unset(argv, self.mem, self.funcs),
+        EBuiltin.EXPORT: lambda argv: builtin.Export(argv, self.mem),
+        EBuiltin.WAIT: lambda argv: builtin.Wait(argv, self.waiter,
+                                                 self.job_state, self.mem),
+        EBuiltin.JOBS: lambda argv: builtin.Jobs(argv, self.job_state),
+        EBuiltin.PUSHD:
+            lambda argv: builtin.Pushd(argv, home(), self.dir_stack),
+        EBuiltin.POPD: lambda argv: builtin.Popd(argv, home(), self.dir_stack),
+        EBuiltin.DIRS: lambda argv: builtin.Dirs(argv, home(), self.dir_stack),
+        EBuiltin.SOURCE: self._Source,
+        EBuiltin.DOT: self._Source,
+        EBuiltin.TRAP: lambda argv: builtin.Trap(argv, self.traps,
+                                                 self.nodes_to_run, self),
+        EBuiltin.UMASK: builtin.Umask,
+        EBuiltin.EVAL: self._Eval,
+        EBuiltin.COMPLETE: self._Complete,
+        EBuiltin.COMPGEN: self._CompGen,
+        EBuiltin.COLON: lambda argv: 0,  # special builtin like 'true'
+        EBuiltin.TRUE: lambda argv: 0,
+        EBuiltin.FALSE: lambda argv: 1,
+        EBuiltin.TEST: lambda argv: test_builtin.Test(argv, False),
+        # need_right_bracket
+        EBuiltin.BRACKET: lambda argv: test_builtin.Test(argv, True),
+        EBuiltin.GETOPTS: lambda argv: builtin.GetOpts(argv, self.mem),
+        EBuiltin.COMMAND: lambda argv: builtin.Command(argv, self.funcs,
+                                                       self.search_path),
+        EBuiltin.TYPE:
+            lambda argv: builtin.Type(argv, self.funcs, self.search_path),
+        EBuiltin.HASH: lambda argv: builtin.Hash(argv, self.search_path),
+        # These are synonyms
+        EBuiltin.DECLARE:
+            lambda argv: builtin.DeclareTypeset(argv, self.mem, self.funcs),
+        EBuiltin.TYPESET:
+            lambda argv: builtin.DeclareTypeset(argv, self.mem, self.funcs),
+        EBuiltin.HELP:
+            lambda argv: builtin.Help(argv, util.GetResourceLoader()),
+        EBuiltin.DEBUG_LINE:
+            lambda argv: builtin.DebugLine(argv, self.status_lines),
+    }
+
+    table = {}
+    for name, (builtin_id, special) in \
+        builtin.BUILTIN_DEF.builtin_ids.iteritems():
+      table[name] = _BuiltinEntry(builtin_id, special, handlers[builtin_id])
+    return table
+
+  def _BuiltinExec(self, argv):
+    status = self._Exec(argv)  # may never return
+    # But if it returns, then we want to permanently apply the redirects
+    # associated with it.
+    self.fd_state.MakePermanent()
+    return status
 
-    elif builtin_id == EBuiltin.DEBUG_LINE:
-      status = builtin.DebugLine(argv, self.status_lines)
+  def _RunBuiltin(self, entry, argv):
+    entry.count += 1
+    start_time = time.time()
+    try:
+      # NOTE: Builtins don't need to know their own name.
+      status = entry.handler(argv[1:])
+    except args.UsageError as e:
+      # TODO: Make this message more consistent?
+      util.usage(str(e))
+      status = 2  # consistent error code for usage error
+    finally:
+      entry.secs += time.time() - start_time
 
-    else:
-      raise AssertionError('Unhandled builtin: %s' % builtin_id)
+    if self.fd_state.stdout_is_tty:
+      sys.stdout.flush()  # like line buffering
 
     assert isinstance(status, int)
     return status
 
+  def BuiltinStats(self):
+    """For --builtin-stats.  Returns lines for the builtins that were run."""
+    rows = [(entry.secs, entry.count, name)
+            for name, entry in self.builtins.iteritems() if entry.count]
+    rows.sort(reverse=True)
+    return ['%-12s %8d calls %10.3f ms' % (name, count, secs * 1000)
+            for secs, count, name in rows]
+
   def _PushErrExit(self):
     self.exec_opts.errexit.Push()
 
@@ -534,15 +581,10 @@ class Executor(object):
 
     arg0 = argv[0]
 
-    builtin_id = builtin.ResolveSpecial(arg0)
-    if builtin_id != EBuiltin.NONE:
-      try:
-        status = self._RunBuiltin(builtin_id, argv)
-      except args.UsageError as e:
-        # TODO: Make this message more consistent?
-        util.usage(str(e))
-        status = 2  # consistent error code for usage error
-      return status
+    # Special builtins can't be redefined as functions.
+    entry = self.builtins.get(arg0)
+    if entry is not None and entry.special:
+      return self._RunBuiltin(entry, argv)
 
     # Builtins like 'true' can be redefined as functions.
     func_node = self.funcs.get(arg0)
@@ -551,26 +593,26 @@ class Executor(object):
       status = self.RunFunc(func_node, argv)
       return status
 
-    builtin_id = builtin.Resolve(arg0)
-    if builtin_id != EBuiltin.NONE:
-      try:
-        status = self._RunBuiltin(builtin_id, argv)
-      except args.UsageError as e:
-        # TODO: Make this message more consistent?
-        util.usage(str(e))
-        status = 2  # consistent error code for usage error
-      return status
+    if entry is not None:
+      return self._RunBuiltin(entry, argv)
+
+    # Resolve in the parent, so the result is remembered and the child does a
+    # single execve().
+    arg0_path = self._ResolveExternal(arg0)
+    if arg0_path is None:
+      util.error('%r not found', arg0)
+      return 127
 
     environ = self.mem.GetExported()  # Include temporary variables
 
     if fork_external:
-      thunk = process.ExternalThunk(argv, environ)
+      thunk = process.ExternalThunk(arg0_path, argv, environ)
       p = process.Process(thunk)
       status = p.Run(self.waiter)
       return status
 
     # NOTE: Never returns!
-    process.ExecExternalProgram(argv, environ)
+    process.ExecExternalProgram(arg0_path, argv, environ)
 
   def _MakePipeline(self, node, job_state=None):
     # NOTE: First or last one could use the "main" shell thread.  Doesn't have
@@ -631,6 +673,19 @@ class Executor(object):
       log('Started background job with pid %d', pid)
     return 0
 
+  def _CompileWords(self, node, words):
+    """Brace expand and pre-evaluate the words of a node once."""
+    try:
+      return self.compiled_words[node]
+    except KeyError:
+      pass
+
+    compiled = word_compile.CompileWords(words)
+    if len(self.compiled_words) >= _MAX_COMPILED:
+      self.compiled_words.clear()
+    self.compiled_words[node] = compiled
+    return compiled
+
   def _SetSourceLocation(self, span_id):
     # TODO: This API should be simplified
     line_span = self.arena.GetLineSpan(span_id)
@@ -668,8 +723,8 @@ class Executor(object):
       # - line numbers for every command would be very nice.  But then you have
       # to print the filename too.
 
-      words = braces.BraceExpandWords(node.words)
-      argv = self.word_ev.EvalWordSequence(words)
+      compiled = self._CompileWords(node, node.words)
+      argv = self.word_ev.EvalCompiledWords(compiled)
 
       # This is a very basic implementation for PS4='+$SOURCE_NAME:$LINENO:'
 
@@ -721,7 +776,7 @@ class Executor(object):
     elif node.tag == command_e.Sentence:
       # Don't check_errexit since this isn't a real node!
       if node.terminator.id == Id.Op_Semi:
-        status = self._Execute(node.child)
+        status = self._Execute(node.child, fork_external=fork_external)
       else:
         status = self._RunJobInBackground(node.child)
 
@@ -745,9 +800,14 @@ class Executor(object):
 
     elif node.tag == command_e.Subshell:
       check_errexit = True
-      # This makes sure we don't waste a process if we'd launch one anyway.
-      p = self._MakeProcess(node.child)
-      status = p.Run(self.waiter)
+      if fork_external:
+        # This makes sure we don't waste a process if we'd launch one anyway.
+        p = self._MakeProcess(node.child)
+        status = p.Run(self.waiter)
+      else:
+        # We're already in a child process that exits after this node, so it
+        # can be the subshell.
+        status = self._Execute(node.child, fork_external=False)
 
     elif node.tag == command_e.DBracket:
       check_errexit = True
@@ -884,7 +944,7 @@ class Executor(object):
     # The only difference between these two is that CommandList has no
     # redirects.  We already took care of that above.
     elif node.tag in (command_e.CommandList, command_e.BraceGroup):
-      status = self._ExecuteList(node.children)
+      status = self._ExecuteList(node.children, fork_external=fork_external)
       check_errexit = False
 
     elif node.tag == command_e.AndOr:
@@ -918,7 +978,7 @@ class Executor(object):
           continue  # short circuit
 
         if i == n - 1:  # errexit handled differently for last child
-          status = self._Execute(child)
+          status = self._Execute(child, fork_external=fork_external)
           check_errexit = True
         else:
           self._PushErrExit()
@@ -969,8 +1029,8 @@ class Executor(object):
       if node.do_arg_iter:
         iter_list = self.mem.GetArgv()
       else:
-        words = braces.BraceExpandWords(node.iter_words)
-        iter_list = self.word_ev.EvalWordSequence(words)
+        compiled = self._CompileWords(node, node.iter_words)
+        iter_list = self.word_ev.EvalCompiledWords(compiled)
         # We need word splitting and so forth
         # NOTE: This expands globs too.  TODO: We should pass in a Globber()
         # object.
@@ -1044,12 +1104,13 @@ class Executor(object):
           self._PopErrExit()
 
         if status == 0:
-          status = self._ExecuteList(arm.action)
+          status = self._ExecuteList(arm.action, fork_external=fork_external)
           done = True
           break
       # TODO: The compiler should flatten this
       if not done and node.else_action is not None:
-        status = self._ExecuteList(node.else_action)
+        status = self._ExecuteList(node.else_action,
+                                   fork_external=fork_external)
 
     elif node.tag == command_e.NoOp:
       status = 0  # make it true
@@ -1066,8 +1127,8 @@ class Executor(object):
           # NOTE: Is it OK that we're evaluating these as we go?
           pat_val = self.word_ev.EvalWordToString(pat_word, do_fnmatch=True)
           #log('Matching word %r against pattern %r', to_match, pat_val.s)
-          if libc.fnmatch(pat_val.s, to_match):
-            status = self._ExecuteList(arm.action)
+          if glob_.FnMatch(pat_val.s, to_match):
+            status = self._ExecuteList(arm.action, fork_external=fork_external)
             done = True  # TODO: Parse ;;& and for fallthrough and such?
             break  # Only execute action ONCE
         if done:
@@ -1091,6 +1152,7 @@ class Executor(object):
       real = end_t - start_t
       user = end_u.ru_utime - start_u.ru_utime
       sys_ = end_u.ru_stime - start_u.ru_stime
+      sys.stdout.flush()  # keep the timing after buffered builtin output
       print('real\t%.3f' % real, file=sys.stderr)
       print('user\t%.3f' % user, file=sys.stderr)
       print('sys\t%.3f' % sys_, file=sys.stderr)
@@ -1107,7 +1169,9 @@ class Executor(object):
       node: ast.command
       fork_external: if we get a SimpleCommand that is an external command,
         should we fork first?  This is disabled in the context of a pipeline
-        process and a subshell.
+        process, subshell, or command sub.  Compound commands pass it down
+        only to the node in tail position, i.e. the last thing the process
+        runs before exiting, so e.g. $(cd /tmp; basename x) forks once.
     """
     # See core/builtin.py for the Python signal handler that appends to this
     # list.
@@ -1166,10 +1230,15 @@ class Executor(object):
       self._CheckStatus(status, node)
     return status
 
-  def _ExecuteList(self, children):
+  def _ExecuteList(self, children, fork_external=True):
     status = 0  # for empty list
-    for child in children:
-      status = self._Execute(child)  # last status wins
+    n = len(children)
+    for i, child in enumerate(children):
+      # Only the last child can replace the current process.
+      if i == n - 1:
+        status = self._Execute(child, fork_external=fork_external)
+      else:
+        status = self._Execute(child)  # last status wins
     return status
 
   def Execute(self, node, fork_external=True, run_exit_trap=False):
@@ -1194,26 +1263,37 @@ class Executor(object):
     Returns:
       status: numeric exit code
     """
+    status, _ = self._ExecuteAndCatch(node, fork_external=fork_external)
+    return status
+
+  def _ExecuteAndCatch(self, node, fork_external=True):
+    """Helper for Execute() and MainLoop().
+
+    Returns:
+      status: numeric exit code
+      stop: whether the program should stop, because of 'exit', 'return', or a
+        fatal error.
+    """
     try:
       status = self._Execute(node, fork_external=fork_external)
     except _ControlFlow as e:
       # Return at top level is OK, unlike in bash.
       if e.IsReturn() or e.IsExit():
-        status = e.StatusCode()
+        return e.StatusCode(), True
       else:
         raise
     except util.FatalRuntimeError as e:
+      sys.stdout.flush()
       ui.PrettyPrintError(e, self.arena)
       print('osh failed: %s' % e.UserErrorString(), file=sys.stderr)
       status = e.exit_status if e.exit_status is not None else 1
       # TODO: dump self.mem if requested.  Maybe speify with OIL_DUMP_PREFIX.
+      return status, True
 
     # Other exceptions: SystemExit for sys.exit()
-    return status
+    return status, False
 
-  def ExecuteAndRunExitTrap(self, node):
-    """For the top level program, called by bin/oil.py."""
-    status = self.Execute(node)
+  def _RunExitTrap(self):
     # NOTE: 'exit 1' is ControlFlow and gets here, but subshell/commandsub
     # don't because they call sys.exit().
 
@@ -1228,9 +1308,105 @@ class Executor(object):
     if handler:
       self.Execute(handler.node)
 
+  def ExecuteAndRunExitTrap(self, node):
+    """For the top level program, called by bin/oil.py."""
+    status = self.Execute(node)
+    self._RunExitTrap()
     return status
 
-  def RunCommandSub(self, node):
+  def MainLoop(self, c_parser, w_parser):
+    """Parse and execute one top-level command at a time, then run the EXIT
+    trap.
+
+    For scripts and -c, called by bin/oil.py.  Each command's lines and spans
+    are freed from the arena after it's executed, unless it defined a function,
+    or executing it parsed more code (e.g. with source, eval, or trap).  So
+    memory doesn't grow with the length of the script.
+
+    Returns:
+      status: numeric exit code
+    """
+    status = 0
+    while True:
+      mark = self.arena.SaveMark()
+      try:
+        w = c_parser.Peek()
+        if w is None:
+          node = None
+        else:
+          c_id = word.CommandId(w)
+          if c_id == Id.Eof_Real:
+            break
+          if c_id == Id.Op_Newline:  # blank line or comment
+            self.arena.ReleaseToMark(mark)
+            w_parser.Reset()
+            c_parser.Reset()
+            continue
+          node = c_parser.ParseCommandLine()
+      except util.ParseError as e:
+        sys.stdout.flush()
+        ui.PrettyPrintError(e, self.arena, sys.stderr)
+        print('parse error: %s' % e.UserErrorString(), file=sys.stderr)
+        status = 2
+        break
+      if not node:
+        ui.PrintErrorStack(c_parser.Error(), self.arena, sys.stderr)
+        status = 2  # parse error is code 2
+        break
+
+      keep_arena = c_parser.saw_func_def
+      parsed_mark = self.arena.SaveMark()
+
+      status, stop = self._ExecuteAndCatch(node)
+      if stop:
+        break
+
+      if not keep_arena and self.arena.SaveMark() == parsed_mark:
+        self.arena.ReleaseToMark(mark)
+
+      # Discard the newline we stopped at, and start the next command.
+      w_parser.Reset()
+      c_parser.Reset()
+
+    self._RunExitTrap()
+    return status
+
+  def _RunCommandSubInProcess(self, node):
+    """Run a command sub without forking.  See core/comsub.py.
+
+    Returns:
+      (status, stdout), or None if stdout can't be captured.  stdout is None
+      if it's over the limit.
+    """
+    capture_fd = self.fd_state.PushStdoutCapture()
+    if capture_fd == -1:
+      return None
+
+    # Like the child process, discard variable assignments, etc.
+    snapshot = self.mem.Snapshot()
+    errexit = self.exec_opts.errexit
+    if not self.exec_opts.strict_errexit:
+      errexit.Push()  # like Disable() in the child, but restored
+    try:
+      try:
+        status, _ = self._ExecuteAndCatch(node)
+      except SystemExit as e:
+        # e.g. ${undef?msg} calls sys.exit(), which would only stop the child
+        # process.
+        if e.code is None:
+          status = 0
+        elif isinstance(e.code, int):
+          status = e.code
+        else:
+          status = 1
+    finally:
+      stdout = self.fd_state.PopStdoutCapture(capture_fd, self.comsub_reader)
+      if not self.exec_opts.strict_errexit:
+        errexit.Pop()
+      self.mem.Restore(snapshot)
+    return status, stdout
+
+  def _RunCommandSubInChild(self, node):
     p = self._MakeProcess(node,
                           disable_errexit=not self.exec_opts.strict_errexit)
 
@@ -1240,16 +1416,29 @@ class Executor(object):
     #log('Command sub started %d', pid)
     self.waiter.Register(pid, p.WhenDone)
 
-    chunks = []
     os.close(w)  # not going to write
-    while True:
-      byte_str = os.read(r, 4096)
-      if not byte_str:
-        break
-      chunks.append(byte_str)
+    stdout = self.comsub_reader.ReadAll(r)
+    if stdout is None:  # over the limit
+      os.kill(pid, signal.SIGTERM)
     os.close(r)
 
     status = p.WaitUntilDone(self.waiter)
+    return status, stdout
+
+  def RunCommandSub(self, node):
+    result = None
+    # Pending trap handlers would run with stdout captured, so fork.  The
+    # output limit is only checked while reading a pipe, since a loop in this
+    # process can't be stopped.
+    if (not self.nodes_to_run and not self.comsub_reader.limit and
+        self.comsub_analyzer.CanRunInProcess(node, self.funcs)):
+      result = self._RunCommandSubInProcess(node)
+    if result is None:
+      result = self._RunCommandSubInChild(node)
+    status, stdout = result
+    if stdout is None:
+      e_die('Command sub output is over the limit of %d bytes',
+            self.comsub_reader.limit)
 
     # OSH has the concept of aborting in the middle of a WORD.  We're not
     # waiting until the command is over!
@@ -1269,9 +1458,9 @@ class Executor(object):
       self.mem.last_status = status
 
     # Runtime errors test case: # $("echo foo > $@")
-    # Why rstrip()?
+    # OutputReader removed trailing newlines.  Why?
     # https://unix.stackexchange.com/questions/17747/why-does-shell-command-substitution-gobble-up-a-trailing-newline-char
-    return ''.join(chunks).rstrip('\n')
+    return stdout
 
   def RunProcessSub(self, node, op_id):
     """Process sub creates a forks a process connected to a pipe.
@@ -1484,6 +1673,7 @@ class Tracer(object):
 
     first_char, prefix = self._EvalPS4()
     cmd = ' '.join(_PrettyString(a) for a in argv)
+    sys.stdout.flush()  # keep the trace in order with builtin output
     print('%s%s%s' % (first_char, prefix, cmd), file=sys.stderr)
 
   def OnAssignment(self, lval, val, flags, lookup_mode):
@@ -1493,6 +1683,7 @@ class Tracer(object):
 
     # Now we have to get the prefix
     first_char, prefix = self._EvalPS4()
+    sys.stdout.flush()
     print('%s%s%s = %s' % (first_char, prefix, lval, val), file=sys.stderr)
 
   def Event(self):
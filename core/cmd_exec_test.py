@@ -138,6 +138,27 @@ class ExecutorTest(unittest.TestCase):
   def testBuiltin(self):
     print(ParseAndExecute('echo hi'))
 
+  def testBuiltinTable(self):
+    ex = InitExecutor()
+    self.assertEqual(True, ex.builtins['declare'].special)
+    self.assertEqual(False, ex.builtins['echo'].special)
+    self.assertEqual(
+        set(builtin.BUILTIN_DEF.builtin_ids), set(ex.builtins))
+
+    self.assertEqual(1, ex._RunSimpleCommand(['false'], True))
+    self.assertEqual(0, ex._RunSimpleCommand(['true'], True))
+    self.assertEqual(0, ex._RunSimpleCommand(['true'], True))
+    self.assertEqual(2, ex._RunSimpleCommand(['read', '-q'], True))
+
+    self.assertEqual(1, ex.builtins['false'].count)
+    self.assertEqual(2, ex.builtins['true'].count)
+    self.assertEqual(1, ex.builtins['read'].count)
+    stats = ex.BuiltinStats()
+    self.assertEqual(3, len(stats))
+    self.assertTrue(stats[0].startswith('true ') or
+                    stats[0].startswith('false ') or
+                    stats[0].startswith('read '), stats)
+
 
 if __name__ == '__main__':
   unittest.main()
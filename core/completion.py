@@ -258,59 +258,16 @@ class ExternalCommandAction(object):
   NOTE: -A command in bash is FIVE things: aliases, builtins, functions,
   keywords, etc.
   """
-  def __init__(self, mem):
+  def __init__(self, search_path):
     """
     Args:
-      mem: for looking up Path
+      search_path: state.SearchPath, shared with the Executor.  It caches
+        directory listings by (dir, mtime).
     """
-    self.mem = mem
-    # Should we list everything executable in $PATH here?  And then whenever
-    # $PATH is changed, regenerated it?
-    # Or we can cache directory listings?  What if the contents of the dir
-    # changed?
-    # Can we look at the dir timestamp?
-    #
-    # (dir, timestamp) -> list of entries perhaps?  And then every time you hit
-    # tab, do you have to check the timestamp?  It should be cached by the
-    # kernel, so yes.
-    self.ext = []
-
-    # (dir, timestamp) -> list
-    # NOTE: This cache assumes that listing a directory is slower than statting
-    # it to get the mtime.  That may not be true on all systems?  Either way
-    # you are reading blocks of metadata.  But I guess /bin on many systems is
-    # huge, and will require lots of sys calls.
-    self.cache = {}
+    self.search_path = search_path
 
   def Matches(self, words, index, prefix):
-    """
-    TODO: Cache is never cleared.
-
-    - When we get a newer timestamp, we should clear the old one.
-    - When PATH is changed, we can remove old entries.
-    """
-    val = self.mem.GetVar('PATH')
-    if val.tag != value_e.Str:
-      # No matches if not a string
-      return
-    path_dirs = val.s.split(':')
-    #print(path_dirs)
-
-    names = []
-    for d in path_dirs:
-      try:
-        st = os.stat(d)
-      except OSError as e:
-        # There could be a directory that doesn't exist in the $PATH.
-        continue
-      key = (d, st.st_mtime)
-      listing = self.cache.get(key)
-      if listing is None:
-        listing = os.listdir(d)
-        self.cache[key] = listing
-      names.extend(listing)
-
-    for word in listing:
+    for word in self.search_path.ListCommands():
       if word.startswith(prefix):
         yield word + ' '
 
@@ -751,10 +708,11 @@ class StatusOutput:
       self.status_lines[index].Write(msg, *args)
 
 
-def Init(pool, builtins, mem, funcs, comp_lookup, status_out, ev):
+def Init(pool, builtins, mem, search_path, funcs, comp_lookup, status_out,
+         ev):
 
   aliases_action = WordsAction(['TODO:alias'])
-  commands_action = ExternalCommandAction(mem)
+  commands_action = ExternalCommandAction(search_path)
   builtins_action = WordsAction(builtins.GetNamesToComplete())
   keywords_action = WordsAction(['TODO:keywords'])
   funcs_action = LiveDictAction(funcs)
@@ -797,13 +755,14 @@ if __name__ == '__main__':
   builtins = builtin.BUILTIN_DEF
 
   mem = state.Mem('dummy', [], {})
+  search_path = state.SearchPath(mem)
 
   funcs = {'func1': None, 'func2': None, 'exfunc': None}
   comp_lookup = CompletionLookup()
   ev = None
 
   pool = None
-  Init(pool, builtins, mem, funcs, comp_lookup, status_out, ev)
+  Init(pool, builtins, mem, search_path, funcs, comp_lookup, status_out, ev)
 
   # Disable it.  OK so this is how you go back and forth?  At least in Python.
   # Enable and disable custom completer?
@@ -63,7 +63,7 @@ class CompletionTest(unittest.TestCase):
 
   def testExternalCommandAction(self):
     mem = state.Mem('dummy', [], {}, None)
-    a = completion.ExternalCommandAction(mem)
+    a = completion.ExternalCommandAction(state.SearchPath(mem))
     print(list(a.Matches([], 0, 'f')))
 
   def testShellFuncExecution(self):
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+comsub.py - Decide whether a command sub can run without forking.
+
+$(echo "$x") and $(myfunc) are common, and forking for them is the biggest
+cost in many scripts.  If the subtree only runs the builtins below and shell
+functions made of them, the executor can run it in the shell process.  It
+captures stdout in FdState, and restores Mem afterward, so the child's
+variable assignments, 'shift', etc. aren't visible.
+
+Anything else, e.g. an external command, a pipeline, 'cd', or 'set', forks as
+before.
+"""
+
+from asdl import py_meta
+from core import builtin
+from core import word
+from core.id_kind import Id
+from osh import ast_ as ast
+
+command_e = ast.command_e
+
+EBuiltin = builtin.EBuiltin
+
+# Builtins whose only effects are on stdout, stderr, and Mem.
+_IN_PROCESS_BUILTINS = frozenset([
+    EBuiltin.COLON, EBuiltin.SHIFT,  # special
+    EBuiltin.ECHO, EBuiltin.PRINTF, EBuiltin.TRUE, EBuiltin.FALSE,
+    EBuiltin.TEST, EBuiltin.BRACKET, EBuiltin.TYPE,
+])
+
+# These run in another process, or change shell state that isn't in Mem.
+_FORK_NODES = frozenset([
+    command_e.Pipeline, command_e.Subshell, command_e.FuncDef,
+    command_e.TimeBlock,
+])
+
+_LOOP_NODES = frozenset([
+    command_e.ForEach, command_e.ForExpr, command_e.While, command_e.Until,
+])
+
+# Don't keep too many nodes alive, e.g. after their arena is released.
+_MAX_CACHED = 1000
+
+
+class _Unsafe(Exception):
+  """Raised by the analysis when a subtree has to fork."""
+
+
+def _Walk(node, in_func, in_loop, names):
+  """Check a subtree, and add the names of the commands it runs to names.
+
+  Args:
+    node: command, word, redirect, etc.
+    in_func: whether 'return' is OK
+    in_loop: whether 'break' and 'continue' are OK
+
+  Raises:
+    _Unsafe
+  """
+  if isinstance(node, ast.command):
+    tag = node.tag
+    if tag in _FORK_NODES:
+      raise _Unsafe()
+
+    if tag == command_e.Sentence and node.terminator.id != Id.Op_Semi:
+      raise _Unsafe()  # background job
+
+    if tag == command_e.ControlFlow:
+      id_ = node.token.id
+      if id_ == Id.ControlFlow_Return and not in_func:
+        raise _Unsafe()
+      if id_ in (Id.ControlFlow_Break, Id.ControlFlow_Continue) and not in_loop:
+        raise _Unsafe()
+      # 'exit' is OK anywhere.  Like the child process, the executor stops
+      # with its status.
+
+    elif tag == command_e.SimpleCommand and node.words:
+      ok, name, _ = word.StaticEval(node.words[0])
+      if not ok:
+        raise _Unsafe()  # e.g. $cmd
+      names.add(name)
+
+    elif tag in _LOOP_NODES:
+      in_loop = True
+
+  elif isinstance(node, ast.CommandSubPart):
+    if node.left_token.id in (Id.Left_ProcSubIn, Id.Left_ProcSubOut):
+      raise _Unsafe()
+    return  # A nested command sub makes its own decision.
+
+  for name in node.__slots__:
+    val = getattr(node, name)
+    if isinstance(val, list):
+      for item in val:
+        if isinstance(item, py_meta.CompoundObj):
+          _Walk(item, in_func, in_loop, names)
+    elif isinstance(val, py_meta.CompoundObj):
+      _Walk(val, in_func, in_loop, names)
+
+
+class InProcessAnalyzer(object):
+  """Decides whether a command sub can run in the shell process.
+
+  The analysis of each subtree is cached, but the names it runs are resolved
+  on every call, since functions can be redefined.
+  """
+
+  def __init__(self):
+    self.cache = {}  # command or FuncDef node -> frozenset of names, or None
+
+  def _Names(self, node, in_func):
+    try:
+      return self.cache[node]
+    except KeyError:
+      pass
+
+    names = set()
+    try:
+      if in_func:  # node is a FuncDef; skip the _FORK_NODES check
+        _Walk(node.body, True, False, names)
+        for r in node.redirects:
+          _Walk(r, True, False, names)
+      else:
+        _Walk(node, False, False, names)
+    except _Unsafe:
+      result = None
+    else:
+      result = frozenset(names)
+
+    if len(self.cache) >= _MAX_CACHED:
+      self.cache.clear()
+    self.cache[node] = result
+    return result
+
+  def _CanRun(self, names, funcs, seen):
+    for name in names:
+      # Same order as Executor._RunSimpleCommand.
+      builtin_id = builtin.ResolveSpecial(name)
+      if builtin_id != EBuiltin.NONE:
+        if builtin_id not in _IN_PROCESS_BUILTINS:
+          return False
+        continue
+
+      func_node = funcs.get(name)
+      if func_node is not None:
+        if func_node in seen:  # recursive
+          continue
+        seen.add(func_node)
+        func_names = self._Names(func_node, True)
+        if func_names is None or not self._CanRun(func_names, funcs, seen):
+          return False
+        continue
+
+      if builtin.Resolve(name) not in _IN_PROCESS_BUILTINS:
+        return False  # external command, or a builtin like 'cd'
+    return True
+
+  def CanRunInProcess(self, node, funcs):
+    """
+    Args:
+      node: the command of a CommandSubPart
+      funcs: the executor's dict of functions
+
+    Returns:
+      Whether the command sub can run without forking.
+    """
+    names = self._Names(node, False)
+    if names is None:
+      return False
+    return self._CanRun(names, funcs, set())
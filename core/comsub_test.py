@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+comsub_test.py: Tests for comsub.py
+"""
+
+import unittest
+
+from core import comsub  # module under test
+from core import reader
+from core import test_lib
+
+from osh import parse_lib
+
+
+def _ParseFuncs(code_str):
+  """Return a dict of the functions defined in code_str."""
+  node = _Parse(code_str)
+  children = node.children if hasattr(node, 'children') else [node]
+  return dict((child.name, child) for child in children)
+
+
+def _Parse(code_str):
+  arena = test_lib.MakeArena('<comsub_test.py>')
+  line_reader = reader.StringLineReader(code_str, arena)
+  _, c_parser = parse_lib.MakeParser(line_reader, arena)
+  return c_parser.ParseWholeFile()
+
+
+class InProcessAnalyzerTest(unittest.TestCase):
+
+  def assertInProcess(self, code_str, funcs=None):
+    analyzer = comsub.InProcessAnalyzer()
+    self.assertTrue(analyzer.CanRunInProcess(_Parse(code_str), funcs or {}),
+                    code_str)
+
+  def assertForks(self, code_str, funcs=None):
+    analyzer = comsub.InProcessAnalyzer()
+    self.assertFalse(analyzer.CanRunInProcess(_Parse(code_str), funcs or {}),
+                     code_str)
+
+  def testBuiltins(self):
+    self.assertInProcess('echo "$x"')
+    self.assertInProcess('x=1; echo $x; shift')
+    self.assertInProcess('if test -n "$x"; then echo yes; else echo no; fi')
+    self.assertInProcess('for i in 1 2; do echo $i; break; done')
+    self.assertInProcess('echo $(ls)')  # the inner one decides for itself
+    self.assertInProcess('echo hi >&2; exit 3')
+
+    self.assertForks('ls')
+    self.assertForks('cd /tmp; echo hi')
+    self.assertForks('set -e')
+    self.assertForks('$cmd')
+    self.assertForks('echo hi | cat')
+    self.assertForks('(echo hi)')
+    self.assertForks('echo hi &')
+    self.assertForks('f() { echo hi; }')
+    self.assertForks('cat <(echo hi)')
+    self.assertForks('return 1')
+    self.assertForks('break')
+
+  def testFunctions(self):
+    funcs = _ParseFuncs("""
+        f() { echo "$1"; return 1; }
+        g() { f "$@"; g; }
+        h() { ls; }
+        b() { break; }
+    """)
+    self.assertInProcess('f x', funcs)
+    self.assertInProcess('g x', funcs)  # recursive
+    self.assertForks('h', funcs)
+    self.assertForks('for i in 1 2; do b; done', funcs)
+
+    # Functions can shadow normal builtins, but not special ones.
+    funcs = _ParseFuncs('''
+        echo() { ls; }
+        shift() { ls; }
+    ''')
+    self.assertForks('echo hi', funcs)
+    self.assertInProcess('shift', funcs)
+
+
+if __name__ == '__main__':
+  unittest.main()
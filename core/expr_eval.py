@@ -13,13 +13,15 @@ import os
 import stat
 
 try:
-  import libc  # for fnmatch
+  import libc  # for regex_match
 except ImportError:
   from benchmarks import fake_libc as libc
 
 from core.id_kind import BOOL_OPS, OperandType, Id
+from core import glob_
 from core import util
 from core import runtime
+from core import state
 
 from osh import ast_ as ast
 
@@ -439,7 +441,7 @@ class BoolEvaluator(_ExprEvaluator):
 
   def _SetRegexMatches(self, matches):
     """For ~= to set the BASH_REMATCH array."""
-    self.mem
+    state.SetGlobalArray(self.mem, 'BASH_REMATCH', matches)
 
   def _EvalCompoundWord(self, word, do_fnmatch=False):
     """
@@ -589,10 +591,10 @@ class BoolEvaluator(_ExprEvaluator):
 
         if op_id in (Id.BoolBinary_GlobEqual, Id.BoolBinary_GlobDEqual):
           #log('Comparing %s and %s', s2, s1)
-          return libc.fnmatch(s2, s1)
+          return glob_.FnMatch(s2, s1)
 
         if op_id == Id.BoolBinary_GlobNEqual:
-          return not libc.fnmatch(s2, s1)
+          return not glob_.FnMatch(s2, s1)
 
         if op_id in (Id.BoolBinary_Equal, Id.BoolBinary_DEqual):
           return s1 == s2
@@ -601,22 +603,22 @@ class BoolEvaluator(_ExprEvaluator):
           return s1 != s2
 
         if op_id == Id.BoolBinary_EqualTilde:
-          # NOTE: regex matching can't fail if compilation succeeds.
-          match = libc.regex_match(s2, s1)
-          # TODO: BASH_REMATCH or REGEX_MATCH
-          if match == 1:
-            self._SetRegexMatches('TODO')
-            is_match = True
-          elif match == 0:
-            is_match = False
-          elif match == -1:
-            raise AssertionError(
-                "Invalid regex %r: should have been caught at compile time" %
-                s2)
-          else:
-            raise AssertionError
+          # NOTE: Constant regexes were compiled and cached at parse time.
+          try:
+            spans = libc.regex_match(s2, s1)
+          except RuntimeError:
+            # Dynamic patterns like [[ foo =~ $pat ]] aren't checked at parse
+            # time.
+            e_die("Invalid regex %r", s2, word=node.right)
+
+          if spans is None:
+            self._SetRegexMatches([])
+            return False
 
-          return is_match
+          # Unmatched groups are (-1, -1), which gives an empty string.
+          matches = [s1[start:end] for start, end in spans]
+          self._SetRegexMatches(matches)
+          return True
 
         if op_id == Id.Redir_Less:  # pun
           return s1 < s2
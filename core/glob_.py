@@ -39,6 +39,8 @@ def LooksLikeGlob(s):
       left_bracket = True
     elif c == ']' and left_bracket:
       return True
+    elif c in '@+!' and i + 1 < n and s[i+1] == '(':  # extglob
+      return True
     i += 1
   return False
 
@@ -48,88 +50,445 @@ def LooksLikeGlob(s):
 # ! : - are metachars within character classes
 GLOB_META_CHARS = r'\*?[]-:!'
 
+# Extended glob operators, so that "@(foo)" isn't an extended glob.
+EXTGLOB_META_CHARS = '@+()|'
+
+_GLOB_ESCAPE_CHARS = GLOB_META_CHARS + EXTGLOB_META_CHARS
+
+
+def BackslashEscape(s, meta_chars):
+  """Put a backslash before each character of s that's in meta_chars.
+
+  Shared with the IFS splitters.  str.replace() loops in C, and returns s
+  itself if there's nothing to replace.
+  """
+  if '\\' in meta_chars:  # first, so the other escapes aren't escaped
+    s = s.replace('\\', '\\\\')
+  for c in meta_chars:
+    if c != '\\' and c in s:
+      s = s.replace(c, '\\' + c)
+  return s
+
+
 def GlobEscape(s):
   """
   For SingleQuotedPart, DoubleQuotedPart, and EscapedLiteralPart
   """
-  escaped = ''
-  for c in s:
-    if c in GLOB_META_CHARS:
-      escaped += '\\'
-    escaped += c
-  return escaped
+  return BackslashEscape(s, _GLOB_ESCAPE_CHARS)
 
 
 # We need to handle glob patterns, but fnmatch doesn't give you the positions
 # of matches.  So we convert globs to regexps.
-
-# TODO: Use this for ${s//pat*/__}
-# NOTE: Is [!abc] negation rather than [^abc] ?
-# What about unicode?  Do we have to set any global variables.
-
-def GlobToExtendedRegex(g):
-  """Convert a glob to a libc extended regexp.
+#
+# A glob is first parsed into a list of atoms, which can be reversed to match
+# suffixes, and then printed as an ERE or Python regex.
+
+GLOB_LITERAL, GLOB_ANY, GLOB_STAR, GLOB_CLASS, GLOB_EXTGLOB = range(5)
+
+# Character classes spelled out, since Python's re module doesn't understand
+# [[:alpha:]].
+_POSIX_CLASSES = {
+    'alpha': 'a-zA-Z',
+    'digit': '0-9',
+    'alnum': 'a-zA-Z0-9',
+    'upper': 'A-Z',
+    'lower': 'a-z',
+    'space': r' \t\n\r\f\v',
+    'blank': r' \t',
+    'punct': re.escape('!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'),
+    'xdigit': '0-9A-Fa-f',
+    'cntrl': r'\x00-\x1f\x7f',
+    'print': r'\x20-\x7e',
+    'graph': r'\x21-\x7e',
+    'word': 'a-zA-Z0-9_',
+}
+
+
+def _ParseBracket(s, i):
+  """Parse a bracket expression starting after '['.
 
   Returns:
-    A ERE string, or None if it's the pattern is a constant string rather than
-    a glob.
+    ((negated, items), index after ']', err).  Each item is a character, a
+    (lo, hi) range, or a POSIX class name in a list.  The first value is None
+    if there's no closing ']', in which case '[' is a literal.
   """
-  raise NotImplementedError
+  n = len(s)
+  negated = False
+  if i < n and s[i] in '!^':
+    negated = True
+    i += 1
 
+  items = []
+  first = True
+  while i < n:
+    c = s[i]
+    if c == ']' and not first:
+      return (negated, items), i + 1, None
+
+    first = False
+    if c == '[' and i + 1 < n and s[i+1] in ':=.':
+      delim = s[i+1]
+      end = s.find(delim + ']', i + 2)
+      if end == -1:
+        return None, i, None
+      name = s[i+2:end]
+      if delim != ':' or name not in _POSIX_CLASSES:
+        return None, i, True  # equivalence classes, etc. aren't supported
+      items.append([name])
+      i = end + 2
+      continue
+
+    if c == '\\' and i + 1 < n:
+      i += 1
+      c = s[i]
+
+    # Range like a-z
+    if i + 2 < n and s[i+1] == '-' and s[i+2] != ']':
+      hi = s[i+2]
+      j = i + 3
+      if hi == '\\' and j < n:
+        hi = s[j]
+        j += 1
+      items.append((c, hi))
+      i = j
+      continue
+
+    items.append(c)
+    i += 1
 
-def GlobToPythonRegex(s, greedy=True):
-  """Convert a glob to a libc extended regexp.
+  return None, i, None  # no closing ], so [ is literal
 
-  Args:
-    greedy: whether * should be '.*' (greedy) or '.*?' (non-greedy)
 
-  NOTE: character classes aren't supported.
+def _SplitArms(s, i):
+  """Find the arms of an extglob starting after '('.
 
   Returns:
-    A Python regex string, or None if it's the pattern is a constant string
-    rather than a glob.
+    (list of arm strings, index after ')'), or (None, i) if it's unclosed.
+  """
+  n = len(s)
+  arms = []
+  depth = 0
+  start = i
+  while i < n:
+    c = s[i]
+    if c == '\\':
+      i += 2
+      continue
+    if c == '(':
+      depth += 1
+    elif c == ')':
+      if depth == 0:
+        arms.append(s[start:i])
+        return arms, i + 1
+      depth -= 1
+    elif c == '|' and depth == 0:
+      arms.append(s[start:i])
+      start = i + 1
+    i += 1
+  return None, i
+
 
-    regex, err?
+def _ParseGlob(s):
+  """Parse a glob into a list of (type, value) atoms.
+
+  Returns:
+    (atoms, err)
   """
-  star_pat = '.*' if greedy else '.*?'
+  atoms = []
+  literal = []  # pending literal characters
 
-  is_glob = False
-  err = None
+  def _FlushLiteral():
+    if literal:
+      atoms.append((GLOB_LITERAL, ''.join(literal)))
+      del literal[:]
 
   i = 0
   n = len(s)
-  out = []
   while i < n:
     c = s[i]
     if c == '\\':  # glob escape like \* or \?
+      if i + 1 < n:
+        i += 1
+      literal.append(s[i])  # a trailing backslash is literal
       i += 1
-      out.append(s[i])
+
+    elif c in '@*+?!' and i + 1 < n and s[i+1] == '(':
+      arm_strs, end = _SplitArms(s, i + 2)
+      if arm_strs is None:  # unclosed, e.g. ${x%%*(}
+        if c in '*?':
+          _FlushLiteral()
+          atoms.append((GLOB_STAR if c == '*' else GLOB_ANY, None))
+        else:
+          literal.append(c)
+        i += 1
+        continue
+
+      if c == '!':
+        # Negation can't be expressed as a regex in general.
+        return None, True
+
+      arms = []
+      for arm_str in arm_strs:
+        arm, err = _ParseGlob(arm_str)
+        if err:
+          return None, err
+        arms.append(arm)
+      _FlushLiteral()
+      atoms.append((GLOB_EXTGLOB, (c, arms)))
+      i = end
+
     elif c == '*':
-      is_glob = True
-      out.append(star_pat)
+      _FlushLiteral()
+      # ** is the same as *
+      if not (atoms and atoms[-1][0] == GLOB_STAR):
+        atoms.append((GLOB_STAR, None))
+      i += 1
+
     elif c == '?':
-      is_glob = True
-      out.append('.')
-    # TODO: Should we enter a different state and parse these?
+      _FlushLiteral()
+      atoms.append((GLOB_ANY, None))
+      i += 1
+
     elif c == '[':
-      err = True  # TODO: better error
-      break
-    elif c == ']':
-      err = True
+      cls, end, err = _ParseBracket(s, i + 1)
+      if err:
+        return None, err
+      if cls is None:
+        literal.append(c)
+        i += 1
+      else:
+        _FlushLiteral()
+        atoms.append((GLOB_CLASS, cls))
+        i = end
+
     else:
-      # e.g. . -> \.
-      out.append(re.escape(c))
+      literal.append(c)
+      i += 1
 
-    i += 1
+  _FlushLiteral()
+  return atoms, None
+
+
+def _ReverseAtoms(atoms):
+  """Return atoms that match the reverse of what the given atoms match."""
+  rev = []
+  for typ, val in reversed(atoms):
+    if typ == GLOB_LITERAL:
+      val = val[::-1]
+    elif typ == GLOB_EXTGLOB:
+      op, arms = val
+      val = (op, [_ReverseAtoms(arm) for arm in arms])
+    rev.append((typ, val))
+  return rev
+
+
+def _HasExtGlob(atoms):
+  return any(typ == GLOB_EXTGLOB for typ, _ in atoms)
 
+
+def _ClassChar(c):
+  """Escape a character inside a Python regex character class."""
+  if c in '\\]^-[':
+    return '\\' + c
+  return c
+
+
+def _PythonClass(negated, items):
+  out = ['[^' if negated else '[']
+  for item in items:
+    if isinstance(item, list):
+      out.append(_POSIX_CLASSES[item[0]])
+    elif isinstance(item, tuple):
+      out.append('%s-%s' % (_ClassChar(item[0]), _ClassChar(item[1])))
+    else:
+      out.append(_ClassChar(item))
+  out.append(']')
+  return ''.join(out)
+
+
+def _ExtendedClass(negated, items):
+  """Print a POSIX bracket expression, where backslash isn't special."""
+  chars = []
+  rest = []
+  for item in items:
+    if isinstance(item, list):
+      rest.append('[:%s:]' % item[0])
+    elif isinstance(item, tuple):
+      rest.append('%s-%s' % item)
+    else:
+      chars.append(item)
+
+  if not negated and not rest and chars == ['^']:
+    return '\\^'
+
+  # ] must come first, - last, and ^ anywhere but first.
+  out = ['[^' if negated else '[']
+  if ']' in chars:
+    out.append(']')
+  out.extend(rest)
+  out.extend(c for c in chars if c not in ']^-')
+  if '^' in chars:
+    out.append('^')
+  if '-' in chars:
+    out.append('-')
+  out.append(']')
+  return ''.join(out)
+
+
+def _AtomsToRegex(atoms, greedy, out):
+  lazy = '' if greedy else '?'
+  for typ, val in atoms:
+    if typ == GLOB_LITERAL:
+      out.append(re.escape(val))
+    elif typ == GLOB_ANY:
+      out.append('.')
+    elif typ == GLOB_STAR:
+      out.append('.*' + lazy)
+    elif typ == GLOB_CLASS:
+      out.append(_PythonClass(*val))
+    elif typ == GLOB_EXTGLOB:
+      op, arms = val
+      out.append('(?:')
+      for i, arm in enumerate(arms):
+        if i != 0:
+          out.append('|')
+        _AtomsToRegex(arm, greedy, out)
+      out.append(')')
+      if op == '?':
+        out.append('?' + lazy)
+      elif op == '*':
+        out.append('*' + lazy)
+      elif op == '+':
+        out.append('+' + lazy)
+    else:
+      raise AssertionError(typ)
+
+
+def _AtomsToExtendedRegex(atoms, out):
+  for typ, val in atoms:
+    if typ == GLOB_LITERAL:
+      out.append(''.join('\\' + c if c in '.[]{}()\\*+?|^$' else c
+                         for c in val))
+    elif typ == GLOB_ANY:
+      out.append('.')
+    elif typ == GLOB_STAR:
+      out.append('.*')
+    elif typ == GLOB_CLASS:
+      out.append(_ExtendedClass(*val))
+    elif typ == GLOB_EXTGLOB:
+      op, arms = val
+      out.append('(')
+      for i, arm in enumerate(arms):
+        if i != 0:
+          out.append('|')
+        _AtomsToExtendedRegex(arm, out)
+      out.append(')')
+      if op != '@':
+        out.append(op)  # ? * + mean the same thing in ERE
+    else:
+      raise AssertionError(typ)
+
+
+def GlobToExtendedRegex(g):
+  """Convert a glob to a libc extended regexp.
+
+  Returns:
+    (regex, err).  The regex is None if the pattern is a constant string
+    rather than a glob.
+  """
+  atoms, err = _ParseGlob(g)
+  if err:
+    return None, err
+  if not any(typ != GLOB_LITERAL for typ, _ in atoms):
+    return None, None
+
+  out = []
+  _AtomsToExtendedRegex(atoms, out)
+  return ''.join(out), None
+
+
+def GlobToPythonRegex(s, greedy=True):
+  """Convert a glob to a Python regex.
+
+  Args:
+    greedy: whether * should be '.*' (greedy) or '.*?' (non-greedy)
+
+  Returns:
+    (regex, err).  The regex is None if the pattern is a constant string
+    rather than a glob.  err is set if the glob can't be expressed as a
+    regex, e.g. !(foo).
+  """
+  atoms, err = _ParseGlob(s)
   if err:
     return None, err
+  if not any(typ != GLOB_LITERAL for typ, _ in atoms):
+    return None, None
+  out = []
+  _AtomsToRegex(atoms, greedy, out)
+  return ''.join(out), None
+
+
+class GlobRegex(object):
+  """A glob compiled to Python regexes, or a constant string."""
+
+  def __init__(self, literal, regex, full, has_extglob):
+    self.literal = literal  # unescaped string, or None if it's a glob
+    self.regex = regex  # matches a prefix with re.match()
+    self.full = full  # anchored at the end too
+    self.has_extglob = has_extglob
+
+
+_MAX_CACHED = 1000
+_glob_cache = {}  # (pattern, greedy, reverse) -> GlobRegex or None
+
+
+def CompileGlob(pat, greedy=True, reverse=False):
+  """Compile a glob, memoized by pattern and greediness.
+
+  Args:
+    reverse: compile a regex that matches the reverse of the string, for
+      suffix operations.
+
+  Returns:
+    A GlobRegex, or None if the glob can't be expressed as a regex.  Then the
+    caller should fall back on fnmatch().
+  """
+  key = (pat, greedy, reverse)
+  try:
+    return _glob_cache[key]
+  except KeyError:
+    pass
+
+  atoms, err = _ParseGlob(pat)
+  if err:
+    g = None
+  elif not any(typ != GLOB_LITERAL for typ, _ in atoms):
+    literal = atoms[0][1] if atoms else ''
+    g = GlobRegex(literal[::-1] if reverse else literal, None, None, False)
   else:
-    if is_glob:
-      regex = ''.join(out)
-    else:
-      regex = None
-    return regex, err
+    if reverse:
+      atoms = _ReverseAtoms(atoms)
+    out = []
+    _AtomsToRegex(atoms, greedy, out)
+    regex = ''.join(out)
+    g = GlobRegex(None, re.compile(regex, re.DOTALL),
+                  re.compile('(?:%s)\\Z' % regex, re.DOTALL),
+                  _HasExtGlob(atoms))
+
+  if len(_glob_cache) >= _MAX_CACHED:
+    _glob_cache.clear()
+  _glob_cache[key] = g
+  return g
+
+
+def FnMatch(pat, s):
+  """Like fnmatch(), but with cached regexes.  For case and [[ == ]]."""
+  g = CompileGlob(pat)
+  if g is None:
+    return bool(libc.fnmatch(pat, s))
+  if g.literal is not None:
+    return g.literal == s
+  return g.full.match(s) is not None
 
 
 def _GlobUnescape(s):  # used by cmd_exec
@@ -151,7 +510,7 @@ def _GlobUnescape(s):  # used by cmd_exec
       assert i != n - 1, 'Trailing backslash: %r' % s
       i += 1
       c2 = s[i]
-      if c2 in GLOB_META_CHARS:
+      if c2 in GLOB_META_CHARS or c2 in EXTGLOB_META_CHARS:
         unescaped += c2
       else:
         raise AssertionError("Unexpected escaped character %r" % c2)
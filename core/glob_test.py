@@ -97,7 +97,14 @@ class GlobEscapeTest(unittest.TestCase):
         ('*.py', '.*\.py', None),
         ('*.?', '.*\..', None),
         ('abc', None, None),
-        ('[[:space:]]', None, True),
+        (r'\*', None, None),
+        ('[[:space:]]', r'[ \t\n\r\f\v]', None),
+        ('[!a-z]', '[^a-z]', None),
+        ('[]x]', r'[\]x]', None),
+        ('[', None, None),  # no closing bracket, so it's a literal
+        ('@(a|b*)', r'(?:a|b.*)', None),
+        ('--+(x)', r'\-\-(?:x)+', None),
+        ('!(x)', None, True),  # can't be expressed as a regex
     ]
     for glob, expected_regex, expected_err in CASES:
       regex, err = glob_.GlobToPythonRegex(glob)
@@ -106,6 +113,40 @@ class GlobEscapeTest(unittest.TestCase):
       self.assertEqual(expected_err, err,
           '%s: expected %r, got %r' % (glob, expected_err, err))
 
+  def testGlobToExtendedRegex(self):
+    CASES = [
+        ('*.py', r'.*\.py'),
+        ('[[:space:]]', '[[:space:]]'),
+        ('[!]a-]', '[^]a-]'),
+        ('@(a|b)', '(a|b)'),
+    ]
+    for glob, expected_regex in CASES:
+      regex, err = glob_.GlobToExtendedRegex(glob)
+      self.assertEqual(expected_regex, regex)
+      self.assertEqual(True, libc.regex_parse(regex))
+
+  def testFnMatch(self):
+    CASES = [
+        ('*.py', 'foo.py', True),
+        ('*.py', 'foo.pyc', False),
+        ('[[:upper:]]*', 'Foo', True),
+        ('[[:upper:]]*', 'foo', False),
+        (r'\*', '*', True),
+        ('?', '\n', True),
+        ('--@(help|verbose)', '--verbose', True),
+        ('--@(help|verbose)', '--oops', False),
+        ('*(foo*)', 'foofoo_foo__', True),
+        ('--!(help|verbose)', '--oops', True),  # falls back on fnmatch()
+    ]
+    for pat, s, expected in CASES:
+      self.assertEqual(expected, glob_.FnMatch(pat, s), (pat, s))
+
+  def testCompileGlobReverse(self):
+    g = glob_.CompileGlob('a*[bc]', greedy=False, reverse=True)
+    self.assertEqual('[bc].*?a', g.regex.pattern)
+    g = glob_.CompileGlob('ab', reverse=True)
+    self.assertEqual('ba', g.literal)
+
   def testPatSubRegexesLibc(self):
     r = libc.regex_parse('^(.*)git.*(.*)')
     print(r)
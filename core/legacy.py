@@ -37,6 +37,12 @@ with SPLIT_REGEX = / digit+ / {
 }
 """
 
+try:
+  import fastsplit
+except ImportError:
+  fastsplit = None  # fall back on the state machine in Python
+
+from core import glob_
 from core import runtime
 from core import util
 
@@ -44,6 +50,9 @@ value_e = runtime.value_e
 span_e = runtime.span_e
 log = util.log
 
+# In the order that fastsplit.split() expects.
+_SPAN_TYPES = (span_e.Black, span_e.Delim, span_e.Backslash)
+
 
 DEFAULT_IFS = ' \t\n'
 
@@ -109,16 +118,18 @@ class SplitContext(object):
       sp = self.splitters[ifs]
     except KeyError:
       # Figure out what kind of splitter we should instantiate.
-
-      ifs_whitespace = ''
-      ifs_other = ''
-      for c in ifs:
-        if c in ' \t\n':  # Happens to be the same as DEFAULT_IFS
-          ifs_whitespace += c
-        else:
-          ifs_other += c
-
-      sp = IfsSplitter(ifs_whitespace, ifs_other)
+      if ifs:
+        ifs_whitespace = ''
+        ifs_other = ''
+        for c in ifs:
+          if c in ' \t\n':  # Happens to be the same as DEFAULT_IFS
+            ifs_whitespace += c
+          else:
+            ifs_other += c
+
+        sp = IfsSplitter(ifs_whitespace, ifs_other)
+      else:
+        sp = NullSplitter()
 
       # NOTE: Technically, we could make the key more precise.  IFS=$' \t' is
       # the same as IFS=$'\t '.  But most programs probably don't do that, and
@@ -149,6 +160,11 @@ class SplitContext(object):
       # TODO: Raise proper error
       raise AssertionError("IFS shouldn't be an array")
 
+  def GetIfsChars(self):
+    """The characters that split a word, or '' if nothing does."""
+    sp = self._GetSplitter()
+    return sp.ifs_chars
+
   def Escape(self, s):
     """Escape IFS chars."""
     sp = self._GetSplitter()
@@ -172,8 +188,7 @@ class SplitContext(object):
       Array of (ignored Bool, start_index Int) tuples.
     """
     sp = self._GetSplitter()
-    spans = sp.Split(s, True)
-    return _SpansToParts(s, spans)
+    return sp.SplitParts(s)
 
   def SplitForRead(self, line, allow_escape):
     sp = self._GetSplitter()
@@ -182,29 +197,12 @@ class SplitContext(object):
 
 class _BaseSplitter(object):
   def __init__(self, escape_chars):
+    self.ifs_chars = escape_chars
     # Backslash is always escaped
     self.escape_chars = escape_chars + '\\'
 
-  # NOTE: This is pretty much the same as GlobEscape.
   def Escape(self, s):
-    escaped = ''
-    for c in s:
-      if c in self.escape_chars:
-        escaped += '\\'
-      escaped += c
-    return escaped
-
-
-# TODO: Used this when IFS='' or IFS isn't set?  This is the fast path for Oil!
-
-class NullSplitter(_BaseSplitter):
-
-  def __init__(self, ifs_whitespace):
-    _BaseSplitter.__init__(self, ifs_whitespace)
-    self.ifs_whitespace = ifs_whitespace
-
-  def Split(self, s, allow_escape):
-    raise NotImplementedError
+    return glob_.BackslashEscape(s, self.escape_chars)
 
 
 # IFS splitting is complicated in general.  We handle it with three concepts:
@@ -298,7 +296,25 @@ class IfsSplitter(_BaseSplitter):
     self.ifs_whitespace = ifs_whitespace
     self.ifs_other = ifs_other
 
+  def SplitParts(self, s):
+    """Split for word evaluation, where backslash escapes are removed.
+
+    Returns:
+      A list of strings.
+    """
+    if fastsplit:
+      return fastsplit.split_parts(s, self.ifs_whitespace, self.ifs_other)
+    return _SpansToParts(s, self.Split(s, True))
+
   def Split(self, s, allow_escape):
+    """
+    Returns:
+      A list of (span_type, end_index) pairs.
+    """
+    if fastsplit:
+      return fastsplit.split(s, self.ifs_whitespace, self.ifs_other,
+                             allow_escape, _SPAN_TYPES)
+
     ws_chars = self.ifs_whitespace
     other_chars = self.ifs_other
 
@@ -381,3 +397,23 @@ class IfsSplitter(_BaseSplitter):
     spans.append((span_type, n))
 
     return spans
+
+
+class NullSplitter(IfsSplitter):
+  """For IFS='', which means the string isn't split.
+
+  Backslash escapes are still removed.
+  """
+
+  def __init__(self):
+    IfsSplitter.__init__(self, '', '')
+
+  def SplitParts(self, s):
+    if '\\' in s:
+      return IfsSplitter.SplitParts(self, s)
+    return [s] if s else []
+
+  def Split(self, s, allow_escape):
+    if allow_escape and '\\' in s:
+      return IfsSplitter.Split(self, s, allow_escape)
+    return [(span_e.Black, len(s))] if s else []
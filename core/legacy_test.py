@@ -3,6 +3,7 @@
 legacy_test.py: Tests for legacy.py
 """
 
+import random
 import unittest
 
 from core import legacy  # module under test
@@ -155,6 +156,40 @@ class SplitTest(unittest.TestCase):
     sp = legacy.IfsSplitter('', '_-')
     _RunSplitCases(self, sp, CASES)
 
+  def testNullSplitter(self):
+    sp = legacy.NullSplitter()
+    self.assertEqual([], sp.SplitParts(''))
+    self.assertEqual([' a  b '], sp.SplitParts(' a  b '))
+    self.assertEqual(['a b'], sp.SplitParts(r'a\ b'))
+    self.assertEqual([(legacy.span_e.Black, 3)], sp.Split('a\\b', False))
+    self.assertEqual('a b\\\\', sp.Escape('a b\\'))
+
+  def testNativeMatchesPython(self):
+    if not legacy.fastsplit:
+      return
+
+    r = random.Random(42)
+    splitters = [
+        legacy.IfsSplitter(legacy.DEFAULT_IFS, ''),
+        legacy.IfsSplitter(' ', '_'),
+        legacy.IfsSplitter('', '_-'),
+        legacy.IfsSplitter('\t', ''),
+        legacy.IfsSplitter('', ''),
+    ]
+    for _ in xrange(2000):
+      s = ''.join(r.choice(' \t\n_-\\ab') for _ in xrange(r.randint(0, 8)))
+      for sp in splitters:
+        for allow_escape in (True, False):
+          native_spans = sp.Split(s, allow_escape)
+          legacy.fastsplit, saved = None, legacy.fastsplit
+          try:
+            spans = sp.Split(s, allow_escape)
+            parts = sp.SplitParts(s)
+          finally:
+            legacy.fastsplit = saved
+          self.assertEqual(spans, native_spans, repr(s))
+          self.assertEqual(parts, sp.SplitParts(s), repr(s))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -12,6 +12,7 @@ lexer.py - Library for lexing.
 import re
 
 from asdl import const
+from core import id_kind
 from core import util
 from core.id_kind import Id
 from osh import ast_ as ast
@@ -70,8 +71,7 @@ class LineLexer(object):
   def GetSpanIdForEof(self):
     assert self.arena, self.arena  # This is mandatory now?
     # zero length is special!
-    line_span = ast.line_span(self.line_id, self.line_pos, 0)
-    return self.arena.AddLineSpan(line_span)
+    return self.arena.AddSpan(self.line_id, self.line_pos, 0)
 
   def LookAhead(self, lex_mode):
     """Look ahead for a non-space token, using the given lexer mode.
@@ -119,7 +119,6 @@ class LineLexer(object):
 
     # TODO: Add this back once arena is threaded everywhere
     #assert self.line_id != -1
-    line_span = ast.line_span(self.line_id, self.line_pos, len(tok_val))
 
     # NOTE: We're putting the arena hook in LineLexer and not Lexer because we
     # want it to be "low level".  The only thing fabricated here is a newline
@@ -130,7 +129,7 @@ class LineLexer(object):
       span_id = self.last_span_id
       self.arena_skip = False
     else:
-      span_id = self.arena.AddLineSpan(line_span)
+      span_id = self.arena.AddSpan(self.line_id, self.line_pos, len(tok_val))
       self.last_span_id = span_id
 
     #log('LineLexer.Read() span ID %d for %s', span_id, tok_type)
@@ -238,15 +237,25 @@ class Lexer(object):
 class SimpleLexer(object):
   """Lexer for echo -e, which interprets C-escaped strings.
 
-  Based on osh/parse_lib.py MatchToken_Slow.
+  Based on osh/parse_lib.py MatchToken_Slow.  If match_func is passed, e.g.
+  fastlex.MatchEchoToken, it's used instead of the regexes.
   """
-  def __init__(self, pat_list):
+  def __init__(self, pat_list, match_func=None):
     self.pat_list = CompileAll(pat_list)
+    self.match_func = match_func
 
   def Tokens(self, line):
     """Yields tokens."""
     pos = 0
     n = len(line)
+    if self.match_func:
+      match_func = self.match_func
+      while pos < n:
+        tok_type, end_pos = match_func(line, pos)
+        yield id_kind.IdInstance(tok_type), line[pos:end_pos]
+        pos = end_pos
+      return
+
     while pos < n:
       matches = []
       for regex, tok_type in self.pat_list:
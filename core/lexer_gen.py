@@ -8,6 +8,7 @@ import sys
 import sre_parse
 import sre_constants
 
+from core import id_kind
 from osh import lex
 
 
@@ -228,8 +229,6 @@ static inline void MatchToken(int lex_mode, unsigned char* line, int line_len,
         re2_pat = TranslateRegex(pat)
       else:
         re2_pat = TranslateConstant(pat)
-      # TODO: Remove this after debugging Id problem
-      from core import id_kind
       id_name = id_kind.IdName(token_id)
       print '      %-30s { *id = id__%s; break; }' % (re2_pat, id_name)
 
@@ -289,6 +288,40 @@ static inline void MatchToken(int lex_mode, unsigned char* line, int line_len,
   # note: use YYCURSOR and YYLIMIT
   # limit should be the end of string
   # line + line_len
+
+
+def TranslateSimpleLexer(func_name, pat_list):
+  """Translate a lexer with a single mode, like the ones for echo -e.
+
+  Unlike MatchToken, there's no Eol_Tok.  The caller stops at the end of the
+  string, so the pattern list has to match a NUL byte in the middle of it.
+  """
+  print r"""
+static inline void %s(
+    unsigned char* line, int line_len, int start_pos, int* id, int* end_pos) {
+  assert(start_pos < line_len);  /* caller should have checked */
+
+  unsigned char* p = line + start_pos;  /* modified by re2c */
+  unsigned char* YYMARKER;
+
+  for (;;) {
+    /*!re2c""" % func_name
+
+  for is_regex, pat, token_id in pat_list:
+    if is_regex:
+      re2_pat = TranslateRegex(pat)
+    else:
+      re2_pat = TranslateConstant(pat)
+    id_name = id_kind.IdName(token_id)
+    print '    %-30s { *id = id__%s; break; }' % (re2_pat, id_name)
+
+  print """    */
+  }
+  *end_pos = p - line;  /* relative */
+}
+"""
+
+
 def main(argv):
   # This becomes osh-lex.re2c.c.  It is compiled to osh-lex.c and then
   # included.
@@ -296,6 +329,7 @@ def main(argv):
   action = argv[1]
   if action == 'c':
     TranslateLexer(lex.LEXER_DEF)
+    TranslateSimpleLexer('MatchEchoToken', lex.ECHO_E_DEF)
 
   elif action == 'print-all':
     # Top level is a switch statement.
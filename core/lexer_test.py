@@ -5,8 +5,9 @@ lexer_test.py: Tests for lexer.py
 
 import unittest
 
+from core import lexer  # module under test
 from core.id_kind import Id
-from osh.lex import LEXER_DEF
+from osh.lex import LEXER_DEF, ECHO_E_DEF
 
 from osh import ast_ as ast
 
@@ -36,6 +37,14 @@ class TokenTest(unittest.TestCase):
     print("Number of lex states: %d" % len(LEXER_DEF))
     print("Number of token dispatches: %d" % total)
 
+  def testSimpleLexer(self):
+    lex = lexer.SimpleLexer(ECHO_E_DEF)
+    self.assertEqual(
+        [(Id.Char_Literals, 'a'), (Id.Char_OneChar, r'\t'),
+         (Id.Char_Literals, '\0'), (Id.Char_Literals, 'b'),
+         (Id.Char_Octal4, r'\0101'), (Id.Char_BadBackslash, '\\')],
+        list(lex.Tokens('a\\t\0b\\0101\\')))
+
   def testLineId(self):
     # TODO: Test that the lexer gives line_ids when passed an arena.
     # This might be more relevant if we start deallocating memroy.
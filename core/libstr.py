@@ -13,8 +13,6 @@ Or maybe:
 var y = x -> sub( g/a*/, 'b', :ALL)
 """
 
-import re
-
 import libc
 
 from core.id_kind import Id
@@ -24,23 +22,26 @@ from core import util
 log = util.log
 e_die = util.e_die
 
-# Implementation without Python regex:
+# Globs are translated to Python regexes by glob_.CompileGlob(), which caches
+# them by pattern and greediness.
 #
-# (1) PatSub: I think we fill in GlobToExtendedRegex, then use regcomp and
-# regexec.  in a loop.  fnmatch() does NOT given positions of matches.
+# (1) PatSub: a single re.sub(), anchored for ${x/#pat/} and ${x/%pat/}.
 #
-# (2) Strip -- % %% # ## - 
+# (2) Strip -- % %% # ## -
 #
 # a. Fast path for constant strings.
-# b. Convert to POSIX extended regex, to see if it matches at ALL.  If it
-# doesn't match, short circuit out?  We can't do this with fnmatch.
-# c. If it does match, call fnmatch() iteratively over prefixes / suffixes.
+# b. A prefix is a single left-anchored match.  A non-greedy regex finds the
+#    shortest prefix and a greedy one the longest.  This holds for *, ?, and
+#    [] because * is the only variable-width atom.
+# c. A suffix is a prefix of the reversed string, matched with the reversed
+#    pattern.
+# d. Extended globs like @(foo|foobar) don't obey (b), so we try each prefix
+#    or suffix with a regex that's anchored at both ends.  Patterns that can't
+#    be translated, like !(foo), fall back on fnmatch() in the same loop.
 #
-# - # shortest prefix - [:1], [:2], [:3] until it matches
-# - ## longest prefix - [:-1] [:-2], [:3].  Works because fnmatch does not
-#                       match prefixes, it matches EXATLY.
-# - % shortest suffix - [-1:] [-2:] [-3:] ...
-# - %% longest suffix - [1:] [2:] [3:]
+# PatSub with an extended glob is similar.  Python's alternation is
+# leftmost-first, so we find the longest match at each position with the
+# anchored regex, or fnmatch() for !(foo), like match_upto() in bash.
 #
 # See remove_pattern() in subst.c for bash, and trimsub() in eval.c for
 # mksh.  Dash doesn't implement it.
@@ -52,11 +53,38 @@ e_die = util.e_die
 # - Add location info to errors.  Maybe pass spid pair all the way down.
 #   - Compile time errors for [[:space:]] ?
 
+def _StripLoop(s, op_id, matches):
+  """Try each prefix or suffix.  matches(start, end) tests s[start:end]."""
+  n = len(s)
+  if op_id == Id.VOp1_Pound:  # shortest prefix
+    for i in xrange(0, n+1):
+      if matches(0, i):
+        return s[i:]
+
+  elif op_id == Id.VOp1_DPound:  # longest prefix
+    for i in xrange(n, -1, -1):
+      if matches(0, i):
+        return s[i:]
+
+  elif op_id == Id.VOp1_Percent:  # shortest suffix
+    for i in xrange(n, -1, -1):
+      if matches(i, n):
+        return s[:i]
+
+  elif op_id == Id.VOp1_DPercent:  # longest suffix
+    for i in xrange(0, n+1):
+      if matches(i, n):
+        return s[:i]
+
+  return s
+
+
 def DoUnarySuffixOp(s, op, arg):
   """Helper for ${x#prefix} and family."""
 
   # Fast path for constant strings.
   if not glob_.LooksLikeGlob(arg):
+    arg = glob_.CompileGlob(arg).literal  # remove escaping of e.g. "a-b"
     if op.op_id in (Id.VOp1_Pound, Id.VOp1_DPound):  # const prefix
       if s.startswith(arg):
         return s[len(arg):]
@@ -73,62 +101,112 @@ def DoUnarySuffixOp(s, op, arg):
     else:  # e.g. ^ ^^ , ,,
       raise AssertionError(op.op_id)
 
-  # For patterns, do fnmatch() in a loop.
-  #
-  # TODO: Check another fast path first?
-  #
-  # v=aabbccdd
-  # echo ${v#*b}  # strip shortest prefix
-  #
-  # If the whole thing doesn't match '*b*', then no test can succeed.  So we
-  # can fail early.  Conversely echo ${v%%c*} and '*c*'.
-
+  op_id = op.op_id
+  is_prefix = op_id in (Id.VOp1_Pound, Id.VOp1_DPound)
+  greedy = op_id in (Id.VOp1_DPound, Id.VOp1_DPercent)
+
+  g = glob_.CompileGlob(arg, greedy=greedy, reverse=not is_prefix)
+  if g is None:
+    # e.g. !(foo)
+    return _StripLoop(s, op_id,
+                      lambda start, end: libc.fnmatch(arg, s[start:end]))
+
+  if g.has_extglob:
+    full = glob_.CompileGlob(arg).full
+    return _StripLoop(s, op_id,
+                      lambda start, end: full.match(s, start, end) is not None)
+
+  if is_prefix:
+    m = g.regex.match(s)
+    if m:
+      return s[m.end():]
+    return s
+  else:
+    m = g.regex.match(s[::-1])
+    if m:
+      return s[:len(s) - m.end()]
+    return s
+
+
+def _MatchPatternChar(pat, s, i):
+  """Whether a match of pat can start at s[i].  Like match_pattern_char() in
+  bash, which only lets a pattern starting with * match at the end."""
+  c = pat[:1]
+  if i == len(s):
+    return c == '*'
+  if c == '\\':
+    return s[i] == pat[1:2]
+  if c in ('?', '*', '['):
+    return True
+  if c in ('+', '!', '@'):
+    return pat[1:2] == '(' or s[i] == c
+  return s[i] == c
+
+
+def _LongestMatch(s, pos, pat, matches):
+  """Find the first position at or after pos where pat matches, and the
+  longest match there.  matches(start, end) tests s[start:end].
+
+  Returns:
+    (start, end), or None
+  """
   n = len(s)
-  if op.op_id == Id.VOp1_Pound:  # shortest prefix
-    # 'abcd': match 'a', 'ab', 'abc', ...
-    for i in xrange(1, n+1):
-      #log('Matching pattern %r with %r', arg, s[:i])
-      if libc.fnmatch(arg, s[:i]):
-        return s[i:]
-    else:
-      return s
+  for start in xrange(pos, n+1):
+    if not _MatchPatternChar(pat, s, start):
+      continue
+    for end in xrange(n, start-1, -1):
+      if matches(start, end):
+        return start, end
+  return None
 
-  elif op.op_id == Id.VOp1_DPound:  # longest prefix
-    # 'abcd': match 'abc', 'ab', 'a'
-    for i in xrange(n, 0, -1):
-      #log('Matching pattern %r with %r', arg, s[:i])
-      if libc.fnmatch(arg, s[:i]):
-        return s[i:]
-    else:
-      return s
 
-  elif op.op_id == Id.VOp1_Percent:  # shortest suffix
-    # 'abcd': match 'abc', 'ab', 'a'
-    for i in xrange(n-1, -1, -1):
-      #log('Matching pattern %r with %r', arg, s[:i])
-      if libc.fnmatch(arg, s[i:]):
-        return s[:i]
-    else:
-      return s
-    
-  elif op.op_id == Id.VOp1_DPercent:  # longest suffix
-    # 'abcd': match 'abc', 'bc', 'c', ...
-    for i in xrange(0, n):
-      #log('Matching pattern %r with %r', arg, s[:i])
-      if libc.fnmatch(arg, s[i:]):
-        return s[:i]
-    else:
-      return s
+def _ExtGlobPatSub(s, op, pat, replace_str, matches):
+  """PatSub for extended globs, with bash's longest match semantics."""
+  n = len(s)
+  if op.do_prefix:
+    if _MatchPatternChar(pat, s, 0):
+      for end in xrange(n, -1, -1):
+        if matches(0, end):
+          return replace_str + s[end:]
+    return s
+
+  if op.do_suffix:
+    for start in xrange(0, n+1):
+      if matches(start, n):
+        return s[:start] + replace_str
+    return s
+
+  out = []
+  pos = 0
+  while True:
+    m = _LongestMatch(s, pos, pat, matches)
+    if m is None:
+      break
+    start, end = m
+    out.append(s[pos:start])
+    out.append(replace_str)
+    if start == end and end < n:  # copy a char so we make progress
+      out.append(s[end])
+      end += 1
+    pos = end
+    if not op.do_all or pos >= n:
+      break
+  out.append(s[pos:])
+  return ''.join(out)
 
 
 def PatSub(s, op, pat, replace_str):
   """Helper for ${x/pat/replace}."""
   #log('PAT %r REPLACE %r', pat, replace_str)
-  py_regex, err = glob_.GlobToPythonRegex(pat)
-  if err:
-    e_die("Can't convert glob to regex: %r", pat)
-
-  if py_regex is None:  # Simple/fast path for fixed strings
+  g = glob_.CompileGlob(pat)
+  if g is None:
+    # e.g. !(foo)
+    return _ExtGlobPatSub(
+        s, op, pat, replace_str,
+        lambda start, end: libc.fnmatch(pat, s[start:end]) == 1)
+
+  if g.literal is not None:  # Simple/fast path for fixed strings
+    pat = g.literal
     if op.do_all:
       return s.replace(pat, replace_str)
     elif op.do_prefix:
@@ -146,15 +224,25 @@ def PatSub(s, op, pat, replace_str):
     else:
       return s.replace(pat, replace_str, 1)  # just the first one
 
+  elif g.has_extglob:
+    full = g.full
+    return _ExtGlobPatSub(
+        s, op, pat, replace_str,
+        lambda start, end: full.match(s, start, end) is not None)
+
   else:
-    count = 1  # replace first occurrence only
-    if op.do_all:
-      count = 0  # replace all
-    elif op.do_prefix:
-      py_regex = '^' + py_regex
-    elif op.do_suffix:
-      py_regex = py_regex + '$'
+    if op.do_prefix:
+      m = g.regex.match(s)
+      if m:
+        return replace_str + s[m.end():]
+      return s
 
-    pat_re = re.compile(py_regex)
-    return pat_re.sub(replace_str, s, count)
+    if op.do_suffix:
+      m = g.full.search(s)
+      if m:
+        return s[:m.start()] + replace_str
+      return s
 
+    count = 0 if op.do_all else 1  # 0 means replace all
+    # A function, so backslashes in replace_str aren't interpreted.
+    return g.regex.sub(lambda m: replace_str, s, count)
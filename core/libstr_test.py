@@ -5,6 +5,9 @@ libstr_test.py: Tests for libstr.py
 
 import unittest
 
+from core.id_kind import Id
+from osh import ast_ as ast
+
 from core import libstr  # module under test
 
 
@@ -37,6 +40,61 @@ class LibStrTest(unittest.TestCase):
       print '%d test %06r return %06r' % (i, s[i:], s[:i])
     print
 
+  def testUnarySuffixOp(self):
+    CASES = [
+        ('abcabc', Id.VOp1_Pound, '*b', 'cabc'),
+        ('abcabc', Id.VOp1_DPound, '*b', 'c'),
+        ('abcabc', Id.VOp1_Percent, 'b*', 'abca'),
+        ('abcabc', Id.VOp1_DPercent, 'b*', 'a'),
+        ('abcabc', Id.VOp1_Pound, '*', 'abcabc'),  # empty prefix
+        ('abcabc', Id.VOp1_DPound, '*', ''),
+        ('foo.tar.gz', Id.VOp1_Percent, '.[a-z]*', 'foo.tar'),
+        ('foo.tar.gz', Id.VOp1_DPercent, '.[a-z]*', 'foo'),
+        ('abc', Id.VOp1_Pound, 'x*', 'abc'),  # no match
+        ('a-b', Id.VOp1_Pound, r'a\-', 'b'),  # escaped constant
+        # extended globs
+        ('foobarbar', Id.VOp1_Pound, '@(foo|foobar)', 'barbar'),
+        ('foobarbar', Id.VOp1_DPound, '@(foo|foobar)', 'bar'),
+        ('foobarbar', Id.VOp1_Percent, '+(bar)', 'foobar'),
+        ('foobarbar', Id.VOp1_DPercent, '+(bar)', 'foo'),
+    ]
+    for s, op_id, arg, expected in CASES:
+      op = ast.StringUnary(op_id, None)
+      self.assertEqual(expected, libstr.DoUnarySuffixOp(s, op, arg),
+                       (s, op_id, arg))
+
+  def testPatSub(self):
+    CASES = [
+        # s, pat, replace, do_all, do_prefix, do_suffix, expected
+        ('aXbXc', 'X', '-', False, False, False, 'a-bXc'),
+        ('aXbXc', 'X', '-', True, False, False, 'a-b-c'),
+        ('aXbXc', '[A-Z]', '-', True, False, False, 'a-b-c'),
+        ('aXbXc', 'X*', '-', False, False, False, 'a-'),
+        ('aXbXc', 'a?', '-', False, True, False, '-bXc'),
+        ('aXbXc', '?c', '-', False, False, True, 'aXb-'),
+        ('aXbXc', 'X?', '-', False, True, False, 'aXbXc'),
+        ('aXbXc', 'X', r'\1', True, False, False, r'a\1b\1c'),
+
+        # Extended globs use the longest match, like bash
+        ('bbbb', '?(b|bb)', 'X', False, False, False, 'Xbb'),
+        ('aabab', '@(a|ab)', 'X', True, False, False, 'XXX'),
+        ('abcabc', '@(a|ab)', 'X', False, True, False, 'Xcabc'),
+        ('abcbc', '@(c|bc)', 'X', False, False, True, 'abcX'),
+        ('', '?(b|bb)', 'X', False, False, False, ''),
+        ('', '?(b)', 'X', False, False, True, 'X'),
+        ('abc', '?(z)', 'X', True, False, False, 'XaXbXc'),
+        ('xaay', '*(a)', '-', True, False, False, '-x--y'),
+
+        # !(...) isn't a regex, so it uses fnmatch()
+        ('abc', '!(a)', 'X', True, False, False, 'X'),
+        ('abc', '!(a)', 'X', False, True, False, 'X'),
+        ('abc', '!(b)', 'X', False, False, False, 'X'),
+    ]
+    for s, pat, replace, do_all, do_prefix, do_suffix, expected in CASES:
+      op = ast.PatSub(None, None, do_all, do_prefix, do_suffix)
+      self.assertEqual(expected, libstr.PatSub(s, op, pat, replace),
+                       (s, pat, replace))
+
 
 if __name__ == '__main__':
   unittest.main()
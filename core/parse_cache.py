@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+parse_cache.py - Cache the LST of sourced files on disk, like .pyc files.
+
+A cache file holds an ast.arena encoded with OHeap v2: the lines of the file, its
+line spans, and the LST.  Span and line IDs are stored relative to the start
+of the file, and shifted when the file is loaded into the current arena.
+
+Cache files are named by a hash of the file contents, the schema, the Oil
+version, and the parser's source code, so they never need to be invalidated.
+Like a .pyc magic number, a fix to the lexer or parser starts a new cache.
+"""
+
+import cStringIO
+import errno
+import hashlib
+import os
+import struct
+
+from asdl import const
+from asdl import decode
+from asdl import encode
+from asdl import py_meta
+from core import braces
+from core import id_kind
+from core import lexer
+from core import tdop
+from core import util
+from core import word
+from osh import arith_parse
+from osh import ast_ as ast
+from osh import bool_parse
+from osh import cmd_parse
+from osh import lex
+from osh import parse_lib
+from osh import word_parse
+
+_SUFFIX = '.ohp'
+
+
+def DefaultDir(environ):
+  """Return the cache directory, or None if there's no home directory."""
+  base = environ.get('XDG_CACHE_HOME')
+  if not base:
+    home = environ.get('HOME')
+    if not home:
+      return None
+    base = os.path.join(home, '.cache')
+  return os.path.join(base, 'oil', 'parse')
+
+
+# Modules whose code determines the LST for a given file.
+_PARSER_MODULES = [
+    lexer, lex, tdop, arith_parse, bool_parse, word_parse, cmd_parse,
+    parse_lib, braces, word,
+]
+
+
+def _HashParserSource(h):
+  """Add the Oil version and the parser's source code to the hash h.
+
+  In the release binary, the modules are in a zip file, so only the version
+  is used.
+  """
+  try:
+    with util.GetResourceLoader().open('oil-version.txt') as f:
+      h.update(f.readline())
+  except IOError:
+    pass
+
+  for mod in _PARSER_MODULES:
+    path = mod.__file__
+    if path.endswith('.pyc'):
+      path = path[:-1]  # the source, which doesn't have a timestamp
+    try:
+      with open(path) as f:
+        h.update(f.read())
+    except IOError:
+      pass
+
+
+def _ShiftSpanIds(node, delta, seen):
+  """Add delta to every span ID in the LST.
+
+  Args:
+    seen: set of visited object IDs, since the parser may share tokens
+  """
+  if id(node) in seen:
+    return
+  seen.add(id(node))
+
+  for name in node.__slots__:
+    val = getattr(node, name)
+    if name == 'span_id':
+      if val != const.NO_INTEGER:
+        node.span_id = val + delta
+    elif name == 'spids':
+      node.spids = [
+          s if s == const.NO_INTEGER else s + delta for s in val]
+    elif isinstance(val, list):
+      for item in val:
+        if isinstance(item, py_meta.CompoundObj):
+          _ShiftSpanIds(item, delta, seen)
+    elif isinstance(val, py_meta.CompoundObj):
+      _ShiftSpanIds(val, delta, seen)
+
+
+class ParseCache(object):
+  """Loads and saves parsed files in a directory."""
+
+  def __init__(self, cache_dir):
+    self.cache_dir = cache_dir
+    self.fingerprint = None  # computed lazily
+    self.class_lookup = None
+
+    # For --parse-cache-stats
+    self.hits = 0
+    self.misses = 0
+    self.not_saved = 0
+
+  def _CachePath(self, contents):
+    if self.fingerprint is None:
+      # Invalidate everything if the schema or the Id numbering changes.
+      h = hashlib.sha1(repr(ast.asdl_module))
+      h.update(repr(sorted(id_kind._ID_NAMES.items())))
+      _HashParserSource(h)
+      self.fingerprint = h.digest()
+
+    h = hashlib.sha1(self.fingerprint)
+    h.update(contents)
+    return os.path.join(self.cache_dir, h.hexdigest() + _SUFFIX)
+
+  def Load(self, contents, arena):
+    """Add the lines and spans of a cached file to the arena.
+
+    Args:
+      contents: the contents of the file being sourced
+      arena: Arena, after PushSource() is called
+
+    Returns:
+      The LST, or None if it isn't in the cache.
+    """
+    path = self._CachePath(contents)
+    try:
+      with open(path) as f:
+        buf = f.read()
+    except IOError:
+      self.misses += 1
+      return None
+
+    if self.class_lookup is None:
+      self.class_lookup = decode.MakeClassLookup(ast)
+    try:
+      a = decode.DecodeRoot(buf, ast.arena.ASDL_TYPE, self.class_lookup,
+                            id_kind.IdInstance)
+    except (decode.DecodeError, IndexError, KeyError, TypeError, ValueError,
+            struct.error):
+      # Corrupt or truncated file.  Remove it so it's written again.
+      self.misses += 1
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      return None
+
+    base_line = arena.SaveMark()[0]
+    for i, line in enumerate(a.lines):
+      arena.AddLine(line, i + 1)  # physical line numbers start from 1
+
+    base_span = arena.NumSpans()
+    for span in a.spans:
+      arena.AddSpan(base_line + span.line_id, span.col, span.length)
+
+    _ShiftSpanIds(a.root, base_span, set())
+    self.hits += 1
+    return a.root
+
+  def Save(self, contents, arena, mark, node):
+    """Write a file that was just parsed to the cache.
+
+    Args:
+      contents: the contents of the file
+      arena: Arena the file was parsed into
+      mark: arena.SaveMark() from before it was parsed
+      node: the LST
+    """
+    if b'\0' in contents:  # OHeap strings are NUL-terminated
+      self.not_saved += 1
+      return
+
+    base_line, base_span = mark
+    lines = arena.lines[base_line:]
+    spans = []
+    for span_id in xrange(base_span, arena.NumSpans()):
+      span = arena.GetLineSpan(span_id)
+      span.line_id -= base_line
+      spans.append(span)
+
+    # Temporarily make span IDs relative to the file.
+    _ShiftSpanIds(node, -base_span, set())
+    f = cStringIO.StringIO()
+    try:
+      encode.EncodeRoot(ast.arena(lines, spans, node),
+                        encode.Params(version=2), encode.BinOutput(f))
+    except encode.EncodeError:
+      self.not_saved += 1
+      return
+    finally:
+      _ShiftSpanIds(node, base_span, set())
+
+    path = self._CachePath(contents)
+    tmp_path = '%s.%d' % (path, os.getpid())
+    try:
+      try:
+        os.makedirs(self.cache_dir)
+      except OSError as e:
+        if e.errno != errno.EEXIST:
+          raise
+      with open(tmp_path, 'w') as out:
+        out.write(f.getvalue())
+      os.rename(tmp_path, path)  # atomic, in case of concurrent shells
+    except (IOError, OSError):
+      self.not_saved += 1
+
+  def Stats(self):
+    total = self.hits + self.misses
+    rate = 100.0 * self.hits / total if total else 0.0
+    return '%d hits, %d misses (%.1f%% hit rate), %d not saved' % (
+        self.hits, self.misses, rate, self.not_saved)
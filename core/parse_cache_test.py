@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+parse_cache_test.py: Tests for parse_cache.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from core import alloc
+from core import reader
+from core import parse_cache  # module under test
+from osh import parse_lib
+
+
+def _Parse(contents, arena):
+  line_reader = reader.StringLineReader(contents, arena)
+  _, c_parser = parse_lib.MakeParser(line_reader, arena)
+  return c_parser.ParseWholeFile()
+
+
+class ParseCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.cache_dir)
+
+  def testDefaultDir(self):
+    self.assertEqual('/c/oil/parse',
+                     parse_cache.DefaultDir({'XDG_CACHE_HOME': '/c'}))
+    self.assertEqual('/h/.cache/oil/parse',
+                     parse_cache.DefaultDir({'HOME': '/h'}))
+    self.assertEqual(None, parse_cache.DefaultDir({}))
+
+  def testSaveAndLoad(self):
+    contents = 'echo hi\nf() {\n  echo $1\n}\n'
+    cache = parse_cache.ParseCache(self.cache_dir)
+
+    arena = alloc.Pool().NewArena()
+    arena.PushSource('main.sh')
+    _Parse('echo before\n', arena)  # so IDs don't start at zero
+
+    arena.PushSource('lib.sh')
+    self.assertEqual(None, cache.Load(contents, arena))
+    mark = arena.SaveMark()
+    node = _Parse(contents, arena)
+    expected = repr(node)
+    cache.Save(contents, arena, mark, node)
+    self.assertEqual(expected, repr(node))  # span IDs restored
+    self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+    # Load into an arena where the file starts at different IDs.
+    arena2 = alloc.Pool().NewArena()
+    arena2.PushSource('lib.sh')
+    node2 = cache.Load(contents, arena2)
+    self.assertEqual(1, cache.hits)
+    self.assertEqual(1, cache.misses)
+
+    # The first token, 'echo', has the first span in the new arena.
+    span_id = node2.children[0].words[0].parts[0].token.span_id
+    self.assertEqual(0, span_id)
+    span = arena2.GetLineSpan(span_id)
+    line = arena2.GetLine(span.line_id)
+    self.assertEqual('echo', line[span.col : span.col + span.length])
+    self.assertEqual(('lib.sh', 1), arena2.GetDebugInfo(span.line_id))
+
+    # Every span ID maps to the same text as in the original arena.
+    old_id = node.children[1].body.children[0].words[1].parts[0].token.span_id
+    new_id = node2.children[1].body.children[0].words[1].parts[0].token.span_id
+    self.assertEqual(arena.GetLineSpan(old_id).col,
+                     arena2.GetLineSpan(new_id).col)
+    self.assertEqual(('lib.sh', 3),
+                     arena2.GetDebugInfo(arena2.GetLineSpan(new_id).line_id))
+
+  def testParserSourceInFingerprint(self):
+    class FakeModule(object):
+      __file__ = os.path.join(self.cache_dir, 'fake_parse.pyc')
+
+    with open(FakeModule.__file__[:-1], 'w') as f:
+      f.write('# version 1\n')
+    orig = parse_cache._PARSER_MODULES
+    parse_cache._PARSER_MODULES = orig + [FakeModule]
+    try:
+      path1 = parse_cache.ParseCache(self.cache_dir)._CachePath('echo hi')
+      with open(FakeModule.__file__[:-1], 'w') as f:
+        f.write('# version 2\n')  # e.g. a parser fix
+      path2 = parse_cache.ParseCache(self.cache_dir)._CachePath('echo hi')
+    finally:
+      parse_cache._PARSER_MODULES = orig
+    self.assertNotEqual(path1, path2)
+
+  def testTruncatedFile(self):
+    contents = 'echo hi\nf() {\n  echo $1\n}\n'
+    cache = parse_cache.ParseCache(self.cache_dir)
+
+    arena = alloc.Pool().NewArena()
+    arena.PushSource('lib.sh')
+    mark = arena.SaveMark()
+    cache.Save(contents, arena, mark, _Parse(contents, arena))
+    path = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+    with open(path) as f:
+      buf = f.read()
+
+    for n in (0, 5, 9, 20, 60, len(buf) // 2, len(buf) - 1):
+      with open(path, 'w') as f:
+        f.write(buf[:n])
+      arena2 = alloc.Pool().NewArena()
+      arena2.PushSource('lib.sh')
+      self.assertEqual(None, cache.Load(contents, arena2), n)
+      self.assertEqual([], os.listdir(self.cache_dir))  # removed
+
+  def testNotSaved(self):
+    # The cache dir can't be created under a regular file.
+    path = os.path.join(self.cache_dir, 'file')
+    with open(path, 'w') as f:
+      f.write('x')
+    cache = parse_cache.ParseCache(os.path.join(path, 'parse'))
+
+    arena = alloc.Pool().NewArena()
+    arena.PushSource('lib.sh')
+    contents = 'echo hi\n'
+    mark = arena.SaveMark()
+    node = _Parse(contents, arena)
+    cache.Save(contents, arena, mark, node)
+    self.assertEqual(1, cache.not_saved)
+    self.assertEqual(['file'], os.listdir(self.cache_dir))
+
+if __name__ == '__main__':
+  unittest.main()
@@ -13,17 +13,87 @@ descriptors.
 
 import errno
 import fcntl
+import io
 import os
 import sys
+import tempfile
 
 from core import runtime
 from core import util
 from core.id_kind import Id, REDIR_DEFAULT_FD
 
+try:
+  import spawn
+except ImportError:
+  spawn = None  # fall back to fork() + exec()
+
 redirect_e = runtime.redirect_e
 e_die = util.e_die
 log = util.log
 
+# Here docs up to this size are written straight into a pipe, which can't
+# block.  dash uses the same size.
+_PIPE_SIZE = 4096
+
+# Command sub output is read with this size at first, which doubles while reads
+# fill it.
+_MIN_READ = 4096
+_MAX_READ = 1 << 20
+
+
+class OutputReader(object):
+  """Reads all the output of a command sub.
+
+  Small outputs take one small read, and big ones take few system calls.  The
+  buffer is reused by later command subs, unless it grew past _MAX_READ.
+  """
+
+  def __init__(self, limit=0):
+    """
+    Args:
+      limit: the maximum number of bytes, or 0 for no limit
+    """
+    self.limit = limit
+    self.buf = bytearray(_MIN_READ)
+
+  def ReadAll(self, fd):
+    """Read until EOF, and remove trailing newlines like $() does.
+
+    Returns:
+      A string, or None if there were more than 'limit' bytes.  In that case
+      the descriptor isn't at EOF.
+    """
+    f = io.FileIO(fd, closefd=False)
+    buf = self.buf
+    limit = self.limit
+    n = 0
+    read_size = _MIN_READ
+
+    while True:
+      if n + read_size > len(buf):
+        buf.extend(bytearray(n + read_size - len(buf)))
+      num_read = f.readinto(memoryview(buf)[n : n + read_size])
+      if not num_read:
+        break
+      n += num_read
+      if limit and n > limit:
+        n = -1
+        break
+      if num_read == read_size and read_size < _MAX_READ:
+        read_size *= 2
+
+    if len(buf) > _MAX_READ:
+      self.buf = bytearray(_MIN_READ)  # don't hold on to a big buffer
+    if n == -1:
+      return None
+
+    # Strip without copying the output first.
+    end = n
+    newline = ord('\n')
+    while end and buf[end - 1] == newline:
+      end -= 1
+    return memoryview(buf)[:end].tobytes()
+
 
 class _FdFrame:
   def __init__(self):
@@ -41,6 +111,23 @@ class _FdFrame:
     return '<_FdFrame %s %s>' % (self.saved, self.need_close)
 
 
+_STDOUT_BUFSIZE = 1 << 16
+
+
+def BufferStdout():
+  """Replace sys.stdout with a fully buffered file on fd 1.
+
+  The original may be unbuffered, e.g. with PYTHONUNBUFFERED, and then every
+  write() by a builtin is a system call.  See FdState for when it's flushed.
+  """
+  try:
+    f = os.fdopen(1, 'w', _STDOUT_BUFSIZE)
+  except OSError:  # e.g. osh >&-
+    return
+  sys.stdout.flush()
+  sys.stdout = f
+
+
 class FdState:
   """This is for the current process, as opposed to child processes.
 
@@ -51,6 +138,11 @@ class FdState:
     self.cur_frame = _FdFrame()  # for the top level
     self.stack = [self.cur_frame]
 
+    # Builtins write to sys.stdout without flushing, so output to a file or
+    # pipe goes out in big chunks.  It's flushed whenever fd 1 changes, before
+    # fork() and exec(), and after every builtin if fd 1 is a terminal.
+    self.stdout_is_tty = os.isatty(1)
+
   def Open(self, path):
     """Opens a path for read, but moves it out of the reserved 3-9 fd range.
 
@@ -104,6 +196,8 @@ class FdState:
     if need_restore:
       self.cur_frame.saved.append((self.next_fd, fd2))
     self.next_fd += 1
+    if fd2 == 1:
+      self.stdout_is_tty = os.isatty(1)
     return True
 
   def _PushClose(self, fd):
@@ -112,6 +206,37 @@ class FdState:
   def _PushWait(self, proc, waiter):
     self.cur_frame.need_wait.append((proc, waiter))
 
+  def _HereDocFd(self, body):
+    """Return a descriptor to read a here doc from, without a process.
+
+    Small bodies are written into a pipe.  Bigger ones are written to an
+    anonymous temp file, which is rewound.
+
+    Returns:
+      The descriptor, or -1 if the temp file can't be written.  The caller
+      should then start a _HereDocWriterThunk.
+    """
+    if len(body) <= _PIPE_SIZE:
+      read_fd, write_fd = os.pipe()
+      os.write(write_fd, body)
+      os.close(write_fd)
+      return read_fd
+
+    try:
+      fd, path = tempfile.mkstemp(prefix='osh-here-')
+    except (IOError, OSError):
+      return -1
+    try:
+      os.unlink(path)
+      n = 0
+      while n < len(body):
+        n += os.write(fd, body[n:])
+      os.lseek(fd, 0, os.SEEK_SET)
+    except OSError:  # e.g. ENOSPC
+      os.close(fd)
+      return -1
+    return fd
+
   def _ApplyRedirect(self, r, waiter):
     ok = True
 
@@ -159,23 +284,27 @@ class FdState:
 
     elif r.tag == redirect_e.HereRedirect:
       # NOTE: Do these descriptors have to be moved out of the range 0-9?
-      read_fd, write_fd = os.pipe()
-
-      if not self._PushDup(read_fd, r.fd):  # stdin is now the pipe
-        ok = False
+      fd = self._HereDocFd(r.body)
+      if fd != -1:
+        if fd == r.fd:  # e.g. the pipe can be 3 in 3<<EOF
+          new_fd = os.dup(fd)
+          os.close(fd)
+          fd = new_fd
+        if not self._PushDup(fd, r.fd):  # stdin is now the pipe or file
+          ok = False
+        os.close(fd)  # like the filename case above
 
-      # We can't close like we do in the filename case above?  The writer can
-      # get a "broken pipe".
-      self._PushClose(read_fd)
+      else:  # Fall back on a process that writes to a pipe.
+        read_fd, write_fd = os.pipe()
 
-      thunk = _HereDocWriterThunk(write_fd, r.body)
+        if not self._PushDup(read_fd, r.fd):  # stdin is now the pipe
+          ok = False
 
-      # TODO: Use PIPE_SIZE to save a process in the case of small here docs,
-      # which are the common case.  (dash does this.)
-      start_process = True
-      #start_process = False
+        # We can't close like we do in the filename case above?  The writer
+        # can get a "broken pipe".
+        self._PushClose(read_fd)
 
-      if start_process:
+        thunk = _HereDocWriterThunk(write_fd, r.body)
         here_proc = Process(thunk)
 
         # NOTE: we could close the read pipe here, but it doesn't really
@@ -190,10 +319,6 @@ class FdState:
         # Now that we've started the child, close it in the parent.
         os.close(write_fd)
 
-      else:
-        os.write(write_fd, r.body)
-        os.close(write_fd)
-
     return ok
 
   def Push(self, redirects, waiter):
@@ -202,20 +327,82 @@ class FdState:
     self.stack.append(new_frame)
     self.cur_frame = new_frame
 
-    ok = True
+    if redirects:
+      sys.stdout.flush()  # written before the redirect
     for r in redirects:
       #log('apply %s', r)
       if not self._ApplyRedirect(r, waiter):
-        return False  # for bad descriptor
+        # e.g. bad descriptor.  Undo the redirects that were applied, so the
+        # caller doesn't have to Pop(), and an enclosing frame like the one
+        # from PushStdoutCapture() is still on top.
+        self.Pop()
+        return False
     #log('done applying %d redirects', len(redirects))
     return True
 
+  def PushStdoutCapture(self):
+    """Redirect stdout to a buffer, for a command sub in this process.
+
+    The buffer is an anonymous temp file, so a big output can't block like a
+    pipe would.
+
+    Returns:
+      The descriptor to pass to PopStdoutCapture(), or -1 on error.
+    """
+    try:
+      fd, path = tempfile.mkstemp(prefix='osh-comsub-')
+      os.unlink(path)
+    except (IOError, OSError):
+      return -1
+
+    # Like Open(), move it out of the 0-9 range.  It's released in
+    # PopStdoutCapture(), so next_fd counts down in the right order.
+    capture_fd = self.next_fd
+    os.dup2(fd, capture_fd)
+    os.close(fd)
+    fcntl.fcntl(capture_fd, fcntl.F_SETFD, fcntl.FD_CLOEXEC)
+    self.next_fd += 1
+
+    sys.stdout.flush()
+    new_frame = _FdFrame()
+    self.stack.append(new_frame)
+    self.cur_frame = new_frame
+    if not self._PushDup(capture_fd, 1):
+      self.Pop()
+      os.close(capture_fd)
+      self.next_fd -= 1
+      return -1
+    return capture_fd
+
+  def PopStdoutCapture(self, capture_fd, reader):
+    """Restore stdout, and return what was written to it.
+
+    Args:
+      reader: OutputReader
+
+    Returns:
+      The output, or None if it's over the reader's limit.
+    """
+    sys.stdout.flush()
+    self.Pop()
+
+    os.lseek(capture_fd, 0, os.SEEK_SET)
+    try:
+      return reader.ReadAll(capture_fd)
+    finally:
+      os.close(capture_fd)
+      self.next_fd -= 1
+
   def MakePermanent(self):
     self.cur_frame.Forget()
 
   def Pop(self):
     frame = self.stack.pop()
     #log('< Pop %s', frame)
+    if frame.saved or frame.need_close:
+      sys.stdout.flush()  # written under the redirect
+
+    restored_stdout = False
     for saved, orig in reversed(frame.saved):
       try:
         os.dup2(saved, orig)
@@ -227,6 +414,10 @@ class FdState:
       os.close(saved)
       #log('dup2 %s %s', saved, orig)
       self.next_fd -= 1  # Count down
+      if orig == 1:
+        restored_stdout = True
+    if restored_stdout:
+      self.stdout_is_tty = os.isatty(1)
 
     for fd in frame.need_close:
       #log('Close %d', fd)
@@ -246,6 +437,10 @@ class ChildStateChange:
   def Apply(self):
     raise NotImplementedError
 
+  def FileActions(self):
+    """Return the same changes as (op, fd1, fd2) tuples for spawn.spawn()."""
+    raise NotImplementedError
+
 
 class StdinFromPipe(ChildStateChange):
   def __init__(self, pipe_read_fd, w):
@@ -262,6 +457,13 @@ class StdinFromPipe(ChildStateChange):
     os.close(self.w)  # we're reading from the pipe, not writing
     #log('child CLOSE w %d pid=%d', self.w, os.getpid())
 
+  def FileActions(self):
+    return [
+        (spawn.FILE_ACTION_DUP2, self.r, 0),
+        (spawn.FILE_ACTION_CLOSE, self.r, -1),
+        (spawn.FILE_ACTION_CLOSE, self.w, -1),
+    ]
+
 
 class StdoutToPipe(ChildStateChange):
   def __init__(self, r, pipe_write_fd):
@@ -278,6 +480,13 @@ class StdoutToPipe(ChildStateChange):
     os.close(self.r)  # we're writing to the pipe, not reading
     #log('child CLOSE r %d pid=%d', self.r, os.getpid())
 
+  def FileActions(self):
+    return [
+        (spawn.FILE_ACTION_DUP2, self.w, 1),
+        (spawn.FILE_ACTION_CLOSE, self.w, -1),
+        (spawn.FILE_ACTION_CLOSE, self.r, -1),
+    ]
+
 
 class Thunk(object):
   """Abstract base class for things runnable in another process."""
@@ -287,15 +496,32 @@ class Thunk(object):
     raise NotImplementedError
 
 
-def ExecExternalProgram(argv, environ):
-  """
+def ExecExternalProgram(argv0_path, argv, environ):
+  """Execute a program, replacing the current process.
+
+  Args:
+    argv0_path: The path to execute, already resolved against $PATH by
+      state.SearchPath.  This saves a failed execve() for every $PATH entry.
+    argv: argv array.
+    environ: dict of environment variables.
   """
+  # Builtins that ran earlier in this process may have buffered output, e.g.
+  # for $(echo -n prefix; basename x).  execve() would discard it.
+  sys.stdout.flush()
+
   # TODO: If there is an error, like the file isn't executable, then we should
   # exit, and the parent will reap it.  Should it capture stderr?
   try:
-    os.execvpe(argv[0], argv, environ)
+    os.execve(argv0_path, argv, environ)
   except OSError as e:
-    log('Unexpected error in execvpe(%r, %r, ...): %s', argv[0], argv, e)
+    if e.errno == errno.ENOENT and '/' not in argv[0]:
+      # The hashed path is stale, e.g. the file was removed.  Search $PATH
+      # again.
+      try:
+        os.execvpe(argv[0], argv, environ)
+      except OSError as e:
+        pass
+    log('Unexpected error in execve(%r, %r, ...): %s', argv0_path, argv, e)
     # Command not found means 127.  TODO: Are there other cases?
     sys.exit(127)
   # no return
@@ -304,7 +530,8 @@ def ExecExternalProgram(argv, environ):
 class ExternalThunk:
   """An external executable."""
 
-  def __init__(self, argv, environ):
+  def __init__(self, argv0_path, argv, environ):
+    self.argv0_path = argv0_path
     self.argv = argv
     self.environ = environ
 
@@ -312,7 +539,25 @@ class ExternalThunk:
     """
     An ExternalThunk is run in parent for the exec builtin.
     """
-    ExecExternalProgram(self.argv, self.environ)
+    ExecExternalProgram(self.argv0_path, self.argv, self.environ)
+
+  def Spawn(self, state_changes):
+    """Start the program without fork(), with posix_spawn().
+
+    The child doesn't run any Python code, so state changes are translated to
+    file actions.
+
+    Returns:
+      The PID of the child.
+
+    Raises:
+      OSError if posix_spawn() fails, e.g. because the hashed path is stale.
+      The caller can then fork() as usual, which reports the error.
+    """
+    actions = []
+    for st in state_changes:
+      actions.extend(st.FileActions())
+    return spawn.spawn(self.argv0_path, self.argv, self.environ, actions)
 
 
 class SubProgramThunk:
@@ -416,6 +661,20 @@ class Process(Job):
 
   def Start(self):
     """Start this process with fork(), haandling redirects."""
+    # Otherwise the child would write the parent's buffered output too, or
+    # write its own output before it.
+    sys.stdout.flush()
+    if spawn and isinstance(self.thunk, ExternalThunk):
+      # Fast path: posix_spawn() doesn't copy the shell's page tables.
+      # Redirects were already applied in the parent by FdState.
+      try:
+        pid = self.thunk.Spawn(self.state_changes)
+      except OSError as e:
+        pass  # fall back to fork(), which reports the error
+      else:
+        self.pid = pid
+        return pid
+
     pid = os.fork()
     if pid < 0:
       # When does this happen?
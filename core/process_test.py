@@ -5,6 +5,7 @@ process_test.py: Tests for process.py
 
 import os
 import sys
+import tempfile
 import unittest
 
 from core.id_kind import Id
@@ -31,7 +32,7 @@ _WAITER = process.Waiter()
 
 
 def _ExtProc(argv):
-  return Process(ExternalThunk(argv, {}))
+  return Process(ExternalThunk(argv[0], argv, {}))
 
 
 class ProcessTest(unittest.TestCase):
@@ -62,6 +63,67 @@ class ProcessTest(unittest.TestCase):
     self.assertEqual('one\n', line1)
     self.assertEqual('one\n', line2)
 
+  def testHereDoc(self):
+    waiter = process.Waiter()
+    fd_state = process.FdState()
+
+    # Small bodies go in a pipe, and big ones in a temp file.  Neither needs a
+    # process.
+    for body in ['one\ntwo\n', 'x' * 10000 + '\n']:
+      r = runtime.HereRedirect(0, body)
+      fd_state.Push([r], waiter)
+      self.assertEqual([], fd_state.cur_frame.need_wait)
+      contents = os.read(0, len(body) + 1)
+      fd_state.Pop()
+      self.assertEqual(body, contents)
+
+  def testStdoutCapture(self):
+    fd_state = process.FdState()
+    next_fd = fd_state.next_fd
+
+    fd = fd_state.PushStdoutCapture()
+    self.assertNotEqual(-1, fd)
+    os.write(1, 'unbuffered ')
+    sys.stdout.write('buffered\n')  # flushed by PopStdoutCapture()
+    reader = process.OutputReader()
+    self.assertEqual('unbuffered buffered',
+                     fd_state.PopStdoutCapture(fd, reader))
+    self.assertEqual(next_fd, fd_state.next_fd)
+
+  def testStdoutCaptureNested(self):
+    fd_state = process.FdState()
+    outer = fd_state.PushStdoutCapture()
+    self.assertEqual(False, fd_state.stdout_is_tty)
+    sys.stdout.write('outer')  # may be buffered
+
+    inner = fd_state.PushStdoutCapture()
+    sys.stdout.write('inner')
+
+    reader = process.OutputReader()
+    self.assertEqual('inner', fd_state.PopStdoutCapture(inner, reader))
+    self.assertEqual('outer', fd_state.PopStdoutCapture(outer, reader))
+    self.assertEqual(os.isatty(1), fd_state.stdout_is_tty)
+
+  def testOutputReader(self):
+    def _Read(reader, body):
+      f = tempfile.TemporaryFile()
+      f.write(body)
+      f.flush()
+      f.seek(0)
+      try:
+        return reader.ReadAll(f.fileno())
+      finally:
+        f.close()
+
+    reader = process.OutputReader()
+    # The last one takes reads of increasing size.
+    for body in ['', '\n\n', 'one\ntwo\n\n', 'x' * 3000000 + '\n']:
+      self.assertEqual(body.rstrip('\n'), _Read(reader, body))
+
+    reader = process.OutputReader(limit=10)
+    self.assertEqual(None, _Read(reader, '0123456789\n'))
+    self.assertEqual('012345678', _Read(reader, '012345678\n'))
+
   def testProcess(self):
 
     # 3 fds.  Does Python open it?  Shell seems to have it too.  Maybe it
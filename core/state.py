@@ -318,6 +318,141 @@ class DirStack(object):
     return reversed(self.stack)
 
 
+class SearchPath(object):
+  """For looking up external commands in $PATH.
+
+  This is the shell's command hash table, like bash's.  It's shared by the
+  Executor, the hash/type/command builtins, and completion.
+
+  The cache is invalidated whenever PATH is assigned, which we detect by
+  identity of the value object.  Every assignment creates a new runtime.Str.
+  """
+
+  def __init__(self, mem):
+    """
+    Args:
+      mem: for looking up PATH
+    """
+    self.mem = mem
+    self.path_val = None  # the value of PATH that the cache was built for
+    self.path_dirs = []
+
+    self.cache = {}  # command name -> full path
+    self.hits = {}  # command name -> number of times it was executed
+    # dir -> (mtime, list of names).  Used by completion.
+    self.listings = {}
+
+  def _CheckPath(self):
+    val = self.mem.GetVar('PATH')
+    if val is self.path_val:
+      return
+
+    self.path_val = val
+    if val.tag == value_e.Str:
+      self.path_dirs = val.s.split(':')
+    elif val.tag == value_e.Undef:
+      self.path_dirs = os.defpath.split(':')  # same default as execvp()
+    else:
+      self.path_dirs = []  # treat array as empty path
+    self.cache.clear()
+    self.hits.clear()
+
+  def _Search(self, name):
+    """Returns the first executable file named 'name' in $PATH, or None."""
+    for path_dir in self.path_dirs:
+      full_path = os.path.join(path_dir, name)
+      if os.path.isfile(full_path) and os.access(full_path, os.X_OK):
+        return full_path
+    return None
+
+  def Lookup(self, name):
+    """Find a command without remembering it.  For 'type' and 'command -v'.
+
+    Returns:
+      A path, or None if it's not found.
+    """
+    self._CheckPath()
+    full_path = self.cache.get(name)
+    if full_path is not None:
+      return full_path
+    return self._Search(name)
+
+  def Remember(self, name):
+    """Find a command and add it to the table.  For 'hash name'.
+
+    Returns:
+      A path, or None if it's not found.
+    """
+    self._CheckPath()
+    full_path = self.cache.get(name)
+    if full_path is None:
+      full_path = self._Search(name)
+      # A relative entry like '.' in PATH depends on the current directory.
+      if full_path is not None and full_path.startswith('/'):
+        self.cache[name] = full_path
+        self.hits[name] = 0
+    return full_path
+
+  def Resolve(self, argv0):
+    """Resolve argv[0] of an external command to the path to exec.
+
+    Returns:
+      A path, or None if it's not found.
+    """
+    if '/' in argv0:
+      return argv0  # no search
+    full_path = self.Remember(argv0)
+    if argv0 in self.hits:
+      self.hits[argv0] += 1
+    return full_path
+
+  def Set(self, name, full_path):
+    """For 'hash -p path name'."""
+    self._CheckPath()
+    self.cache[name] = full_path
+    self.hits[name] = 0
+
+  def Get(self, name):
+    """For 'hash -t name'.  Returns a remembered path, or None."""
+    self._CheckPath()
+    return self.cache.get(name)
+
+  def Clear(self):
+    """For 'hash -r'."""
+    self.cache.clear()
+    self.hits.clear()
+
+  def Items(self):
+    """For 'hash'.  Returns a sorted list of (name, full path, hits)."""
+    self._CheckPath()
+    return [(name, self.cache[name], self.hits[name])
+            for name in sorted(self.cache)]
+
+  def ListCommands(self):
+    """Yield all command names in $PATH.  For completion.
+
+    Directory listings are cached by (dir, mtime), so unchanged directories
+    aren't listed again.
+    """
+    self._CheckPath()
+    for path_dir in self.path_dirs:
+      try:
+        st = os.stat(path_dir)
+      except OSError as e:
+        # There could be a directory that doesn't exist in the $PATH.
+        continue
+      entry = self.listings.get(path_dir)
+      if entry is None or entry[0] != st.st_mtime:
+        try:
+          names = os.listdir(path_dir)
+        except OSError as e:
+          continue
+        entry = (st.st_mtime, names)
+        self.listings[path_dir] = entry
+      for name in entry[1]:
+        yield name
+
+
 def _FormatStack(var_stack):
   """Temporary debugging.
 
@@ -330,6 +465,10 @@ def _FormatStack(var_stack):
   return f.getvalue()
 
 
+# Computed by GetVar.  They shadow user variables of the same name.
+_SPECIAL_VAR_NAMES = frozenset(['FUNCNAME', 'LINENO', 'SOURCE_NAME'])
+
+
 class Mem(object):
   """For storing variables.
 
@@ -365,6 +504,19 @@ class Mem(object):
     # Done ONCE on initialization
     self.root_pid = os.getpid()
 
+    # Cache of exported variables passed to external commands, patched as
+    # variables change.  None means it has to be rebuilt.  See GetExported().
+    self.exported = None
+    self.num_exported_reused = 0  # stats for the cache
+    self.num_exported_built = 0
+
+    # Cache for scope_e.Dynamic lookups, which otherwise scan var_stack.
+    # name -> (cell or None, namespace, whether the frame is readonly)
+    # An entry is removed when a cell for that name is created or deleted, or
+    # its frame is popped.  Pushing a frame doesn't change any lookup because
+    # the new frame is empty.
+    self.dynamic_cache = {}
+
     self._InitDefaults()
     self._InitVarsFromEnv(environ)
     self.arena = arena
@@ -437,7 +589,9 @@ class Mem(object):
   def PopCall(self):
     self.func_name_stack.pop()
 
-    self.var_stack.pop()
+    frame = self.var_stack.pop()
+    self._EvictFrame(frame)
+    self._UpdateExportedFrame(frame)
     self.argv_stack.pop()
 
   def PushTemp(self):
@@ -446,9 +600,55 @@ class Mem(object):
     self.var_stack.append(_StackFrame(readonly=True))
 
   def PopTemp(self):
-    self.var_stack.pop()
+    frame = self.var_stack.pop()
+    self._EvictFrame(frame)
+    self._UpdateExportedFrame(frame)
     #util.log('**** PopTemp()')
 
+  def Snapshot(self):
+    """For command subs that run in this process instead of a child.
+
+    Returns:
+      An opaque value to pass to Restore().  Cells are copied because SetVar
+      mutates them, and so are arrays because of a[i]=x.
+    """
+    frames = []
+    for frame in self.var_stack:
+      vars_copy = {}
+      for name, cell in frame.vars.iteritems():
+        val = cell.val
+        if val is not None and val.tag == value_e.StrArray:
+          val = runtime.StrArray(list(val.strs))
+        vars_copy[name] = runtime.cell(val, cell.exported, cell.readonly)
+      frames.append((frame, vars_copy, frame.readonly))
+
+    arg_frames = [(frame, frame.argv, frame.num_shifted)
+                  for frame in self.argv_stack]
+    exported = None if self.exported is None else dict(self.exported)
+
+    return (frames, arg_frames, list(self.func_name_stack), self.last_status,
+            self.last_job_id, exported)
+
+  def Restore(self, snapshot):
+    """Undo all variable changes since Snapshot()."""
+    (frames, arg_frames, func_names, self.last_status, self.last_job_id,
+     self.exported) = snapshot
+
+    del self.var_stack[:]
+    for frame, vars_copy, readonly in frames:
+      frame.vars = vars_copy
+      frame.readonly = readonly
+      self.var_stack.append(frame)
+    self.dynamic_cache.clear()
+
+    del self.argv_stack[:]
+    for frame, argv, num_shifted in arg_frames:
+      frame.argv = argv
+      frame.num_shifted = num_shifted
+      self.argv_stack.append(frame)
+
+    self.func_name_stack[:] = func_names
+
   #
   # Argv
   #
@@ -523,16 +723,17 @@ class Mem(object):
       namespace: The namespace it should be set to or deleted from.
     """
     if lookup_mode == scope_e.Dynamic:
-      found = False
-      for i in range(len(self.var_stack) - 1, -1, -1):
-        frame = self.var_stack[i]
-        if frame.readonly and not is_read:
-          continue
-        namespace = frame.vars
-        if name in namespace:
-          cell = namespace[name]
-          return cell, namespace
-      return None, self.var_stack[0].vars  # set in global namespace
+      try:
+        cell, namespace, readonly = self.dynamic_cache[name]
+      except KeyError:
+        cell, namespace, readonly = self._ScanStack(name, True)
+        if name not in _SPECIAL_VAR_NAMES:
+          self.dynamic_cache[name] = (cell, namespace, readonly)
+
+      # If the topmost cell is in a temp frame, a write goes to the one below.
+      if readonly and not is_read:
+        cell, namespace, _ = self._ScanStack(name, False)
+      return cell, namespace
 
     elif lookup_mode == scope_e.LocalOnly:
       frame = self.var_stack[-1]
@@ -556,6 +757,22 @@ class Mem(object):
     else: 
       raise AssertionError(lookup_mode)
 
+  def _ScanStack(self, name, is_read):
+    for i in xrange(len(self.var_stack) - 1, -1, -1):
+      frame = self.var_stack[i]
+      if frame.readonly and not is_read:
+        continue
+      namespace = frame.vars
+      cell = namespace.get(name)
+      if cell is not None:
+        return cell, namespace, frame.readonly
+    return None, self.var_stack[0].vars, False  # set in global namespace
+
+  def _EvictFrame(self, frame):
+    cache = self.dynamic_cache
+    for name in frame.vars:
+      cache.pop(name, None)
+
   def SetVar(self, lval, value, new_flags, lookup_mode):
     """
     Args:
@@ -622,6 +839,10 @@ class Mem(object):
                             var_flags_e.Exported in new_flags ,
                             var_flags_e.ReadOnly in new_flags )
         namespace[lval.name] = cell
+        self.dynamic_cache.pop(lval.name, None)
+
+      if cell.exported:
+        self._UpdateExported(lval.name)
 
       if (cell.val is not None and cell.val.tag == value_e.StrArray and
           cell.exported):
@@ -685,6 +906,7 @@ class Mem(object):
         cell = runtime.cell(new_value, False,
                             var_flags_e.ReadOnly in new_flags)
         namespace[lval.name] = cell
+        self.dynamic_cache.pop(lval.name, None)
 
     else:
       raise AssertionError
@@ -702,14 +924,35 @@ class Mem(object):
     """
     cell = self.var_stack[0].vars[name]
     cell.val = new_val
+    if cell.exported:
+      self._UpdateExported(name)
 
   # NOTE: Have a default for convenience
   def GetVar(self, name, lookup_mode=scope_e.Dynamic):
     assert isinstance(name, str), name
 
+    # Special names are never in dynamic_cache, so a hit skips the check
+    # below.
+    if lookup_mode == scope_e.Dynamic:
+      entry = self.dynamic_cache.get(name)
+      if entry is not None:
+        cell = entry[0]
+        return cell.val if cell else runtime.Undef()
+
     # Do lookup of system globals before looking at user variables.  Note: we
     # could optimize this at compile-time like $?.  That would break
     # ${!varref}, but it's already broken for $?.
+    if name in _SPECIAL_VAR_NAMES:
+      return self._GetSpecialVarByName(name)
+
+    cell, _ = self._FindCellAndNamespace(name, lookup_mode, is_read=True)
+
+    if cell:
+      return cell.val
+
+    return runtime.Undef()
+
+  def _GetSpecialVarByName(self, name):
     if name == 'FUNCNAME':
       # bash wants it in reverse order.  This is a little inefficient but we're
       # not depending on deque().
@@ -724,12 +967,7 @@ class Mem(object):
     if name == 'SOURCE_NAME':
       return self.source_name
 
-    cell, _ = self._FindCellAndNamespace(name, lookup_mode, is_read=True)
-
-    if cell:
-      return cell.val
-
-    return runtime.Undef()
+    raise AssertionError(name)
 
   def Unset(self, lval, lookup_mode):
     """
@@ -746,6 +984,9 @@ class Mem(object):
         if cell.readonly:
           return False, found
         del namespace[lval.name]  # it must be here
+        self.dynamic_cache.pop(lval.name, None)
+        if cell.exported:
+          self._UpdateExported(lval.name)
         return True, found # found
       else:
         return True, False
@@ -761,28 +1002,70 @@ class Mem(object):
     if cell:
       if flag == var_flags_e.Exported:
         cell.exported = False
+        self._UpdateExported(name)
       else:
         raise AssertionError
       return True
     else:
       return False
 
+  def _UpdateExported(self, name):
+    """Patch the cached environment after an exported cell changes.
+
+    This is O(stack depth) rather than O(number of variables).  The effective
+    value is the topmost exported string, consistent with GetExported().
+    """
+    exported = self.exported
+    if exported is None:
+      return  # nothing to patch; it will be rebuilt
+
+    for i in xrange(len(self.var_stack) - 1, -1, -1):
+      cell = self.var_stack[i].vars.get(name)
+      if cell and cell.exported and cell.val.tag == value_e.Str:
+        exported[name] = cell.val.s
+        return
+    exported.pop(name, None)
+
+  def _UpdateExportedFrame(self, frame):
+    """Patch the cached environment after a frame is popped."""
+    if self.exported is None:
+      return
+    for name, cell in frame.vars.iteritems():
+      if cell.exported:
+        self._UpdateExported(name)
+
   def GetExported(self):
-    """Get all the variables that are marked exported."""
-    # TODO: This is run on every SimpleCommand.  Should we have a dirty flag?
-    # We have to notice these things:
-    # - If an exported variable is changed.
-    # - If the set of exported variables changes.  
+    """Get all the variables that are marked exported.
+
+    This is run on every external command, so the result is cached and
+    patched incrementally by SetVar, Unset, ClearFlag, PopCall, and PopTemp.
+    (Pushing a frame can't change the environment because it's empty.)
+
+    Returns:
+      A dict of name -> string, owned by Mem.  Callers must not mutate it.
+    """
+    if self.exported is not None:
+      self.num_exported_reused += 1
+      return self.exported
 
     exported = {}
     # Search from globals up.  Names higher on the stack will overwrite names
     # lower on the stack.
     for scope in self.var_stack:
-      for name, cell in scope.vars.items():
+      for name, cell in scope.vars.iteritems():
         if cell.exported and cell.val.tag == value_e.Str:
           exported[name] = cell.val.s
+    self.exported = exported
+    self.num_exported_built += 1
     return exported
 
+  def ExportStats(self):
+    """For --runtime-stats."""
+    total = self.num_exported_reused + self.num_exported_built
+    rate = 100.0 * self.num_exported_reused / total if total else 0.0
+    return 'exported env: %d reused, %d built (%.1f%% reused)' % (
+        self.num_exported_reused, self.num_exported_built, rate)
+
 
 def SetLocalString(mem, name, s):
   """Set a local string.
@@ -803,6 +1086,12 @@ def SetGlobalString(mem, name, s):
   mem.SetVar(ast.LhsName(name), val, (), scope_e.GlobalOnly)
 
 
+def SetDynamicArray(mem, name, a):
+  """For the mapfile builtin, which assigns like bash's 'a=(...)'."""
+  assert isinstance(a, list)
+  mem.SetVar(ast.LhsName(name), runtime.StrArray(a), (), scope_e.Dynamic)
+
+
 def SetGlobalArray(mem, name, a):
   """Helper for completion."""
   assert isinstance(a, list)
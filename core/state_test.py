@@ -247,6 +247,61 @@ class MemTest(unittest.TestCase):
     e = mem.GetExported()
     self.assertEqual({'U': 'u'}, e)
 
+  def testExportedCache(self):
+    mem = _InitMem()
+
+    # export E=1
+    mem.SetVar(
+        runtime.LhsName('E'), runtime.Str('1'), (var_flags_e.Exported,),
+        scope_e.Dynamic)
+    self.assertEqual({'E': '1'}, mem.GetExported())
+    self.assertEqual({'E': '1'}, mem.GetExported())
+    self.assertEqual(1, mem.num_exported_built)
+    self.assertEqual(1, mem.num_exported_reused)
+    self.assertEqual('exported env: 1 reused, 1 built (50.0% reused)',
+                     mem.ExportStats())
+
+    # Non-exported variables don't affect it.
+    mem.SetVar(
+        runtime.LhsName('x'), runtime.Str('x'), (), scope_e.Dynamic)
+
+    # E=2 F=3 cmd
+    mem.PushTemp()
+    mem.SetVar(
+        runtime.LhsName('E'), runtime.Str('2'), (var_flags_e.Exported,),
+        scope_e.TempEnv)
+    mem.SetVar(
+        runtime.LhsName('F'), runtime.Str('3'), (var_flags_e.Exported,),
+        scope_e.TempEnv)
+    self.assertEqual({'E': '2', 'F': '3'}, mem.GetExported())
+    mem.PopTemp()
+    self.assertEqual({'E': '1'}, mem.GetExported())
+
+    # f() { local -x L=l; E=4; }
+    mem.PushCall('f', [])
+    mem.SetVar(
+        runtime.LhsName('L'), runtime.Str('l'), (var_flags_e.Exported,),
+        scope_e.LocalOnly)
+    mem.SetVar(
+        runtime.LhsName('E'), runtime.Str('4'), (), scope_e.Dynamic)
+    self.assertEqual({'E': '4', 'L': 'l'}, mem.GetExported())
+    mem.PopCall()
+    self.assertEqual({'E': '4'}, mem.GetExported())
+
+    # export -n E
+    mem.ClearFlag('E', var_flags_e.Exported, scope_e.Dynamic)
+    self.assertEqual({}, mem.GetExported())
+
+    # export E; unset E
+    mem.SetVar(
+        runtime.LhsName('E'), None, (var_flags_e.Exported,), scope_e.Dynamic)
+    self.assertEqual({'E': '4'}, mem.GetExported())
+    mem.Unset(runtime.LhsName('E'), scope_e.Dynamic)
+    self.assertEqual({}, mem.GetExported())
+
+    # Everything was patched rather than rebuilt.
+    self.assertEqual(1, mem.num_exported_built)
+
   def testUnset(self):
     mem = _InitMem()
     # unset a
@@ -289,6 +344,111 @@ class MemTest(unittest.TestCase):
     mem.SetArgv(['i', 'j', 'k'])
     self.assertEqual(['i', 'j', 'k'], mem.GetArgv())
 
+  def testSnapshot(self):
+    mem = state.Mem('', ['x', 'y'], {}, None)
+    state.SetGlobalString(mem, 'a', 'old')
+    mem.SetVar(runtime.LhsName('e'), runtime.Str('env'),
+               (var_flags_e.Exported,), scope_e.Dynamic)
+    mem.SetVar(runtime.LhsName('arr'), runtime.StrArray(['1', '2']), (),
+               scope_e.Dynamic)
+    self.assertEqual({'e': 'env'}, mem.GetExported())
+
+    snapshot = mem.Snapshot()
+    state.SetGlobalString(mem, 'a', 'new')
+    state.SetGlobalString(mem, 'b', 'new')
+    mem.SetVar(runtime.LhsName('e'), runtime.Str('changed'), (),
+               scope_e.Dynamic)
+    mem.SetVar(runtime.LhsIndexedName('arr', 0), runtime.Str('Z'), (),
+               scope_e.Dynamic)
+    mem.Shift(1)
+    mem.PushCall('my-func', ['z'])
+    mem.last_status = 42
+
+    mem.Restore(snapshot)
+    self.assertEqual('old', mem.GetVar('a').s)
+    self.assertEqual(value_e.Undef, mem.GetVar('b').tag)
+    self.assertEqual(['1', '2'], mem.GetVar('arr').strs)
+    self.assertEqual({'e': 'env'}, mem.GetExported())
+    self.assertEqual(['x', 'y'], mem.GetArgv())
+    self.assertEqual(1, len(mem.var_stack))
+    self.assertEqual([], mem.func_name_stack)
+    self.assertEqual(0, mem.last_status)
+
+  def testDynamicCache(self):
+    mem = _InitMem()
+    state.SetGlobalString(mem, 'x', 'global')
+    self.assertEqual('global', mem.GetVar('x').s)
+    self.assertEqual(value_e.Undef, mem.GetVar('y').tag)
+
+    # local x=local y=new
+    mem.PushCall('my-func', [])
+    self.assertEqual('global', mem.GetVar('x').s)
+    state.SetLocalString(mem, 'x', 'local')
+    state.SetLocalString(mem, 'y', 'new')
+    self.assertEqual('local', mem.GetVar('x').s)
+    self.assertEqual('new', mem.GetVar('y').s)
+
+    # x=temp y=$y cmd, where cmd assigns to x
+    mem.PushTemp()
+    mem.SetVar(
+        runtime.LhsName('x'), runtime.Str('temp'), (), scope_e.TempEnv)
+    self.assertEqual('temp', mem.GetVar('x').s)
+    mem.SetVar(
+        runtime.LhsName('x'), runtime.Str('assigned'), (), scope_e.Dynamic)
+    self.assertEqual('temp', mem.GetVar('x').s)
+    mem.PopTemp()
+    self.assertEqual('assigned', mem.GetVar('x').s)
+
+    mem.PopCall()
+    self.assertEqual('global', mem.GetVar('x').s)
+    self.assertEqual(value_e.Undef, mem.GetVar('y').tag)
+
+    mem.Unset(runtime.LhsName('x'), scope_e.Dynamic)
+    self.assertEqual(value_e.Undef, mem.GetVar('x').tag)
+
+    # Special vars shadow user vars, even after a lookup for assignment.
+    mem.SetVar(
+        runtime.LhsName('LINENO'), runtime.Str('user'), (), scope_e.Dynamic)
+    self.assertEqual(value_e.Str, mem.GetVar('LINENO').tag)
+    self.assertEqual('', mem.GetVar('LINENO').s)
+
+
+class SearchPathTest(unittest.TestCase):
+
+  def testSearchPath(self):
+    mem = _InitMem()
+    state.SetGlobalString(mem, 'PATH', '/nonexistent:/bin:/usr/bin')
+    search_path = state.SearchPath(mem)
+
+    self.assertEqual(None, search_path.Resolve('nonexistent-command'))
+    self.assertEqual('./foo', search_path.Resolve('./foo'))  # no search
+
+    sh_path = search_path.Resolve('sh')
+    self.assertEqual('/bin/sh', sh_path)
+    self.assertEqual(sh_path, search_path.Get('sh'))
+    search_path.Resolve('sh')
+    self.assertEqual([('sh', sh_path, 2)], search_path.Items())
+
+    # Lookup doesn't remember
+    self.assertNotEqual(None, search_path.Lookup('ls'))
+    self.assertEqual(None, search_path.Get('ls'))
+
+    search_path.Set('foo', '/bin/echo')
+    self.assertEqual('/bin/echo', search_path.Resolve('foo'))
+
+    search_path.Clear()
+    self.assertEqual([], search_path.Items())
+
+    # Assigning PATH invalidates the table, even to the same value.
+    search_path.Resolve('sh')
+    self.assertEqual(1, len(search_path.Items()))
+    state.SetGlobalString(mem, 'PATH', '/nonexistent:/bin:/usr/bin')
+    self.assertEqual([], search_path.Items())
+
+    state.SetGlobalString(mem, 'PATH', '/nonexistent')
+    self.assertEqual(None, search_path.Resolve('sh'))
+    self.assertEqual([], list(search_path.ListCommands()))
+
 
 if __name__ == '__main__':
   unittest.main()
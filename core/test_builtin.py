@@ -23,6 +23,11 @@ _UNARY_LOOKUP = id_kind.TEST_UNARY_LOOKUP
 _BINARY_LOOKUP = id_kind.TEST_BINARY_LOOKUP
 _OTHER_LOOKUP = id_kind.TEST_OTHER_LOOKUP
 
+# Every string that isn't an operand.  The parse only depends on which args are
+# in this set.
+_OPERATORS = frozenset(
+    list(_UNARY_LOOKUP) + list(_BINARY_LOOKUP) + list(_OTHER_LOOKUP))
+
 
 class _StringWordEmitter:
   """For test/[, we need a word parser that returns StringWord.
@@ -54,12 +59,23 @@ class _StringWordEmitter:
 
 
 class _WordEvaluator:
+  """Evaluates the words of a tree parsed from _Skeleton(argv).
+
+  Operands are the string index of the arg, e.g. '1'.  Other words evaluate to
+  themselves: operators used as operands, like the first -z in [ -z = -z ],
+  and the empty Eof_Real word, which BoolParser can use as an operand.
+  """
+  def __init__(self):
+    self.argv = None  # set for each call
 
   def EvalWordToString(self, w, do_fnmatch=False):
     # do_fnmatch: for the [[ == ]] semantics which we don't have!
     # I think I need another type of node
     # Maybe it should be BuiltinEqual and BuiltinDEqual?  Parse it into a different tree.
-    return runtime.Str(w.s)
+    s = w.s
+    if s.isdigit():  # no operator is all digits
+      return runtime.Str(self.argv[int(s)])
+    return runtime.Str(s)
 
 
 def _StringWordTest(s):
@@ -114,17 +130,14 @@ def _ThreeArgs(argv):
   util.p_die('Syntax error: binary operator expected')
 
 
-def Test(argv, need_right_bracket):
-  """The test/[ builtin.
-
-  The only difference between test and [ is that [ needs a matching ].
+def _Parse(argv):
   """
-  if need_right_bracket:
-    if argv[-1] != ']':
-      util.error('[: missing closing ]')
-      return 2
-    del argv[-1]
+  Returns:
+    (bool_expr, BoolParser).  The node is None if the BoolParser failed.
 
+  Raises:
+    util.ParseError
+  """
   w_parser = _StringWordEmitter(argv)
   b_parser = bool_parse.BoolParser(w_parser)
 
@@ -144,56 +157,106 @@ def Test(argv, need_right_bracket):
 
   bool_node = None
   n = len(argv)
-  try:
-    if n == 0:
-      return 1  # [ ] is False
-    elif n == 1:
-      bool_node = _StringWordTest(argv[0])
-    elif n == 2:
-      bool_node = _TwoArgs(argv)
-    elif n == 3:
-      bool_node = _ThreeArgs(argv)
-    if n == 4:
-      a0 = argv[0]
-      if a0 == '!':
-        child = _ThreeArgs(argv[1:])
-        bool_node = ast.LogicalNot(child)
-      elif a0 == '(' and argv[3] == ')':
-        bool_node = _TwoArgs(argv[1:3])
-      else:
-        pass  # fallthrough
-
-    if bool_node is None:
-      bool_node = b_parser.ParseForBuiltin()
-      #log('Bool expr %s', bool_node)
+  if n == 1:
+    bool_node = _StringWordTest(argv[0])
+  elif n == 2:
+    bool_node = _TwoArgs(argv)
+  elif n == 3:
+    bool_node = _ThreeArgs(argv)
+  if n == 4:
+    a0 = argv[0]
+    if a0 == '!':
+      child = _ThreeArgs(argv[1:])
+      bool_node = ast.LogicalNot(child)
+    elif a0 == '(' and argv[3] == ')':
+      bool_node = _TwoArgs(argv[1:3])
+    else:
+      pass  # fallthrough
+
+  if bool_node is None:
+    bool_node = b_parser.ParseForBuiltin()
+    #log('Bool expr %s', bool_node)
+  return bool_node, b_parser
+
+
+def _Skeleton(argv):
+  """Replace each operand with its index, e.g. [ "$i" -lt 100 ] is
+  ('0', '-lt', '2').
+
+  Args that look the same to the parser have the same skeleton, so they can
+  share a tree.
+  """
+  return tuple(
+      s if s in _OPERATORS else str(i) for i, s in enumerate(argv))
 
-      if bool_node is None:
-        for e in b_parser.Error():
-          log("test: %s", e.UserErrorString())
-        # TODO: There should be a nice method to print argv.  And some way to
-        # point to the error.
-        log("Error parsing test/[ expression: %s", argv)
-        return 2  # parse error is 2
 
+def _ReportParseError(argv):
+  """Parse the real args again, so error messages show them."""
+  try:
+    bool_node, b_parser = _Parse(argv)
   except util.ParseError as e:
     util.error(e.UserErrorString())
     return 2
 
-  # mem: Don't need it for BASH_REMATCH?  Or I guess you could support it
-  # exec_opts: don't need it, but might need it later
+  if bool_node is None:
+    for e in b_parser.Error():
+      log("test: %s", e.UserErrorString())
+  # TODO: There should be a nice method to print argv.  And some way to
+  # point to the error.
+  log("Error parsing test/[ expression: %s", argv)
+  return 2  # parse error is 2
+
+
+# Parsed trees, by skeleton.  Loop conditions like [ "$i" -lt 100 ] are parsed
+# once.
+_MAX_CACHED = 1000
+_tree_cache = {}
+
+# mem: Don't need it for BASH_REMATCH?  Or I guess you could support it
+# exec_opts: don't need it, but might need it later
+_WORD_EV = _WordEvaluator()
+_BOOL_EV = expr_eval.BoolEvaluator(None, None, _WORD_EV)
+
+
+def Test(argv, need_right_bracket):
+  """The test/[ builtin.
+
+  The only difference between test and [ is that [ needs a matching ].
+  """
+  if need_right_bracket:
+    if argv[-1] != ']':
+      util.error('[: missing closing ]')
+      return 2
+    del argv[-1]
+
+  if not argv:
+    return 1  # [ ] is False
+
+  skeleton = _Skeleton(argv)
+  bool_node = _tree_cache.get(skeleton)
+  if bool_node is None:
+    try:
+      bool_node, _ = _Parse(skeleton)
+    except util.ParseError:
+      bool_node = None
+    if bool_node is None:
+      return _ReportParseError(argv)
 
-  mem = None
-  exec_opts = None
-  word_ev = _WordEvaluator()
+    if len(_tree_cache) >= _MAX_CACHED:
+      _tree_cache.clear()
+    _tree_cache[skeleton] = bool_node
 
-  bool_ev = expr_eval.BoolEvaluator(mem, exec_opts, word_ev)
+  _WORD_EV.argv = argv
   try:
-    b = bool_ev.Eval(bool_node)
+    b = _BOOL_EV.Eval(bool_node)
   except util.FatalRuntimeError as e:
     # e.g. [ -t xxx ]
     # TODO: Printing the location would be nice.
+    sys.stdout.flush()
     print('test: %s' % e.UserErrorString(), file=sys.stderr)
     return 2
+  finally:
+    _WORD_EV.argv = None
 
   status = 0 if b else 1
   return status
@@ -0,0 +1,44 @@
+#!/usr/bin/python -S
+"""
+test_builtin_test.py: Tests for test_builtin.py
+"""
+
+import unittest
+
+from core import test_builtin  # module under test
+
+
+class TestBuiltinTest(unittest.TestCase):
+
+  def testSkeleton(self):
+    self.assertEqual(('0', '-lt', '2'),
+                     test_builtin._Skeleton(['42', '-lt', '100']))
+    self.assertEqual(('-z', '=', '-z'),
+                     test_builtin._Skeleton(['-z', '=', '-z']))
+
+  def testCachedTree(self):
+    test_builtin._tree_cache.clear()
+    self.assertEqual(0, test_builtin.Test(['1', '-lt', '2', ']'], True))
+    self.assertEqual(1, test_builtin.Test(['3', '-lt', '2'], False))
+    self.assertEqual(1, len(test_builtin._tree_cache))
+
+    # Operators used as operands
+    self.assertEqual(0, test_builtin.Test(['-z', '=', '-z'], False))
+    self.assertEqual(1, test_builtin.Test(['!', '-z', '=', '-z'], False))
+    self.assertEqual(0, test_builtin.Test(['(', 'x', ')'], False))
+    self.assertEqual(1, test_builtin.Test(['(', '', ')'], False))
+
+  def testEofWordAsOperand(self):
+    # BoolParser uses the Eof_Real word, whose string is empty, as an operand.
+    self.assertEqual(1, test_builtin.Test(['-f', ')', '-o', '-n'], False))
+    self.assertEqual(
+        1, test_builtin.Test(['/tmp', '=', '-a', '-o', '-f', ']'], True))
+
+  def testParseError(self):
+    self.assertEqual(2, test_builtin.Test(['a', 'b'], False))
+    self.assertEqual(2, test_builtin.Test(['a', 'b', 'c', 'd', 'e'], False))
+    self.assertEqual(1, test_builtin.Test([']'], True))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -111,6 +111,7 @@ def PrintFilenameAndLine(span_id, arena, f=sys.stderr):
 
 def PrettyPrintError(parse_error, arena, f=sys.stderr):
   #print(parse_error)
+  sys.stdout.flush()  # builtin output comes first
   if parse_error.span_id != const.NO_INTEGER:
     span_id = parse_error.span_id
   elif parse_error.token:
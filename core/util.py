@@ -99,27 +99,35 @@ def e_die(msg, *args, **kwargs):
   raise FatalRuntimeError(msg, *args, **kwargs)
 
 
+# NOTE: These flush stdout first, because builtins don't flush it.  Otherwise
+# 'osh foo.sh >log 2>&1' would show messages before the output that preceded
+# them.
+
 def log(msg, *args):
   if args:
     msg = msg % args
+  sys.stdout.flush()
   print(msg, file=sys.stderr)
 
 
 def warn(msg, *args):
   if args:
     msg = msg % args
+  sys.stdout.flush()
   print('osh warning: ' + msg, file=sys.stderr)
 
 
 def error(msg, *args):
   if args:
     msg = msg % args
+  sys.stdout.flush()
   print('osh error: ' + msg, file=sys.stderr)
 
 
 def usage(msg, *args):
   if args:
     msg = msg % args
+  sys.stdout.flush()
   print('usage error: ' + msg, file=sys.stderr)
 
 
@@ -6,10 +6,14 @@ This is called the "compile" stage because it happens after parsing, but it
 doesn't depend on any values at runtime.
 """
 
+from core import braces
 from core.id_kind import Id
 from core import runtime
+from osh import ast_ as ast
 
 var_flags_e = runtime.var_flags_e
+word_e = ast.word_e
+word_part_e = ast.word_part_e
 
 
 _ONE_CHAR = {
@@ -107,3 +111,87 @@ def ParseAssignFlags(flag_args):
         pass
   return flags
 
+
+#
+# Word sequences, e.g. argv of SimpleCommand and the words of ForEach
+#
+
+# Unquoted, these may make a word a glob.  See word_eval._GLOB_START_CHARS.
+_GLOB_CHARS = '*?['
+
+
+def _ConstPart(part, quoted, out, unquoted):
+  """Append the value of a constant part to out.
+
+  Args:
+    out: list of strings
+    unquoted: list of the strings that are subject to splitting and globbing
+
+  Returns:
+    Whether the part is constant.
+  """
+  if part.tag == word_part_e.LiteralPart:
+    out.append(part.token.val)
+    if not quoted:
+      unquoted.append(part.token.val)
+
+  elif part.tag == word_part_e.EscapedLiteralPart:
+    out.append(part.token.val[1])
+
+  elif part.tag == word_part_e.EmptyPart:
+    pass
+
+  elif part.tag == word_part_e.SingleQuotedPart:
+    if part.left.id == Id.Left_SingleQuote:
+      out.extend(t.val for t in part.tokens)
+    elif part.left.id == Id.Left_DollarSingleQuote:
+      out.extend(EvalCStringToken(t.id, t.val) for t in part.tokens)
+    else:
+      return False
+
+  elif part.tag == word_part_e.DoubleQuotedPart:
+    for p in part.parts:
+      if not _ConstPart(p, True, out, unquoted):
+        return False
+
+  else:  # substitutions, ~, etc.
+    return False
+
+  return True
+
+
+def _CompileWord(w):
+  """
+  Returns:
+    A (word, const, unquoted) tuple.  const is the string value of the word,
+    or None if it has to be evaluated at runtime.  unquoted is the part of the
+    value that IFS applies to.
+  """
+  # A word with no parts, e.g. from {X,}, is elided at runtime.
+  if w.tag != word_e.CompoundWord or not w.parts:
+    return w, None, None
+
+  out = []
+  unquoted = []
+  for part in w.parts:
+    if not _ConstPart(part, False, out, unquoted):
+      return w, None, None
+
+  u = ''.join(unquoted)
+  for c in _GLOB_CHARS:
+    if c in u:
+      return w, None, None
+  return w, ''.join(out), u
+
+
+def CompileWords(words):
+  """Brace expand a word sequence, and evaluate the words that are constant.
+
+  The result doesn't depend on any runtime state, so the executor caches it
+  for each node.  word_eval still checks the unquoted part of each constant
+  word against IFS.
+
+  Returns:
+    A list of (word, const, unquoted) tuples.
+  """
+  return [_CompileWord(w) for w in braces.BraceExpandWords(words)]
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+word_compile_test.py: Tests for word_compile.py
+"""
+
+import unittest
+
+from core import braces
+from core import word_compile  # module under test
+from osh import word_parse_test
+
+
+def _Compile(test, *word_strs):
+  words = []
+  for s in word_strs:
+    w = word_parse_test._assertReadWord(test, s)
+    words.append(braces._BraceDetect(w) or w)
+  return [(const, unquoted) for _, const, unquoted in
+          word_compile.CompileWords(words)]
+
+
+class CompileWordsTest(unittest.TestCase):
+
+  def testConstant(self):
+    self.assertEqual(
+        [('foo', 'foo'), ('a b', ''), ('xc:d', 'x'), ('', '')],
+        _Compile(self, 'foo', "'a b'", 'x"c:d"', '""'))
+    self.assertEqual([('*', '')], _Compile(self, '\\*'))
+    self.assertEqual([('a\tb', '')], _Compile(self, "$'a\\tb'"))
+
+  def testNotConstant(self):
+    self.assertEqual(
+        [(None, None), (None, None), (None, None), (None, None)],
+        _Compile(self, '$x', 'a"$x"', '$(echo hi)', '*.py'))
+
+  def testBraceExpansion(self):
+    self.assertEqual(
+        [('ac', 'ac'), ('bc', 'bc'), (None, None), (None, None)],
+        _Compile(self, '{a,b}c', '{$x,*}'))
+    # The empty alternative is elided at runtime
+    self.assertEqual(
+        [('X', 'X'), (None, None)],
+        _Compile(self, '{X,}'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,6 +2,7 @@
 word_eval.py - Evaluator for the word language.
 """
 
+import re
 import sys
 
 from core import braces
@@ -41,6 +42,30 @@ def _BackslashEscape(s):
   return escaped
 
 
+# Unquoted, these can make a word a glob.  ']' and the extglob prefixes only
+# matter after '[' or before '('.
+_GLOB_START_CHARS = '*?[('
+
+_special_re_cache = {}  # (IFS chars, will_glob) -> regex or None
+
+
+def _SpecialCharsRegex(ifs_chars, will_glob):
+  """Return a regex matching chars that make a fragment split or glob."""
+  key = (ifs_chars, will_glob)
+  try:
+    return _special_re_cache[key]
+  except KeyError:
+    pass
+
+  chars = ifs_chars + _GLOB_START_CHARS if will_glob else ifs_chars
+  if chars:
+    regex = re.compile('[%s]' % ''.join(re.escape(c) for c in chars))
+  else:
+    regex = None
+  _special_re_cache[key] = regex
+  return regex
+
+
 def _ValueToPartValue(val, quoted):
   """Helper for VarSub evaluation.
 
@@ -135,6 +160,7 @@ class _WordEvaluator:
     EvalWordToString
     EvalRhsWord
     EvalWordSequence
+    EvalCompiledWords
   """
   def __init__(self, mem, exec_opts, splitter):
     self.mem = mem  # for $HOME, $1, etc.
@@ -698,6 +724,18 @@ class _WordEvaluator:
       v = runtime.StringPartValue(str(num), False)
       part_vals.append(v)
 
+    elif part.tag == word_part_e.ExtGlobPart:
+      # Evaluate to a string like @(foo|$bar), which glob_.CompileGlob()
+      # parses.  The operators aren't quoted, but quoted parts of the arms
+      # are, e.g. @(foo|'*').
+      part_vals.append(runtime.StringPartValue(part.op.val, True))
+      for i, arm in enumerate(part.arms):
+        if i != 0:
+          part_vals.append(runtime.StringPartValue('|', True))
+        for p in arm.parts:
+          self._EvalWordPart(p, part_vals, quoted=quoted)
+      part_vals.append(runtime.StringPartValue(')', True))
+
     else:
       raise AssertionError(part.__class__.__name__)
 
@@ -812,6 +850,20 @@ class _WordEvaluator:
 
     will_glob = not self.exec_opts.noglob
 
+    # Fast path: if no unquoted fragment has an IFS or glob char, then the
+    # frame is exactly one arg.  There's no need to escape, split, and
+    # unescape.
+    regex = _SpecialCharsRegex(self.splitter.GetIfsChars(), will_glob)
+    plain = True
+    if regex is not None:
+      for s, do_split_glob in frame:
+        if do_split_glob and regex.search(s):
+          plain = False
+          break
+    if plain:
+      argv.append(''.join(s for s, _ in frame))
+      return
+
     # Array of strings, some of which are BOTH IFS-escaped and GLOB escaped!
     frags = []
     for frag, do_split_glob in frame:
@@ -884,36 +936,66 @@ class _WordEvaluator:
     #log('W %s', words)
     argv = []
     for w in words:
-      part_vals = []
-      self._EvalWordToParts(w, False, part_vals)  # not double quoted
-
-      if 0:
-        log('')
-        log('part_vals after _EvalWordToParts:')
-        for entry in part_vals:
-          log('  %s', entry)
-
-      frames = _MakeWordFrames(part_vals)
-      if 0:
-        log('')
-        log('frames after _MakeWordFrames:')
-        for entry in frames:
-          log('  %s', entry)
-
-      # Now each frame will append zero or more args.
-      for frame in frames:
-        self._EvalWordFrame(frame, argv)
+      self._EvalWordToArgv(w, argv)
 
     #log('ARGV %s', argv)
     return argv
 
+  def _EvalWordToArgv(self, w, argv):
+    """Evaluate a word, and append zero or more args to argv."""
+    part_vals = []
+    self._EvalWordToParts(w, False, part_vals)  # not double quoted
+
+    if 0:
+      log('')
+      log('part_vals after _EvalWordToParts:')
+      for entry in part_vals:
+        log('  %s', entry)
+
+    frames = _MakeWordFrames(part_vals)
+    if 0:
+      log('')
+      log('frames after _MakeWordFrames:')
+      for entry in frames:
+        log('  %s', entry)
+
+    # Now each frame will append zero or more args.
+    for frame in frames:
+      self._EvalWordFrame(frame, argv)
+
   def EvalWordSequence(self, words):
     """
-    Used in: SimpleCommand, ForEach.
+    For words that haven't gone through word_compile.CompileWords.
     """
     # TODO: Remove this stub
     return self._EvalWordSequence(words)
 
+  def EvalCompiledWords(self, compiled):
+    """Like EvalWordSequence, but for the output of word_compile.CompileWords.
+
+    Constant words are appended to argv directly, unless their unquoted part
+    has an IFS char.
+    """
+    argv = []
+    ifs_regex = None
+    ifs_known = False
+    for w, const, unquoted in compiled:
+      if const is not None:
+        if not unquoted:
+          argv.append(const)
+          continue
+        if not ifs_known:
+          ifs_regex = _SpecialCharsRegex(self.splitter.GetIfsChars(), False)
+          ifs_known = True
+        if ifs_regex is None or not ifs_regex.search(unquoted):
+          argv.append(const)
+          continue
+
+      self._EvalWordToArgv(w, argv)
+      ifs_known = False  # e.g. ${IFS:=x} could have changed it
+
+    return argv
+
 
 class NormalWordEvaluator(_WordEvaluator):
 
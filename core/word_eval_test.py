@@ -15,7 +15,20 @@ from core import word_eval  # module under test
 
 
 class WordEvalTest(unittest.TestCase):
-  pass
+
+  def testSpecialCharsRegex(self):
+    regex = word_eval._SpecialCharsRegex(' \t\n', True)
+    self.assertFalse(regex.search('foo.py'))
+    self.assertFalse(regex.search('a\\b]'))
+    self.assertTrue(regex.search('a b'))
+    self.assertTrue(regex.search('*.py'))
+    self.assertTrue(regex.search('@(foo)'))
+
+    regex = word_eval._SpecialCharsRegex(':', False)
+    self.assertFalse(regex.search('*.py'))
+    self.assertTrue(regex.search('a:b'))
+
+    self.assertEqual(None, word_eval._SpecialCharsRegex('', False))
 
 
 if __name__ == '__main__':
@@ -65,6 +65,31 @@ fastlex_MatchToken(PyObject *self, PyObject *args) {
   return Py_BuildValue("(ii)", id, end_pos);
 }
 
+static PyObject *
+fastlex_MatchEchoToken(PyObject *self, PyObject *args) {
+  unsigned char* line;
+  int line_len;
+
+  int start_pos;
+  if (!PyArg_ParseTuple(args, "s#i", &line, &line_len, &start_pos)) {
+    return NULL;
+  }
+
+  // Unlike MatchToken, there's no Eol_Tok, so the caller has to stop before
+  // the end.  The string can contain NUL bytes, e.g. from $'\0'.
+  if (start_pos < 0 || start_pos >= line_len) {
+    PyErr_Format(PyExc_ValueError,
+                 "Invalid MatchEchoToken call (start_pos = %d, line_len = %d)",
+                 start_pos, line_len);
+    return NULL;
+  }
+
+  int id;
+  int end_pos;
+  MatchEchoToken(line, line_len, start_pos, &id, &end_pos);
+  return Py_BuildValue("(ii)", id, end_pos);
+}
+
 // Rename to TokenMatcher?
 // LineLexer holds CharMatcher?  or TokenMatcher?
 // SlowTokenMatcher
@@ -73,6 +98,8 @@ fastlex_MatchToken(PyObject *self, PyObject *args) {
 static PyMethodDef methods[] = {
   {"MatchToken", fastlex_MatchToken, METH_VARARGS,
    "(lexer mode, line, start_pos) -> (id, end_pos)."},
+  {"MatchEchoToken", fastlex_MatchEchoToken, METH_VARARGS,
+   "(line, start_pos) -> (id, end_pos).  For echo -e and printf %b."},
   {NULL, NULL},
 };
 
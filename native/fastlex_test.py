@@ -12,8 +12,10 @@ libc_test.py: Tests for libc.py
 import unittest
 
 from core import id_kind
+from core import lexer
 from core.id_kind import Id
 from osh import ast_ as ast
+from osh import lex
 
 import fastlex  # module under test
 
@@ -67,6 +69,18 @@ class LexTest(unittest.TestCase):
 
     self.assertEqual(expected, tok_type)
 
+  def testMatchEchoToken(self):
+    slow = lexer.SimpleLexer(lex.ECHO_E_DEF)
+    fast = lexer.SimpleLexer(lex.ECHO_E_DEF, fastlex.MatchEchoToken)
+    CASES = [
+        'foo', r'a\tb\n', r'\0101\x41\u0041', r'\c', r'\z', 'end\\',
+        'nul \0 in the middle', 'line\\\ncont',
+    ]
+    for s in CASES:
+      self.assertEqual(list(slow.Tokens(s)), list(fast.Tokens(s)))
+
+    self.assertRaises(ValueError, fastlex.MatchEchoToken, 'abc', 3)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,391 @@
+/*
+ * Python interface to IFS splitting, for core/legacy.py.
+ *
+ * This is the same automaton as IfsSplitter.Split() in core/legacy.py, with
+ * CH_* character classes, ST_* states, and EMIT_* actions.  split() returns
+ * the same spans, for the 'read' builtin.  split_parts() returns the parts
+ * for word evaluation directly, like legacy._SpansToParts().
+ *
+ * When IFS only has whitespace characters, like the default ' \t\n', the
+ * parts are found with a simple loop instead.
+ */
+
+#include <stdarg.h>  // va_list, etc.
+#include <stdio.h>  // printf
+#include <stdlib.h>  // malloc
+#include <string.h>  // memset
+
+#define PY_SSIZE_T_CLEAN  // for s# and n
+#include <Python.h>
+
+// Log messages to stderr.
+static void debug(const char* fmt, ...) {
+#ifdef FASTSPLIT_VERBOSE
+  va_list args;
+  va_start(args, fmt);
+  vfprintf(stderr, fmt, args);
+  va_end(args);
+  fprintf(stderr, "\n");
+#endif
+}
+
+// Must match core/legacy.py.
+enum { CH_DE_WHITE, CH_DE_GRAY, CH_BLACK, CH_BACKSLASH };
+
+enum {
+  ST_INVALID, ST_START, ST_DE_WHITE1, ST_DE_GRAY, ST_DE_WHITE2, ST_BLACK,
+  ST_BACKSLASH
+};
+
+enum { EMIT_PART, EMIT_DE, EMIT_EMPTY, EMIT_ESCAPE, NO_EMIT };
+
+// Indices into the tuple of span_e values passed to split().
+enum { SPAN_BLACK, SPAN_DELIM, SPAN_BACKSLASH };
+
+// (new state, action), indexed by state and character class.
+static const unsigned char kTransitions[7][4][2] = {
+  // ST_INVALID
+  {{ST_INVALID, NO_EMIT}, {ST_INVALID, NO_EMIT}, {ST_INVALID, NO_EMIT},
+   {ST_INVALID, NO_EMIT}},
+  // ST_START.  Whitespace should have been stripped.
+  {{ST_INVALID, NO_EMIT}, {ST_DE_GRAY, EMIT_EMPTY}, {ST_BLACK, NO_EMIT},
+   {ST_BACKSLASH, NO_EMIT}},
+  // ST_DE_WHITE1
+  {{ST_DE_WHITE1, NO_EMIT}, {ST_DE_GRAY, NO_EMIT}, {ST_BLACK, EMIT_DE},
+   {ST_BACKSLASH, EMIT_DE}},
+  // ST_DE_GRAY
+  {{ST_DE_WHITE2, NO_EMIT}, {ST_DE_GRAY, EMIT_EMPTY}, {ST_BLACK, EMIT_DE},
+   {ST_BLACK, EMIT_DE}},
+  // ST_DE_WHITE2
+  {{ST_DE_WHITE2, NO_EMIT}, {ST_DE_GRAY, EMIT_EMPTY}, {ST_BLACK, EMIT_DE},
+   {ST_BACKSLASH, EMIT_DE}},
+  // ST_BLACK
+  {{ST_DE_WHITE1, EMIT_PART}, {ST_DE_GRAY, EMIT_PART}, {ST_BLACK, NO_EMIT},
+   {ST_BACKSLASH, EMIT_PART}},
+  // ST_BACKSLASH.  The escaped character is always black.
+  {{ST_BLACK, EMIT_ESCAPE}, {ST_BLACK, EMIT_ESCAPE}, {ST_BLACK, EMIT_ESCAPE},
+   {ST_BLACK, EMIT_ESCAPE}},
+};
+
+typedef struct {
+  int type;  // SPAN_*
+  Py_ssize_t end;
+} Span;
+
+// Fill in a table of character classes.
+static void classify(unsigned char* table, const char* ws, Py_ssize_t ws_len,
+                     const char* other, Py_ssize_t other_len,
+                     int allow_escape) {
+  memset(table, CH_BLACK, 256);
+  if (allow_escape) {
+    table['\\'] = CH_BACKSLASH;
+  }
+  Py_ssize_t i;
+  for (i = 0; i < other_len; ++i) {
+    table[(unsigned char)other[i]] = CH_DE_GRAY;
+  }
+  for (i = 0; i < ws_len; ++i) {
+    table[(unsigned char)ws[i]] = CH_DE_WHITE;
+  }
+}
+
+// Run the automaton.  spans must have room for 2 * n + 2 spans.  Returns the
+// number of spans, or -1 with a Python exception set.
+static Py_ssize_t split_spans(const char* s, Py_ssize_t n,
+                              const unsigned char* table, Span* spans) {
+  Py_ssize_t num_spans = 0;
+  if (n == 0) {
+    return 0;
+  }
+
+  // Ignore leading and trailing IFS whitespace, as in IfsSplitter.Split().
+  Py_ssize_t i = 0;
+  while (i < n && table[(unsigned char)s[i]] == CH_DE_WHITE) {
+    ++i;
+  }
+  if (i != 0) {
+    spans[num_spans].type = SPAN_DELIM;
+    spans[num_spans++].end = i;
+  }
+  if (i == n) {
+    return num_spans;
+  }
+  while (table[(unsigned char)s[n - 1]] == CH_DE_WHITE) {
+    --n;
+  }
+
+  int state = ST_START;
+  for (; i < n; ++i) {
+    int ch = table[(unsigned char)s[i]];
+    int new_state = kTransitions[state][ch][0];
+    int action = kTransitions[state][ch][1];
+    if (new_state == ST_INVALID) {
+      PyErr_Format(PyExc_AssertionError,
+                   "Invalid transition from %d with %d", state, ch);
+      return -1;
+    }
+
+    switch (action) {
+    case EMIT_PART:
+      spans[num_spans].type = SPAN_BLACK;
+      spans[num_spans++].end = i;
+      break;
+    case EMIT_DE:
+      spans[num_spans].type = SPAN_DELIM;
+      spans[num_spans++].end = i;
+      break;
+    case EMIT_EMPTY:
+      spans[num_spans].type = SPAN_DELIM;
+      spans[num_spans++].end = i;
+      spans[num_spans].type = SPAN_BLACK;
+      spans[num_spans++].end = i;
+      break;
+    case EMIT_ESCAPE:
+      spans[num_spans].type = SPAN_BACKSLASH;
+      spans[num_spans++].end = i;
+      break;
+    }
+    state = new_state;
+  }
+
+  // The last span.
+  switch (state) {
+  case ST_BLACK:
+    spans[num_spans].type = SPAN_BLACK;
+    break;
+  case ST_BACKSLASH:
+    spans[num_spans].type = SPAN_BACKSLASH;
+    break;
+  default:
+    spans[num_spans].type = SPAN_DELIM;
+    break;
+  }
+  spans[num_spans++].end = n;
+  return num_spans;
+}
+
+// Append a part to a list.  Returns 0 on success, or -1 with a Python
+// exception set.
+static int append_part(PyObject* parts, const char* buf, Py_ssize_t len) {
+  PyObject* part = PyString_FromStringAndSize(buf, len);
+  if (part == NULL) {
+    return -1;
+  }
+  int ret = PyList_Append(parts, part);
+  Py_DECREF(part);
+  return ret;
+}
+
+// Like legacy._SpansToParts().  Black spans separated by a backslash are
+// joined into one part in buf, which has room for n bytes.
+static PyObject* spans_to_parts(const char* s, const Span* spans,
+                                Py_ssize_t num_spans, char* buf) {
+  PyObject* parts = PyList_New(0);
+  if (parts == NULL) {
+    return NULL;
+  }
+
+  Py_ssize_t start = 0;
+  Py_ssize_t buf_len = 0;
+  int have_part = 0;
+  int join_next = 0;
+  int last_span_was_black = 0;
+
+  Py_ssize_t i;
+  for (i = 0; i < num_spans; ++i) {
+    Py_ssize_t end = spans[i].end;
+    switch (spans[i].type) {
+    case SPAN_BLACK:
+      if (have_part && join_next) {
+        join_next = 0;
+      } else {
+        if (have_part && append_part(parts, buf, buf_len) < 0) {
+          Py_DECREF(parts);
+          return NULL;
+        }
+        buf_len = 0;
+        have_part = 1;
+      }
+      memcpy(buf + buf_len, s + start, end - start);
+      buf_len += end - start;
+      last_span_was_black = 1;
+      break;
+
+    case SPAN_BACKSLASH:
+      if (last_span_was_black) {
+        join_next = 1;
+      }
+      last_span_was_black = 0;
+      break;
+
+    default:
+      last_span_was_black = 0;
+      break;
+    }
+    start = end;
+  }
+
+  if (have_part && append_part(parts, buf, buf_len) < 0) {
+    Py_DECREF(parts);
+    return NULL;
+  }
+  return parts;
+}
+
+// The fast path when IFS is only whitespace, with backslash escapes.  Gives
+// the same result as split_spans() followed by spans_to_parts().
+static PyObject* split_white(const char* s, Py_ssize_t n,
+                             const unsigned char* table, char* buf) {
+  PyObject* parts = PyList_New(0);
+  if (parts == NULL) {
+    return NULL;
+  }
+
+  // Trailing whitespace is ignored, even if it's escaped.
+  while (n > 0 && table[(unsigned char)s[n - 1]] == CH_DE_WHITE) {
+    --n;
+  }
+
+  Py_ssize_t i = 0;
+  while (i < n) {
+    // Skip delimiters.
+    while (i < n && table[(unsigned char)s[i]] == CH_DE_WHITE) {
+      ++i;
+    }
+
+    Py_ssize_t buf_len = 0;
+    int have_part = 0;
+    while (i < n) {
+      int ch = table[(unsigned char)s[i]];
+      if (ch == CH_DE_WHITE) {
+        break;
+      }
+      if (ch == CH_BACKSLASH) {
+        if (i + 1 == n) {  // a trailing backslash is dropped
+          ++i;
+          break;
+        }
+        ++i;  // the escaped character is black
+      }
+      buf[buf_len++] = s[i++];
+      have_part = 1;
+    }
+
+    if (have_part && append_part(parts, buf, buf_len) < 0) {
+      Py_DECREF(parts);
+      return NULL;
+    }
+  }
+  return parts;
+}
+
+static PyObject *
+func_split(PyObject *self, PyObject *args) {
+  const char* s;
+  Py_ssize_t n;
+  const char* ws;
+  Py_ssize_t ws_len;
+  const char* other;
+  Py_ssize_t other_len;
+  int allow_escape;
+  PyObject* span_types;
+
+  if (!PyArg_ParseTuple(args, "s#s#s#iO!", &s, &n, &ws, &ws_len, &other,
+                        &other_len, &allow_escape, &PyTuple_Type,
+                        &span_types)) {
+    return NULL;
+  }
+  if (PyTuple_GET_SIZE(span_types) != 3) {
+    PyErr_SetString(PyExc_ValueError, "Expected 3 span types");
+    return NULL;
+  }
+
+  unsigned char table[256];
+  classify(table, ws, ws_len, other, other_len, allow_escape);
+
+  Span* spans = malloc((2 * n + 2) * sizeof(Span));
+  if (spans == NULL) {
+    return PyErr_NoMemory();
+  }
+  Py_ssize_t num_spans = split_spans(s, n, table, spans);
+  if (num_spans < 0) {
+    free(spans);
+    return NULL;
+  }
+
+  PyObject* result = PyList_New(num_spans);
+  if (result != NULL) {
+    Py_ssize_t i;
+    for (i = 0; i < num_spans; ++i) {
+      PyObject* span_type = PyTuple_GET_ITEM(span_types, spans[i].type);
+      PyObject* item = Py_BuildValue("(On)", span_type, spans[i].end);
+      if (item == NULL) {
+        Py_DECREF(result);
+        result = NULL;
+        break;
+      }
+      PyList_SET_ITEM(result, i, item);
+    }
+  }
+  free(spans);
+  return result;
+}
+
+static PyObject *
+func_split_parts(PyObject *self, PyObject *args) {
+  const char* s;
+  Py_ssize_t n;
+  const char* ws;
+  Py_ssize_t ws_len;
+  const char* other;
+  Py_ssize_t other_len;
+
+  if (!PyArg_ParseTuple(args, "s#s#s#", &s, &n, &ws, &ws_len, &other,
+                        &other_len)) {
+    return NULL;
+  }
+
+  // Word evaluation always allows backslash escapes.
+  unsigned char table[256];
+  classify(table, ws, ws_len, other, other_len, 1);
+
+  char* buf = malloc(n + 1);
+  if (buf == NULL) {
+    return PyErr_NoMemory();
+  }
+
+  PyObject* result;
+  if (other_len == 0) {
+    debug("whitespace fast path");
+    result = split_white(s, n, table, buf);
+  } else {
+    Span* spans = malloc((2 * n + 2) * sizeof(Span));
+    if (spans == NULL) {
+      free(buf);
+      return PyErr_NoMemory();
+    }
+    Py_ssize_t num_spans = split_spans(s, n, table, spans);
+    if (num_spans < 0) {
+      result = NULL;
+    } else {
+      result = spans_to_parts(s, spans, num_spans, buf);
+    }
+    free(spans);
+  }
+  free(buf);
+  return result;
+}
+
+static PyMethodDef methods[] = {
+  {"split", func_split, METH_VARARGS,
+   "split(s, ifs_whitespace, ifs_other, allow_escape, span_types) -> spans.  "
+   "span_types is a tuple of the Black, Delim, and Backslash values."},
+  {"split_parts", func_split_parts, METH_VARARGS,
+   "split_parts(s, ifs_whitespace, ifs_other) -> list of strings.  "
+   "Split for word evaluation, removing backslash escapes."},
+  {NULL, NULL},
+};
+
+void initfastsplit(void) {
+  Py_InitModule("fastsplit", methods);
+}
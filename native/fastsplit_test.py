@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+fastsplit_test.py: Tests for fastsplit.c
+"""
+
+import unittest
+
+import fastsplit  # module under test
+
+_SPAN_TYPES = ('Black', 'Delim', 'Backslash')
+
+
+class FastSplitTest(unittest.TestCase):
+
+  def testSplit(self):
+    spans = fastsplit.split('a _ b', ' ', '_', True, _SPAN_TYPES)
+    self.assertEqual([('Black', 1), ('Delim', 4), ('Black', 5)], spans)
+
+    # Trailing whitespace is ignored even if it's escaped.
+    spans = fastsplit.split('  a\\ ', ' ', '', True, _SPAN_TYPES)
+    self.assertEqual(
+        [('Delim', 2), ('Black', 3), ('Backslash', 4)], spans)
+
+    self.assertEqual([], fastsplit.split('', ' ', '', True, _SPAN_TYPES))
+    self.assertRaises(
+        ValueError, fastsplit.split, 'a', ' ', '', True, ('Black',))
+
+  def testSplitParts(self):
+    CASES = [
+        ([], '', ' \t\n', ''),
+        (['a', 'b c'], ' a  b\\ c\t', ' \t\n', ''),
+        (['a\0b'], 'a\0b', ' \t\n', ''),  # NUL is an ordinary character
+        (['a', '', 'b'], 'a _ _ b', ' ', '_'),
+        (['', '', 'a', 'b'], '__a_b_', '', '_'),
+        (['a_-b'], 'a\\_\\-b', '', '_-'),
+    ]
+    for expected, s, ws, other in CASES:
+      self.assertEqual(expected, fastsplit.split_parts(s, ws, other), repr(s))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,8 +2,13 @@
  * Python interface to libc functions.
  */
 
+// Before any include, since the system headers check it once.
+#define _GNU_SOURCE 1  // for FNM_EXTMATCH
+
 #include <stdarg.h>  // va_list, etc.
 #include <stdio.h>  // printf
+#include <stdlib.h>  // free
+#include <string.h>  // strcmp, strdup
 
 #include <fnmatch.h>
 #include <glob.h>
@@ -36,6 +41,11 @@ func_fnmatch(PyObject *self, PyObject *args) {
   }
 
   int flags = 0;
+#ifdef FNM_EXTMATCH
+  // OSH always parses extended globs like @(foo|bar).  This is a GNU
+  // extension; core/glob_.py only falls back on fnmatch() for !(foo).
+  flags |= FNM_EXTMATCH;
+#endif
   int ret = fnmatch(pattern, str, flags);
 
   switch (ret) {
@@ -122,17 +132,73 @@ func_glob(PyObject *self, PyObject *args) {
   return matches;
 }
 
+// A small LRU cache of compiled regexes, so [[ $x =~ $pat ]] in a loop
+// doesn't call regcomp() on every iteration.  Entries are kept in
+// most-recently-used order, and the last one is evicted.  A linear scan is
+// fine for this size.
+#define REGEX_CACHE_SIZE 32
+
+typedef struct {
+  char* pattern;  // owned; NULL if the slot is empty
+  regex_t re;
+} regex_entry_t;
+
+static regex_entry_t regex_cache[REGEX_CACHE_SIZE];
+static int regex_cache_len = 0;
+
+// Return a compiled regex for pattern, or NULL with *ret set to the regcomp()
+// error.  The regex is owned by the cache.
+static regex_t* regex_lookup(const char* pattern, int* ret) {
+  int i;
+  for (i = 0; i < regex_cache_len; ++i) {
+    if (strcmp(regex_cache[i].pattern, pattern) == 0) {
+      // Move it to the front.
+      regex_entry_t hit = regex_cache[i];
+      memmove(&regex_cache[1], &regex_cache[0], i * sizeof(regex_entry_t));
+      regex_cache[0] = hit;
+      *ret = 0;
+      return &regex_cache[0].re;
+    }
+  }
+
+  regex_entry_t entry;
+  // This is an extended regular expression rather than a basic one, i.e. we
+  // use 'a*' instaed of 'a\*'.
+  *ret = regcomp(&entry.re, pattern, REG_EXTENDED);
+  if (*ret != 0) {
+    return NULL;  // invalid regexes aren't cached
+  }
+  entry.pattern = strdup(pattern);
+  if (entry.pattern == NULL) {
+    regfree(&entry.re);
+    *ret = REG_ESPACE;
+    return NULL;
+  }
+
+  if (regex_cache_len == REGEX_CACHE_SIZE) {
+    regex_entry_t* last = &regex_cache[REGEX_CACHE_SIZE - 1];
+    debug("evicting regex %s", last->pattern);
+    regfree(&last->re);
+    free(last->pattern);
+    --regex_cache_len;
+  }
+  memmove(&regex_cache[1], &regex_cache[0],
+          regex_cache_len * sizeof(regex_entry_t));
+  regex_cache[0] = entry;
+  ++regex_cache_len;
+  return &regex_cache[0].re;
+}
+
 static PyObject *
 func_regex_parse(PyObject *self, PyObject *args) {
   const char* pattern;
   if (!PyArg_ParseTuple(args, "s", &pattern)) {
     return NULL;
   }
-  regex_t pat;
-  // This is an extended regular expression rather than a basic one, i.e. we
-  // use 'a*' instaed of 'a\*'.
-  int ret = regcomp(&pat, pattern, REG_EXTENDED);
-  regfree(&pat);
+  // This puts the regex in the cache, so constant regexes are compiled once
+  // at parse time.
+  int ret;
+  regex_lookup(pattern, &ret);
 
   // Copied from man page
 
@@ -223,50 +289,39 @@ func_regex_match(PyObject *self, PyObject *args) {
     return NULL;
   }
 
-  regex_t pat;
-  regmatch_t m[2];
-
-  // Should have been checked by regex_parse
-  if (regcomp(&pat, pattern, REG_EXTENDED) != 0) {
-    fprintf(stderr, "Invalid regex at runtime\n");
-    return PyLong_FromLong(-1);
-  }
-  //regcomp(&pat, pattern, REG_EXTENDED);
-
+  // Usually checked by regex_parse, but not if the pattern is dynamic.
   int ret;
-  // must match at pos 0
-  if (regexec(&pat, str, 2, m, 0) == 0) {
-    debug("MATCH\n");
-  //if (regexec(&pat, str, 2, m, 0) == 0 && !m[0].rm_so) {
-    // Return first parenthesized subexpression as string, or length of match
-
-    /*
-    if (pat.re_nsub>0) {
-      ret->s = xmprintf("%.*s", m[1].rm_eo-m[1].rm_so, target+m[1].rm_so);
-      if (TT.refree) free(TT.refree);
-      TT.refree = ret->s;
-    } else assign_int(ret, m[0].rm_eo);
-    */
-    ret = 1;
-
-  } else {
-    debug("NO MATCH");
-    /*
-    if (pat.re_nsub>0) ret->s = "";
-    else assign_int(ret, 0);
-    */
-    ret = 0;
+  regex_t* pat = regex_lookup(pattern, &ret);
+  if (pat == NULL) {
+    PyErr_SetString(PyExc_RuntimeError, "Invalid regex syntax (regcomp)");
+    return NULL;
   }
-  regfree(&pat);
 
-  // TODO: Return a list for BASH_REMATCH.
+  // The whole match, then each parenthesized subexpression.
+  size_t num_groups = pat->re_nsub + 1;
+  regmatch_t* m = malloc(num_groups * sizeof(regmatch_t));
+  if (m == NULL) {
+    return PyErr_NoMemory();
+  }
 
-  if (ret) {
-    return PyLong_FromLong(1);
+  PyObject* result;
+  // The match is unanchored.
+  if (regexec(pat, str, num_groups, m, 0) == 0) {
+    debug("MATCH");
+    result = PyList_New(num_groups);
+    size_t i;
+    for (i = 0; i < num_groups; ++i) {
+      // Groups that didn't participate in the match are (-1, -1).
+      PyList_SET_ITEM(result, i,
+                      Py_BuildValue("(ii)", (int)m[i].rm_so, (int)m[i].rm_eo));
+    }
   } else {
-    Py_RETURN_FALSE;
-    return PyLong_FromLong(0);
+    debug("NO MATCH");
+    result = Py_None;
+    Py_INCREF(result);
   }
+  free(m);
+  return result;
 }
 
 static PyMethodDef methods[] = {
@@ -279,7 +334,8 @@ static PyMethodDef methods[] = {
   {"regex_parse", func_regex_parse, METH_VARARGS,
    "Compile a regex in ERE syntax, returning whether it is valid"},
   {"regex_match", func_regex_match, METH_VARARGS,
-   "Match regex against a string, returning a list of matches"},
+   "Match regex against a string.  Returns None, or a list of (start, end) "
+   "offsets for the match and each group."},
   {NULL, NULL},
 };
 
@@ -60,12 +60,15 @@ class LibcTest(unittest.TestCase):
     self.assertEqual(False, libc.regex_parse('{'))
 
     cases = [
-        (r'.*\.py', 'foo.py', True),
-        (r'.*\.py', 'abcd', False),
+        (r'.*\.py', 'foo.py', [(0, 6)]),
+        (r'.*\.py', 'abcd', None),
         # The match is unanchored
-        (r'bc', 'abcd', True),
+        (r'bc', 'abcd', [(1, 3)]),
         # The match is unanchored
-        (r'.c', 'abcd', True),
+        (r'.c', 'abcd', [(1, 3)]),
+        # Groups
+        (r'(a)(x)?(c)?', 'abcd', [(0, 1), (0, 1), (-1, -1), (-1, -1)]),
+        (r'([a-z]+)-([0-9]+)', 'id: foo-42', [(4, 10), (4, 7), (8, 10)]),
         ]
 
     for pat, s, expected in cases:
@@ -73,7 +76,16 @@ class LibcTest(unittest.TestCase):
       self.assertEqual(expected, actual)
 
     # Error.
-    print(libc.regex_match(r'*', 'abcd'))
+    self.assertRaises(RuntimeError, libc.regex_match, r'*', 'abcd')
+
+  def testRegexCache(self):
+    # More patterns than the cache holds, so entries get evicted.
+    for i in xrange(100):
+      pat = 'x{%d}' % i
+      self.assertEqual(True, libc.regex_parse(pat))
+      self.assertEqual([(0, i)], libc.regex_match(pat, 'x' * i))
+    # Earlier patterns still work after eviction.
+    self.assertEqual([(0, 3)], libc.regex_match('x{3}', 'xxxx'))
 
 
   def testRegexReplace(self):
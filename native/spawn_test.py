@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Copyright 2016 Andy Chu. All rights reserved.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+"""
+spawn_test.py: Tests for spawn.c
+"""
+
+import os
+import unittest
+
+import spawn  # module under test
+
+
+def _Wait(pid):
+  _, status = os.waitpid(pid, 0)
+  return os.WEXITSTATUS(status)
+
+
+class SpawnTest(unittest.TestCase):
+
+  def testSpawn(self):
+    pid = spawn.spawn('/bin/sh', ['sh', '-c', 'exit 42'], {}, [])
+    self.assertEqual(42, _Wait(pid))
+
+  def testEnviron(self):
+    r, w = os.pipe()
+    actions = [
+        (spawn.FILE_ACTION_DUP2, w, 1),
+        (spawn.FILE_ACTION_CLOSE, w, -1),
+        (spawn.FILE_ACTION_CLOSE, r, -1),
+    ]
+    pid = spawn.spawn('/bin/sh', ['sh', '-c', 'echo "$FOO"'], {'FOO': 'bar'},
+                      actions)
+    os.close(w)
+    out = os.read(r, 100)
+    os.close(r)
+    self.assertEqual(0, _Wait(pid))
+    self.assertEqual('bar\n', out)
+
+  def testErrors(self):
+    try:
+      pid = spawn.spawn('/nonexistent', ['nonexistent'], {}, [])
+    except OSError as e:
+      print(e)  # newer glibc reports exec() errors
+    else:
+      self.assertEqual(127, _Wait(pid))
+
+    self.assertRaises(TypeError, spawn.spawn, '/bin/sh', ['sh', 1], {}, [])
+    self.assertRaises(TypeError, spawn.spawn, '/bin/sh', ['sh'], {'A': 1}, [])
+    self.assertRaises(ValueError, spawn.spawn, '/bin/sh', ['sh'], {},
+                      [(99, 0, 0)])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -49,6 +49,10 @@ class CommandParser(object):
     self.error_stack = []
     self.completion_stack = []
 
+    # Set when we parse a function definition, so the main loop knows the
+    # arena has to outlive the command.
+    self.saw_func_def = False
+
     # Cursor state set by _Peek()
     self.next_lex_mode = lex_mode_e.OUTER
     self.cur_word = None  # current word
@@ -1114,6 +1118,7 @@ class CommandParser(object):
 
     func = ast.FuncDef()
     func.name = name
+    self.saw_func_def = True
 
     if not self.ParseFunctionBody(func):
       return None
@@ -1150,6 +1155,7 @@ class CommandParser(object):
 
     func = ast.FuncDef()
     func.name = name
+    self.saw_func_def = True
 
     if not self.ParseFunctionBody(func):
       return None
@@ -1539,8 +1545,8 @@ class CommandParser(object):
 
     Very similar to ParseCommandList, but we allow empty files.
 
-    TODO: This should be turned into a Parse and Execute loop, freeing arenas
-    if they don't contain functions.
+    Executor.MainLoop() is used instead when executing a script or -c, so
+    this is for 'source', 'eval', stdin, and printing the AST.
     """
     if not self._NewlineOk(): return None
 
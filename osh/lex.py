@@ -420,11 +420,22 @@ ECHO_E_DEF = _C_STRING_COMMON + [
 
   C(r'\c', Id.Char_Stop),
 
-  # Bad Backslash should not end the string.  We allow it, but a lint tool
-  # should warn about it.
-  R(r'\\$', Id.Char_BadBackslash),
+  # NOTE: A backslash at the end of the string is Char_BadBackslash, from
+  # _C_STRING_COMMON.  We allow it, but a lint tool should warn about it.
+
+  # e.g. 'foo', anything that's not a backslash escape.  NUL is separate so
+  # the re2c lexer doesn't run past the end of the string.
+  R(r'[^\\\0]+', Id.Char_Literals),
+  C('\0', Id.Char_Literals),
+]
+
+# Used by PRINTF_LEXER in core/builtin.py, for the text between % directives
+# in a format.  Like $'', octal escapes have no leading 0.
+PRINTF_DEF = _C_STRING_COMMON + [
+  R(r'\\[0-7]{1,3}', Id.Char_Octal3),
+  C(r'\"', Id.Char_OneChar),
+  C(r"\'", Id.Char_OneChar),
 
-  # e.g. 'foo', anything that's not a backslash escape
   R(r'[^\\]+', Id.Char_Literals),
 ]
 
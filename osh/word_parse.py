@@ -577,8 +577,8 @@ class WordParser(object):
       CompoundWord includes ExtGlobPart
     """
     left_token = self.cur_token
-    arms = []
-    part = ast.ExtGlobPart(left_token, arms)  # return value
+    part = ast.ExtGlobPart(left_token)  # return value
+    arms = part.arms
     part.spids.append(left_token.span_id)
 
     self.lexer.PushHint(Id.Op_RParen, Id.Right_ExtGlob)
@@ -94,7 +94,7 @@ build-and-test() {
   remove-files
   rm -f -v _bin/oil.* *.so
 
-  build/dev.sh all  # for {libc,fastlex}.so, needed to crawl deps
+  build/dev.sh all  # for {libc,fastlex,spawn,fastsplit}.so, needed to crawl deps
 
   test/unit.sh run-for-release
   test/osh2oil.sh run-for-release
@@ -37,3 +37,74 @@ echo "help=$?"
 cat $TMP/err.txt | grep -i 'no help topics' >/dev/null
 echo "grep=$?"
 # stdout-json: "help=1\ngrep=0\n"
+
+### hash -p and hash -t
+hash -p /bin/echo my-echo
+hash -t my-echo
+my-echo hi
+# stdout-json: "/bin/echo\nhi\n"
+
+### hash -r forgets remembered commands
+hash -p /bin/echo my-echo
+hash -r
+hash -t my-echo
+echo status=$?
+# stdout: status=1
+
+### hash of a nonexistent command
+hash ZZZ
+echo status=$?
+# stdout: status=1
+
+### Assigning PATH forgets remembered commands
+hash -p /bin/echo my-echo
+PATH="$PATH"
+hash -t my-echo
+echo status=$?
+# stdout: status=1
+
+### mapfile
+printf '1\n2\n3\n' | { mapfile; argv.py "${MAPFILE[@]}"; }
+printf '1\n2\n3\n' | { readarray -t lines; argv.py "${lines[@]}"; }
+## STDOUT:
+['1\n', '2\n', '3\n']
+['1', '2', '3']
+## END
+
+### mapfile -n -s leaves the rest of the input
+tmp=$TMP/mapfile-n.txt
+printf '1\n2\n3\n4\n' > $tmp
+{ mapfile -t -s 1 -n 2 a; cat; } < $tmp
+argv.py "${a[@]}"
+printf '1\n2\n3\n4\n' | { mapfile -n 1 b; cat; argv.py "${b[@]}"; }
+## STDOUT:
+4
+['2', '3']
+2
+3
+4
+['1\n']
+## END
+
+### mapfile -d
+printf 'x:y:z' | { mapfile -d : a; argv.py "${a[@]}"; }
+printf 'x:y:z' | { mapfile -t -d : a; argv.py "${a[@]}"; }
+## STDOUT:
+['x:', 'y:', 'z']
+['x', 'y', 'z']
+## END
+
+### mapfile in a function assigns like a=(...)
+tmp=$TMP/mapfile-f.txt
+printf '1\n2\n' > $tmp
+f() { mapfile -t a < $tmp; }
+g() { local b; mapfile -t b < $tmp; argv.py "${b[@]}"; }
+f
+argv.py "${a[@]}"
+g
+argv.py "${b[@]}"
+## STDOUT:
+['1', '2']
+['1', '2']
+[]
+## END
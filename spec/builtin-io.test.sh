@@ -351,3 +351,48 @@ echo $line
 # BUG dash/zsh stdout-json: "\u0007 \u0008\n"
 # BUG mksh stdout-json: "\u0007 \u0008 d \u001b \u000c g h e 145 i\n"
 
+
+### read from a file leaves the rest of it for the next command
+tmp=$TMP/read-rest.txt
+printf 'one\ntwo\nthree\n' > $tmp
+{ read x; read y; cat; } < $tmp
+echo "$x $y"
+## STDOUT:
+three
+one two
+## END
+
+### read from a pipe leaves the rest of it for the next command
+printf 'one\ntwo\nthree\n' | { read x; cat; echo "$x"; }
+## STDOUT:
+two
+three
+one
+## END
+
+### echo output stays in order with redirects and child processes
+echo 1
+echo 2 > $TMP/echo-order.txt
+cat $TMP/echo-order.txt
+echo 3; ( echo 4 ); echo 5 | cat
+echo 6 >&2
+f() { echo 7; }
+x=$(f; echo 8)
+echo "$x"
+## STDOUT:
+1
+2
+3
+4
+5
+7
+8
+## END
+
+### echo output and error messages are interleaved on the same fd
+{ echo 1; echo 2 >&2; echo 3; } 2>&1 | cat
+## STDOUT:
+1
+2
+3
+## END
@@ -0,0 +1,170 @@
+#!/bin/bash
+#
+# printf
+
+### printf with no args
+printf
+## status: 2
+
+### printf %s and escapes in the format
+printf '[%s]\t[%s]\n' one 'two three'
+## STDOUT:
+[one]	[two three]
+## END
+
+### printf reuses the format for extra args
+printf '%s-%s\n' a b c
+## STDOUT:
+a-b
+c-
+## END
+
+### printf integers
+printf '%d|%5d|%-5d|%05d|%+d\n' 42 42 42 42 42
+## STDOUT:
+42|   42|42   |00042|+42
+## END
+
+### printf hex, octal, and leading zero and 0x args
+printf '%x %X %o %#x %#o %d %d\n' 255 255 8 255 8 0x10 010
+## STDOUT:
+ff FF 10 0xff 010 16 8
+## END
+
+### printf character code of quoted arg
+printf '%d %d\n' "'A" '"a'
+## STDOUT:
+65 97
+## END
+
+### printf invalid number
+printf '%d\n' abc
+echo status=$?
+## STDOUT:
+0
+status=1
+## END
+
+### printf invalid trailing chars and out of range numbers
+printf '%d|%d|%d\n' '5 ' 0x1g 99999999999999999999
+echo status=$?
+## STDOUT:
+5|1|9223372036854775807
+status=1
+## END
+
+### printf floats
+printf '%.2f|%8.3f|%e\n' 3.14159 2.5 1234.5
+## STDOUT:
+3.14|   2.500|1.234500e+03
+## END
+
+### printf * width and precision
+printf '[%*d][%-*s][%.*s]\n' 5 3 4 ab 2 abcdef
+## STDOUT:
+[    3][ab  ][ab]
+## END
+
+### printf %c
+printf '%c%c\n' hello world
+## STDOUT:
+hw
+## END
+
+### printf %b interprets escapes in the arg
+printf '%s|%b\n' 'a\tb' 'a\tb'
+## STDOUT:
+a\tb|a	b
+## END
+
+### printf %b with \c stops output
+printf '%b-%s\n' 'one\ctwo' three
+echo
+## STDOUT:
+one
+## END
+
+### printf octal and hex escapes in the format
+printf '\101\x42\n'
+## STDOUT:
+AB
+## END
+## N-I dash STDOUT:
+A\x42
+## END
+
+### printf %%
+printf '100%%\n'
+## STDOUT:
+100%
+## END
+
+### printf missing args
+printf '[%s][%d]\n'
+## STDOUT:
+[][0]
+## END
+
+### printf %q
+printf '%q\n' 'a b' "it's" '' '~x'
+## STDOUT:
+a\ b
+it\'s
+''
+\~x
+## END
+## N-I dash status: 2
+## N-I dash stdout-json: ""
+
+### printf %q with control chars
+printf '%q\n' $'a\tb'
+## STDOUT:
+$'a\tb'
+## END
+## N-I dash status: 2
+## N-I dash stdout-json: ""
+
+### printf -v
+printf -v x '%s=%03d' n 7
+echo "$x"
+## STDOUT:
+n=007
+## END
+## N-I dash/mksh/zsh STDOUT:
+
+## END
+
+### printf -v with an invalid name
+printf -v 1bad %s Q
+echo status=$?
+## STDOUT:
+status=2
+## END
+
+### printf -v with an array index
+a=(x y z)
+printf -v 'a[1]' %s Q
+echo "${a[@]}"
+## STDOUT:
+x Q z
+## END
+## N-I dash/mksh/zsh status: 2
+## N-I dash/mksh/zsh stdout-json: ""
+
+### printf -v in a function sets a global
+f() { printf -v g '%s' hi; }
+f
+echo "$g"
+## STDOUT:
+hi
+## END
+## N-I dash/mksh/zsh STDOUT:
+
+## END
+
+### printf in a command sub
+x=$(printf '%s,' a b c)
+echo "$x"
+## STDOUT:
+a,b,c,
+## END
@@ -159,6 +159,11 @@ shift ZZZ
 # OK dash status: 2
 # BUG mksh status: 0
 
+### Shift error comes after earlier output
+{ echo before; shift ZZZ; } 2>&1 | head -n 1
+# stdout: before
+# status: 0
+
 ### get umask
 umask | grep '[0-9]\+'  # check for digits
 # status: 0
@@ -104,3 +104,59 @@ x
 0
 0
 ## END
+
+### Command Sub with builtin output before trailing external command
+x=$(echo -n pre; cd /; expr 1 + 2)
+echo $x
+y=$(true && { echo -n a; basename /b/c; })
+echo $y
+## STDOUT:
+pre3
+ac
+## END
+
+### Command Sub with trailing external command and redirect
+x=$(echo foo >/dev/null; expr 1 + 2 2>/dev/null)
+echo $x
+## stdout: 3
+
+### Command Sub with builtins doesn't change variables or args
+f() { echo "f:$1"; x=inner; shift; }
+x=outer
+set -- a b
+y=$(f 1; x=changed; shift; echo $x $#)
+echo $y
+echo $x $#
+## STDOUT:
+f:1 changed 1
+outer 2
+## END
+
+### Command Sub calling a function returns its status
+f() { echo out; return 3; }
+x=$(f)
+echo $x $?
+y=$(echo hi; exit 4)
+echo $y $?
+## STDOUT:
+out 3
+hi 4
+## END
+
+### Failed redirect inside Command Sub doesn't lose stdout
+x=$(echo hi 2>/nonexistent/z)
+echo "after [$x]"
+f() { echo a; } >/nonexistent/y
+y=$(f)
+echo visible
+## STDOUT:
+after []
+visible
+## END
+
+### ${undef?msg} inside Command Sub only stops the Command Sub
+x=$(echo ${undef?oops})
+echo after
+## STDOUT:
+after
+## END
@@ -319,6 +319,20 @@ here doc in IF CONDITION
 THEN executed
 ## END
 
+### Here doc bigger than a pipe buffer
+cat <<EOF | wc -c
+$(printf '%05000d' 0)
+EOF
+## stdout: 5001
+
+### Here string bigger than a pipe buffer
+x=$(printf '%05000d' 0)
+read y <<< "$x"
+echo ${#y}
+## stdout: 5000
+## N-I dash stdout-json: ""
+## N-I dash status: 2
+
 ### Multiple here docs in pipeline
 # SKIPPED: hangs with osh on Debian
 # The second instance reads its stdin from the pipe, and fd 5 from a here doc.
@@ -120,3 +120,36 @@ pat="^(a b)$"
 # stdout: true
 # N-I zsh status: 1
 # N-I zsh stdout-json: ""
+
+### BASH_REMATCH
+[[ foo123 =~ ([a-z]+)([0-9]+) ]] && argv.py "${BASH_REMATCH[@]}"
+[[ failed =~ ([a-z]+)([0-9]+) ]] || argv.py "${BASH_REMATCH[@]}"
+## STDOUT:
+['foo123', 'foo', '123']
+[]
+## END
+## N-I zsh STDOUT:
+[]
+[]
+## END
+
+### BASH_REMATCH with unmatched group
+[[ ac =~ (a)(b)?(c) ]] && argv.py "${BASH_REMATCH[@]}"
+## stdout: ['ac', 'a', '', 'c']
+## N-I zsh stdout: []
+
+### Dynamic regex in a loop
+pat='^x([0-9])$'
+for s in x1 y2 x3; do
+  if [[ $s =~ $pat ]]; then
+    echo ${BASH_REMATCH[1]}
+  fi
+done
+## STDOUT:
+1
+3
+## END
+## N-I zsh STDOUT:
+
+
+## END
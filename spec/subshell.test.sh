@@ -5,3 +5,14 @@
 echo $?
 # stdout: 1
 # status: 0
+
+### Subshell with trailing external command doesn't leak state
+x=1
+( x=2; expr $x + 1 )
+echo $x
+( cd /; pwd ) | cat
+## STDOUT:
+3
+1
+/
+## END
@@ -97,6 +97,50 @@ echo ${s//[[:alpha:]]/y} ${s//[^[:alpha:]]/-}
 # N-I dash status: 2
 # N-I dash stdout-json: ""
 
+### Replace extended glob is longest match at each position
+shopt -s extglob
+s=bbbb; echo "${s/?(b|bb)/X}"
+s=aabab; echo "${s//@(a|ab)/X}"
+s=abcabc; echo "${s/#@(a|ab)/X}"
+s=abcbc; echo "${s/%@(c|bc)/X}"
+## STDOUT:
+Xbb
+XXX
+Xcabc
+abcX
+## END
+# N-I dash status: 2
+# N-I dash stdout-json: ""
+
+### Replace extended glob that matches the empty string
+shopt -s extglob
+s=
+echo "[${s/?(b|bb)/X}]" "[${s/%?(b)/X}]"
+s=abc
+echo "${s//?(z)/X}" "${s/%?(z)/X}"
+s=xaay
+echo "${s//*(a)/-}"
+## STDOUT:
+[] [X]
+XaXbXc abcX
+-x--y
+## END
+# N-I dash status: 2
+# N-I dash stdout-json: ""
+
+### Replace with negated extended glob
+shopt -s extglob
+s=abc
+echo "${s//!(a)/X}" "${s/#!(a)/X}" "${s/%!(c)/X}"
+s=aaa
+echo "${s/#!(a)/X}"
+## STDOUT:
+X X X
+X
+## END
+# N-I dash status: 2
+# N-I dash stdout-json: ""
+
 ### Pattern replacement ${v/} is not valid
 v=abcde
 echo -${v/}-
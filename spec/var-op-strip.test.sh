@@ -85,5 +85,16 @@ argv "${s%%abcde}" "${s%abcde}" "${s#abcde}" "${s##abcde}"
 ['abcd', 'abcd', 'abcd', 'abcd']
 ## END
 
+### Strip with character classes
+s='foo.tar.gz'
+argv.py "${s%.[a-z]*}" "${s%%.[a-z]*}" "${s#[[:alpha:]]}" "${s##*[!a-z]}"
+## STDOUT:
+['foo.tar', 'foo', 'oo.tar.gz', 'gz']
+## END
 
-
+### Strip pattern that matches the empty string
+s='abcd'
+argv.py "${s#*}" "${s##*}" "${s%*}" "${s%%*}"
+## STDOUT:
+['abcd', '', 'abcd', '']
+## END
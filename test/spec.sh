@@ -265,6 +265,10 @@ builtin-io() {
     ${REF_SHELLS[@]} $ZSH $BUSYBOX_ASH $OSH "$@"
 }
 
+builtin-printf() {
+  sh-spec spec/builtin-printf.test.sh ${REF_SHELLS[@]} $ZSH $OSH "$@"
+}
+
 builtins2() {
   sh-spec spec/builtins2.test.sh ${REF_SHELLS[@]} $ZSH $OSH "$@"
 }
@@ -355,13 +359,12 @@ parse-errors() {
 }
 
 here-doc() {
-  # NOTE: The last two tests, 31 and 32, have different behavior on my Ubuntu
-  # and Debian machines.
+  # NOTE: The last two tests, 33 and 34, used to behave differently on my
+  # Ubuntu and Debian machines, when osh forked a process to write every here
+  # doc.
   # - On Ubuntu, read_from_fd.py fails with Errno 9 -- bad file descriptor.
   # - On Debian, the whole process hangs.
-  # Is this due to Python 3.2 vs 3.4?  Either way osh doesn't implement the
-  # functionality, so it's probably best to just implement it.
-  sh-spec spec/here-doc.test.sh --osh-failures-allowed 1 --range 0-30 \
+  sh-spec spec/here-doc.test.sh --osh-failures-allowed 1 \
     ${REF_SHELLS[@]} $OSH "$@"
 }
 